@@ -0,0 +1,268 @@
+"""
+路由器設定備份與差異比對
+
+Settings_backup.cgi 匯出的 .CFG 檔格式：
+- "HDR1" + 4 位元組長度：內容為以 NUL 分隔的 key=value
+- "HDR2" + 3 位元組長度 + 1 位元組隨機值：每個位元組以
+  0xff + rand - c 編碼（NUL 編成 0xfd-0xff），以 bytes.translate 查表解碼
+
+同一份設定每次匯出的隨機值不同，因此以「解碼後內容」的雜湊判斷是否變動：
+下載時邊寫入磁碟邊解碼計算雜湊（不把檔案整個讀進記憶體），
+雜湊與上次相同時只需比較雜湊；不同時才從磁碟串流解析 key=value，
+與上次的快照比對，差異附加到歷史紀錄，最新快照以 gzip 保存。
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+import time
+
+DEFAULT_BACKUP_DIR = os.path.join(os.path.expanduser("~"), ".wuchang_cache", "config_backups")
+CHUNK_SIZE = 64 * 1024
+
+# 歷史差異中不記錄實際值的鍵（密碼、金鑰）
+_SENSITIVE_KEY_RE = re.compile(r"(passwd|password|psk|_key|secret|token|wpa_|crypt)", re.IGNORECASE)
+MASKED = "***"
+
+_TABLES = {}
+
+def _decode_table(rand):
+    """HDR2 的解碼表：0xfd-0xff 還原為 NUL，其餘為 (0xff + rand - c) & 0xff"""
+    table = _TABLES.get(rand)
+    if table is None:
+        table = bytes(0 if c >= 0xfd else (0xff + rand - c) & 0xff for c in range(256))
+        _TABLES[rand] = table
+    return table
+
+class SettingsDecoder:
+    """串流解碼設定檔（逐塊 feed，同時計算解碼後內容的雜湊）"""
+
+    def __init__(self):
+        self.header = b""
+        self.format = None
+        self.remaining = None
+        self.table = None
+        self.digest = hashlib.sha256()
+
+    def feed(self, chunk):
+        """
+        加入一塊原始資料
+
+        Returns:
+            bytes: 解碼後的內容（標頭讀完之前為空）
+
+        Raises:
+            ValueError: 不是設定檔（如被導向登錄頁）
+        """
+        if self.format is None:
+            self.header += chunk
+            if len(self.header) < 8:
+                return b""
+            magic = self.header[:4]
+            if magic == b"HDR1":
+                self.remaining = struct.unpack_from("<I", self.header, 4)[0]
+            elif magic == b"HDR2":
+                self.remaining = int.from_bytes(self.header[4:7], "little")
+                self.table = _decode_table(self.header[7])
+            else:
+                raise ValueError("不是路由器設定檔（標頭不符，可能尚未登錄）")
+            self.format = magic.decode("ascii")
+            chunk = self.header[8:]
+        if not chunk or self.remaining <= 0:
+            return b""
+        chunk = chunk[:self.remaining]
+        self.remaining -= len(chunk)
+        if self.table is not None:
+            chunk = chunk.translate(self.table)
+        self.digest.update(chunk)
+        return chunk
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+def iter_file(path):
+    """逐塊讀取檔案"""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+def parse_settings(chunks):
+    """
+    把原始設定檔串流解析成 (鍵, 值)
+
+    Args:
+        chunks: 原始資料區塊（含標頭）
+    """
+    decoder = SettingsDecoder()
+    pending = b""
+    for chunk in chunks:
+        data = pending + decoder.feed(chunk)
+        items = data.split(b"\0")
+        pending = items.pop()
+        for item in items:
+            if b"=" in item:
+                key, value = item.split(b"=", 1)
+                yield key.decode("utf-8", "replace"), value.decode("utf-8", "replace")
+    if b"=" in pending:
+        key, value = pending.split(b"=", 1)
+        yield key.decode("utf-8", "replace"), value.decode("utf-8", "replace")
+
+def diff_settings(old, new):
+    """
+    比較兩份設定
+
+    Returns:
+        dict: {"added": {鍵: 值}, "removed": [鍵], "changed": {鍵: [舊值, 新值]}}
+    """
+    return {
+        "added": {key: value for key, value in new.items() if key not in old},
+        "removed": sorted(key for key in old if key not in new),
+        "changed": {key: [old[key], value] for key, value in new.items() if key in old and old[key] != value},
+    }
+
+def mask_diff(diff):
+    """遮蔽差異中敏感鍵的值"""
+    def mask(key, value):
+        return MASKED if _SENSITIVE_KEY_RE.search(key) else value
+    return {
+        "added": {key: mask(key, value) for key, value in diff["added"].items()},
+        "removed": diff["removed"],
+        "changed": {key: [mask(key, old), mask(key, new)] for key, (old, new) in diff["changed"].items()},
+    }
+
+class ConfigStore:
+    """單一路由器的設定快照與差異歷史"""
+
+    def __init__(self, host, directory=DEFAULT_BACKUP_DIR):
+        """
+        Args:
+            host: 路由器識別（如 "220.135.21.74:8443"）
+            directory: 備份根目錄
+        """
+        self.host = host
+        self.directory = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", host))
+        self.state_path = os.path.join(self.directory, "state.json")
+        self.latest_path = os.path.join(self.directory, "latest.json.gz")
+        self.raw_path = os.path.join(self.directory, "latest.cfg")
+        self.history_path = os.path.join(self.directory, "history.jsonl")
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {}
+
+    def temp_path(self):
+        """下載用的暫存檔路徑"""
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"download-{os.getpid()}.tmp")
+
+    def latest_hash(self):
+        return self.state.get("hash")
+
+    def load_latest(self):
+        """讀取最新快照 {鍵: 值}"""
+        try:
+            with gzip.open(self.latest_path, "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def touch(self):
+        """設定未變動：只更新檢查時間"""
+        self.state["checked"] = time.time()
+        self._save_state()
+
+    def commit(self, raw_tmp_path, content_hash, settings, format_name):
+        """
+        保存新快照並記錄差異
+
+        Returns:
+            dict: 差異（第一次備份時所有鍵都算新增）
+        """
+        previous = self.load_latest()
+        diff = diff_settings(previous, settings)
+        now = time.time()
+
+        tmp_path = f"{self.latest_path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(settings, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.latest_path)
+        os.replace(raw_tmp_path, self.raw_path)
+
+        # 第一次備份只記錄雜湊（完整內容已在快照中）；只有順序不同時不記錄
+        record = {"time": now, "hash": content_hash, "previous": self.latest_hash(), "keys": len(settings)}
+        if previous:
+            record.update(mask_diff(diff))
+        if not previous or any(diff.values()):
+            with open(self.history_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        self.state.update(hash=content_hash, format=format_name, saved=now, checked=now,
+                          snapshots=self.state.get("snapshots", 0) + 1)
+        self._save_state()
+        return diff
+
+    def history(self):
+        """所有差異紀錄（由舊到新）"""
+        try:
+            with open(self.history_path, "r", encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError):
+            return []
+
+    def _save_state(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+def print_backup_result(result):
+    """輸出備份結果"""
+    if not result["changed"]:
+        print(f"[OK] 設定未變動（{result['hash'][:12]}）")
+        return
+    diff = mask_diff(result["diff"])
+    print(f"[OK] 已保存新快照（{result['hash'][:12]}，{result['keys']} 個設定）: {result['path']}")
+    if result["first"]:
+        return
+    for key, value in sorted(diff["added"].items()):
+        print(f"  + {key}={value}")
+    for key in diff["removed"]:
+        print(f"  - {key}")
+    for key, (old, new) in sorted(diff["changed"].items()):
+        print(f"  ~ {key}: {old} -> {new}")
+
+def main():
+    """主函數"""
+    import getpass
+    from router_connection import AsusRouterConnection
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    hostname = args[0] if args else "220.135.21.74"
+    port = int(args[1]) if len(args) > 1 else 8443
+
+    router = AsusRouterConnection(hostname=hostname, port=port, use_https=port in (443, 8443, 8444))
+    try:
+        username = input("請輸入路由器管理員用戶名: ").strip()
+        password = getpass.getpass("請輸入路由器管理員密碼: ")
+    except (EOFError, KeyboardInterrupt):
+        print("\n操作已取消")
+        return
+    if not router.login(username, password, verify_cert=False):
+        print("[FAIL] 登錄失敗")
+        return
+
+    result = router.backup_settings(verify_cert=False)
+    if result:
+        print_backup_result(result)
+
+if __name__ == "__main__":
+    main()
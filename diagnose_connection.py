@@ -7,11 +7,14 @@ import sys
 import subprocess
 import platform
 
+import profiling
+
 def test_dns(hostname):
     """測試 DNS 解析"""
     print(f"\n[診斷] 測試 DNS 解析: {hostname}")
     try:
-        ip = socket.gethostbyname(hostname)
+        with profiling.span("DNS 解析", "network", host=hostname):
+            ip = socket.gethostbyname(hostname)
         print(f"  [OK] DNS 解析成功: {hostname} -> {ip}")
         return ip
     except socket.gaierror as e:
@@ -23,8 +26,9 @@ def test_ping(hostname):
     print(f"\n[診斷] 測試 ping: {hostname}")
     try:
         param = '-n' if platform.system().lower() == 'windows' else '-c'
-        result = subprocess.run(['ping', param, '1', hostname], 
-                              capture_output=True, text=True, timeout=5)
+        with profiling.span("ping", "subprocess", host=hostname):
+            result = subprocess.run(['ping', param, '1', hostname], 
+                                  capture_output=True, text=True, timeout=5)
         if result.returncode == 0:
             print(f"  [OK] Ping 成功")
             print(f"  {result.stdout}")
@@ -41,8 +45,9 @@ def test_nslookup(hostname):
     """測試 nslookup"""
     print(f"\n[診斷] 測試 nslookup: {hostname}")
     try:
-        result = subprocess.run(['nslookup', hostname], 
-                              capture_output=True, text=True, timeout=5)
+        with profiling.span("nslookup", "subprocess", host=hostname):
+            result = subprocess.run(['nslookup', hostname], 
+                                  capture_output=True, text=True, timeout=5)
         print(f"  {result.stdout}")
         if result.returncode == 0:
             print(f"  [OK] nslookup 成功")
@@ -56,6 +61,7 @@ def test_nslookup(hostname):
         return False
 
 def main():
+    profiling.init_from_argv()
     print("=" * 60)
     print("華碩路由器 DDNS 連接診斷工具")
     print("=" * 60)
@@ -4,9 +4,14 @@
 
 import sys
 import getpass
-from router_connection import AsusRouterConnection
+
+import profiling
+from router_connection import AsusRouterConnection, NVRAM_AUDIT_KEYS
+from telemetry_store import record_router_info
 
 def main():
+    # 先移除 --profile，以免被當成用戶名
+    profiling.init_from_argv()
     print("=" * 60)
     print("華碩路由器登錄工具")
     print("=" * 60)
@@ -30,6 +35,9 @@ def main():
     
     print("[OK] 連接成功\n")
     
+    # 輸入憑證時在背景預熱連線與登錄頁面，登錄只需一次 POST
+    router.prewarm(verify_cert=False)
+    
     # 獲取登錄憑證
     print("[2] 登錄...")
     print("-" * 60)
@@ -71,10 +79,21 @@ def main():
         
         # 嘗試獲取路由器信息
         print("\n[3] 獲取路由器信息...")
-        info = router.get_router_info(verify_cert=False)
+        # 同時記錄連線裝置數與回應時間到遙測資料表
+        info = record_router_info(router, verify_cert=False)
         if info:
             print("路由器信息:")
             print(info)
+
+        # 批次讀取稽核用的 nvram 設定（一次請求，結果快取在本機）
+        print("\n[4] 讀取 nvram 設定...")
+        nvram = router.get_nvram(NVRAM_AUDIT_KEYS, verify_cert=False)
+        for key in NVRAM_AUDIT_KEYS:
+            if key in nvram:
+                print(f"  {key} = {nvram[key]}")
+        changed = router.nvram_cache.last_changed
+        if changed:
+            print(f"與上次讀取相比有變動: {', '.join(changed)}")
     else:
         print("\n" + "=" * 60)
         print("[失敗] 登錄失敗")
@@ -0,0 +1,109 @@
+"""
+路由器 nvram 本地快取
+
+每台路由器（主機:端口）一個 JSON 檔，記錄各 nvram 值、讀取時間與
+最後變動的版本號。每次更新時比對舊值：有變動的鍵會記錄新版本號，
+稽核時可以只看上次之後變動的設定；在有效時間內重複讀取直接由快取回應。
+"""
+
+import json
+import os
+import re
+import time
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".wuchang_cache", "nvram")
+DEFAULT_MAX_AGE = 300
+
+class NvramCache:
+    """單一路由器的 nvram 快取"""
+
+    def __init__(self, host, cache_dir=DEFAULT_CACHE_DIR, max_age=DEFAULT_MAX_AGE):
+        """
+        Args:
+            host: 路由器識別（如 "220.135.21.74:8443"）
+            cache_dir: 快取目錄
+            max_age: 快取有效秒數
+        """
+        self.host = host
+        self.max_age = max_age
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", host)
+        self.path = os.path.join(cache_dir, f"{safe_name}.json")
+        self.version = 0
+        self.values = {}
+        self.last_changed = []
+        self.load()
+
+    def load(self):
+        """讀取快取檔（不存在或格式錯誤時從空白開始）"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.version = data.get("version", 0)
+            self.values = data.get("values", {})
+        except (OSError, ValueError):
+            self.version = 0
+            self.values = {}
+
+    def save(self):
+        """寫回快取檔"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"host": self.host, "version": self.version, "values": self.values}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def lookup(self, keys, max_age=None):
+        """
+        從快取取值
+
+        Args:
+            keys: nvram 鍵列表
+            max_age: 有效秒數（None 使用預設值，0 表示一律視為過期）
+
+        Returns:
+            tuple: ({鍵: 值} 仍有效的部分, [需要重新讀取的鍵])
+        """
+        max_age = self.max_age if max_age is None else max_age
+        now = time.time()
+        hits = {}
+        missing = []
+        for key in keys:
+            entry = self.values.get(key)
+            if entry is not None and now - entry["fetched"] < max_age:
+                hits[key] = entry["value"]
+            else:
+                missing.append(key)
+        return hits, missing
+
+    def update(self, values):
+        """
+        寫入新讀取的值
+
+        Returns:
+            list: 與上次不同的鍵（第一次讀取的鍵不算變動）
+        """
+        now = time.time()
+        changed = [key for key, value in values.items()
+                   if key in self.values and self.values[key]["value"] != value]
+        if changed:
+            self.version += 1
+        for key, value in values.items():
+            entry = self.values.get(key)
+            if entry is None:
+                self.values[key] = {"value": value, "fetched": now, "version": self.version, "previous": None}
+            elif key in changed:
+                entry.update(value=value, fetched=now, version=self.version, previous=entry["value"])
+            else:
+                entry["fetched"] = now
+        self.last_changed = changed
+        return changed
+
+    def changes_since(self, version):
+        """
+        指定版本之後變動的鍵
+
+        Returns:
+            dict: {鍵: (舊值, 新值)}
+        """
+        return {key: (entry["previous"], entry["value"])
+                for key, entry in self.values.items() if entry["version"] > version and entry["previous"] is not None}
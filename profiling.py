@@ -0,0 +1,243 @@
+"""
+跨工具效能剖析
+
+各腳本共用的計時區段（span）：網路請求、子行程與檔案系統走訪。
+預設關閉，span() 只回傳共用的空物件，幾乎沒有額外開銷；
+加上 --profile 參數執行時才記錄，結束時輸出 Chrome trace-event JSON
+（可用 chrome://tracing 或 Perfetto 開啟）與各階段統計表。
+
+用法:
+    import profiling
+
+    def main():
+        profiling.init_from_argv()      # 移除 sys.argv 中的 --profile[=檔案]
+        with profiling.span("DNS 解析", "network", host=hostname):
+            ...
+
+    @profiling.traced("fs")
+    def scan(...):
+        ...
+"""
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+_enabled = False
+_events = []
+_lock = threading.Lock()
+_origin = 0.0
+_trace_path = None
+
+class _NullSpan:
+    """停用時使用的空區段"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    """計時區段"""
+
+    __slots__ = ("name", "category", "args", "start")
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        record(self.name, self.category, self.start, end - self.start, **self.args)
+        return False
+
+    def set(self, **args):
+        """補充區段參數（如狀態碼、位元組數）"""
+        self.args.update(args)
+
+def enabled():
+    """是否正在記錄"""
+    return _enabled
+
+def enable(trace_path=None):
+    """
+    開始記錄
+
+    Args:
+        trace_path: trace JSON 輸出路徑（None 時依腳本名稱與時間產生）
+    """
+    global _enabled, _origin, _trace_path
+    if _enabled:
+        return
+    _enabled = True
+    _origin = time.perf_counter()
+    if trace_path is None:
+        script = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+        trace_path = f"profile-{script}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    _trace_path = trace_path
+    instrument_requests()
+    atexit.register(_finish)
+
+def init_from_argv(argv=None):
+    """
+    從命令列啟用剖析
+
+    --profile 或 --profile=<檔案> 會從 argv 中移除，
+    避免影響腳本原本的位置參數（如 login_router.py 的帳號密碼）。
+
+    Returns:
+        bool: 是否已啟用
+    """
+    argv = sys.argv if argv is None else argv
+    for i, arg in enumerate(argv[1:], start=1):
+        if arg == "--profile" or arg.startswith("--profile="):
+            del argv[i]
+            enable(arg.split("=", 1)[1] if "=" in arg else None)
+            break
+    return _enabled
+
+def span(name, category="stage", **args):
+    """
+    建立計時區段（with 陳述式使用）
+
+    Args:
+        name: 區段名稱（統計表依名稱彙總）
+        category: 類別，如 stage / network / subprocess / fs
+        **args: 附加在 trace 事件上的參數
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, category, args)
+
+def traced(category="stage", name=None):
+    """函數裝飾器：每次呼叫記錄一個區段（停用時只多一次旗標檢查）"""
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(label, category, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record(name, category, start, duration, **args):
+    """
+    直接記錄一個已完成的區段
+
+    Args:
+        start: time.perf_counter() 的開始時間
+        duration: 秒
+    """
+    if not _enabled:
+        return
+    event = {
+        "name": name,
+        "cat": category,
+        "ph": "X",
+        "ts": round((start - _origin) * 1e6, 1),
+        "dur": round(duration * 1e6, 1),
+        "pid": os.getpid(),
+        "tid": threading.get_ident(),
+    }
+    if args:
+        event["args"] = {key: value if isinstance(value, (int, float, bool)) else str(value)
+                         for key, value in args.items()}
+    with _lock:
+        _events.append(event)
+
+def instrument_requests():
+    """為 requests 的所有 HTTP 請求加上 network 區段（僅在啟用時安裝）"""
+    try:
+        import requests
+    except ImportError:
+        return
+    send = requests.Session.send
+    if getattr(send, "_profiled", False):
+        return
+
+    @functools.wraps(send)
+    def profiled_send(self, request, **kwargs):
+        if not _enabled:
+            return send(self, request, **kwargs)
+        path = request.path_url.split("?", 1)[0]
+        with _Span(f"HTTP {request.method} {path}", "network", {"url": request.url}) as s:
+            response = send(self, request, **kwargs)
+            s.set(status=response.status_code, bytes=len(response.content) if not kwargs.get("stream") else -1)
+            return response
+
+    profiled_send._profiled = True
+    requests.Session.send = profiled_send
+
+def write_trace(path):
+    """輸出 Chrome trace-event JSON"""
+    with _lock:
+        events = list(_events)
+    names = {"ph": "M", "name": "process_name", "pid": os.getpid(), "args": {"name": os.path.basename(sys.argv[0] or "python")}}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": [names] + events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+def summarize():
+    """
+    依類別與名稱彙總
+
+    Returns:
+        list: [{"category", "name", "count", "total", "max"}]，依總耗時排序（秒）
+    """
+    stats = {}
+    with _lock:
+        events = list(_events)
+    for event in events:
+        key = (event["cat"], event["name"])
+        entry = stats.setdefault(key, {"category": key[0], "name": key[1], "count": 0, "total": 0.0, "max": 0.0})
+        duration = event["dur"] / 1e6
+        entry["count"] += 1
+        entry["total"] += duration
+        entry["max"] = max(entry["max"], duration)
+    return sorted(stats.values(), key=lambda entry: -entry["total"])
+
+def print_summary():
+    """輸出各階段統計表（巢狀區段會同時計入內外層）"""
+    wall = time.perf_counter() - _origin
+    print()
+    print("=" * 80)
+    print(f"效能剖析（總耗時 {wall:.3f} 秒）")
+    print("=" * 80)
+    print(f"{'類別':<12}{'名稱':<44}{'次數':>6}{'總計(ms)':>12}{'平均(ms)':>10}{'最大(ms)':>10}{'佔比':>7}")
+    for entry in summarize():
+        share = entry["total"] / wall * 100 if wall > 0 else 0
+        print(f"{entry['category']:<12}{entry['name'][:43]:<44}{entry['count']:>6}"
+              f"{entry['total'] * 1000:>12.1f}{entry['total'] / entry['count'] * 1000:>10.1f}"
+              f"{entry['max'] * 1000:>10.1f}{share:>6.1f}%")
+
+def _finish():
+    if not _events:
+        return
+    print_summary()
+    try:
+        write_trace(_trace_path)
+        print(f"trace 已輸出: {_trace_path}（以 chrome://tracing 或 https://ui.perfetto.dev 開啟）")
+    except OSError as e:
+        print(f"無法輸出 trace: {e}")
@@ -0,0 +1,358 @@
+"""
+路由器 HTTP 交換紀錄與重播
+
+錄製：以 HTTPAdapter 攔截 AsusRouterConnection 的所有請求，連同回應
+存成 gzip 壓縮的 cassette 檔（相同內容的回應只存一份）。登錄憑證
+（login_authorization、Authorization、Cookie / Set-Cookie 等）在寫入前遮蔽，
+檔案可以分享，也可收集不同韌體版本作為測試語料。
+
+重播：不連線，直接由記憶體回應，可離線測試與量測回應解析
+（標題擷取、登錄頁判斷、JSON/文字分支）的吞吐量。
+"""
+
+import base64
+import binascii
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+CASSETTE_VERSION = 1
+REDACTED = "REDACTED"
+
+# 一律遮蔽的欄位與標頭（不分大小寫）
+SENSITIVE_FIELDS = {"login_authorization", "password", "http_passwd", "http_username", "asus_token"}
+SENSITIVE_HEADERS = {"authorization", "proxy-authorization", "cookie"}
+
+# 參數值中看起來像 base64("帳號:密碼") 的片段
+_BASE64_TOKEN_RE = re.compile(r"[A-Za-z0-9+/]{8,}={0,2}")
+_BODY_TOKEN_RE = re.compile(r'(asus_token["\']?\s*[:=]\s*["\']?)([^"\'\s;&,}]+)', re.IGNORECASE)
+
+def _looks_like_credentials(token):
+    """判斷片段是否為 base64 編碼的「帳號:密碼」"""
+    try:
+        decoded = base64.b64decode(token, validate=True).decode("utf-8")
+    except (binascii.Error, ValueError):
+        return False
+    return ":" in decoded and decoded.isprintable()
+
+def _redact_value(name, value):
+    if name.lower() in SENSITIVE_FIELDS:
+        return REDACTED
+    return _BASE64_TOKEN_RE.sub(lambda m: REDACTED if _looks_like_credentials(m.group(0)) else m.group(0), value)
+
+def redact_url(url):
+    """
+    遮蔽 URL 查詢參數中的憑證
+
+    直接處理原始查詢字串，不做表單解碼：login() hook 後面接的是未編碼的
+    base64 憑證，其中的 '+' 經 parse_qsl 會變成空格而切斷片段、躲過比對。
+    login() hook 的參數一律遮蔽。
+    """
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    fields = []
+    for field in parts.query.split("&"):
+        name, sep, value = field.partition("=")
+        raw = unquote(value)
+        if unquote(name).lower() == "hook" and raw.startswith("login()") and raw != "login()":
+            redacted = "login()" + REDACTED
+        else:
+            redacted = _redact_value(unquote(name), raw)
+        fields.append(field if redacted == raw else f"{name}{sep}{quote(redacted, safe='()')}")
+    return urlunsplit(parts._replace(query="&".join(fields)))
+
+def redact_form(body):
+    """遮蔽表單內容中的憑證（非表單內容原樣回傳）"""
+    if not body:
+        return body
+    if isinstance(body, bytes):
+        try:
+            body = body.decode("utf-8")
+        except UnicodeDecodeError:
+            return body
+    if "=" not in body:
+        return body
+    return urlencode([(k, _redact_value(k, v)) for k, v in parse_qsl(body, keep_blank_values=True)])
+
+def redact_headers(headers):
+    """遮蔽請求或回應標頭，回傳 [[名稱, 值], ...]"""
+    redacted = []
+    for name, value in headers.items():
+        lowered = name.lower()
+        if lowered in SENSITIVE_HEADERS:
+            value = REDACTED
+        elif lowered == "set-cookie":
+            # 保留 cookie 名稱與屬性，只遮蔽值
+            value = re.sub(r"(^|,\s*)([^=,;\s]+)=[^;,]*", lambda m: f"{m.group(1)}{m.group(2)}={REDACTED}", value)
+        redacted.append([name, value])
+    return redacted
+
+def redact_body(text):
+    """遮蔽回應內容中的 token"""
+    return _BODY_TOKEN_RE.sub(lambda m: m.group(1) + REDACTED, text)
+
+class Cassette:
+    """HTTP 交換紀錄"""
+
+    def __init__(self, interactions=None, bodies=None, meta=None):
+        self.interactions = interactions or []
+        self.bodies = bodies or {}
+        self.meta = meta or {}
+
+    def _store_body(self, data):
+        """以內容雜湊存放回應內容，重複的內容只存一份"""
+        if data is None:
+            return None
+        key = hashlib.sha1(data).hexdigest()[:16]
+        if key not in self.bodies:
+            try:
+                text = redact_body(data.decode("utf-8"))
+                self.bodies[key] = {"text": text}
+            except UnicodeDecodeError:
+                self.bodies[key] = {"base64": base64.b64encode(data).decode("ascii")}
+        return key
+
+    def body(self, key):
+        """取出回應內容（bytes）"""
+        if key is None:
+            return b""
+        entry = self.bodies[key]
+        if "text" in entry:
+            return entry["text"].encode("utf-8")
+        return base64.b64decode(entry["base64"])
+
+    def add(self, request, response, elapsed):
+        """加入一筆交換（寫入前遮蔽憑證）"""
+        self.interactions.append({
+            "method": request.method,
+            "url": redact_url(request.url),
+            "body": redact_form(request.body),
+            "request_headers": redact_headers(request.headers),
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": redact_headers(response.headers),
+            "response": self._store_body(response.content),
+            "elapsed": round(elapsed, 4),
+        })
+
+    def save(self, path):
+        """寫入 gzip 壓縮的 JSON"""
+        data = {
+            "version": CASSETTE_VERSION,
+            "meta": self.meta,
+            "interactions": self.interactions,
+            "bodies": self.bodies,
+        }
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=9) as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        讀取 cassette
+
+        Raises:
+            ValueError: 版本不符或格式錯誤
+        """
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"不支援的 cassette 版本: {data.get('version')}")
+        return cls(data["interactions"], data["bodies"], data.get("meta"))
+
+def _request_key(method, url, body):
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", "replace")
+    return (method.upper(), redact_url(url), redact_form(body) or "")
+
+class RecordingAdapter(HTTPAdapter):
+    """實際送出請求並記錄到 cassette"""
+
+    def __init__(self, cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        started = time.perf_counter()
+        response = super().send(request, **kwargs)
+        # 讀取內容後才記錄（串流下載的回應不記錄內容）
+        if not kwargs.get("stream"):
+            self.cassette.add(request, response, time.perf_counter() - started)
+        return response
+
+class ReplayAdapter(HTTPAdapter):
+    """不連線，由 cassette 回應請求"""
+
+    def __init__(self, cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self.requests = 0
+        self.queues = {}
+        for interaction in cassette.interactions:
+            key = (interaction["method"], interaction["url"], interaction["body"] or "")
+            self.queues.setdefault(key, []).append(interaction)
+        self.rewind()
+
+    def rewind(self):
+        """從頭開始重播"""
+        self.positions = {key: 0 for key in self.queues}
+
+    def send(self, request, **kwargs):
+        key = _request_key(request.method, request.url, request.body)
+        queue = self.queues.get(key)
+        if not queue:
+            raise requests.exceptions.ConnectionError(f"cassette 中沒有 {request.method} {key[1]}", request=request)
+        # 同一請求依錄製順序回應，用完後重複最後一筆
+        position = self.positions[key]
+        interaction = queue[min(position, len(queue) - 1)]
+        self.positions[key] = position + 1
+        self.requests += 1
+        return self._build(request, interaction)
+
+    def _build(self, request, interaction):
+        response = requests.Response()
+        response.status_code = interaction["status"]
+        response.reason = interaction["reason"]
+        response.headers = CaseInsensitiveDict()
+        for name, value in interaction["headers"]:
+            response.headers[name] = value
+        response._content = self.cassette.body(interaction["response"])
+        response._content_consumed = True
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+def mount(session, adapter):
+    """把 adapter 安裝到 session 的 http 與 https"""
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return adapter
+
+def replay_scenario(router, username="admin", password="password"):
+    """
+    執行一輪完整流程（測試連接、登錄、取得資訊），輸出導向 devnull
+
+    Returns:
+        bool: 是否登錄成功
+    """
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        router.test_connection(verify_cert=False)
+        logged_in = router.login(username, password, verify_cert=False)
+        router.get_router_info(verify_cert=False)
+    return logged_in
+
+def benchmark(cassette_path, iterations=200):
+    """
+    以重播量測回應處理的吞吐量
+
+    Returns:
+        dict: {"iterations", "requests", "elapsed", "requests_per_s", "logged_in"}
+    """
+    from router_connection import AsusRouterConnection
+
+    cassette = Cassette.load(cassette_path)
+    meta = cassette.meta
+    router = AsusRouterConnection(hostname=meta.get("hostname", "router.invalid"),
+                                  port=meta.get("port", 8443), use_https=meta.get("use_https", True))
+    adapter = mount(router.session, ReplayAdapter(cassette))
+
+    logged_in = replay_scenario(router)
+    adapter.requests = 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        adapter.rewind()
+        router.session.cookies.clear()
+        replay_scenario(router)
+    elapsed = time.perf_counter() - started
+    return {
+        "iterations": iterations,
+        "requests": adapter.requests,
+        "elapsed": elapsed,
+        "requests_per_s": adapter.requests / elapsed if elapsed > 0 else 0.0,
+        "logged_in": logged_in,
+    }
+
+def record(cassette_path, hostname, port=8443, use_https=True):
+    """連線到路由器並錄製（登錄憑證由提示輸入，不會寫入檔案）"""
+    import getpass
+    from router_connection import AsusRouterConnection
+
+    cassette = Cassette(meta={
+        "hostname": hostname,
+        "port": port,
+        "use_https": use_https,
+        "recorded": time.strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    router = AsusRouterConnection(hostname=hostname, port=port, use_https=use_https)
+    mount(router.session, RecordingAdapter(cassette))
+
+    print("\n[1] 測試連接...")
+    if not router.test_connection(verify_cert=False):
+        print("[FAIL] 無法連接到路由器")
+    else:
+        username = input("請輸入路由器管理員用戶名 (直接按 Enter 跳過登錄): ").strip()
+        if username:
+            password = getpass.getpass("請輸入路由器管理員密碼: ")
+            print("\n[2] 登錄...")
+            router.login(username, password, verify_cert=False)
+        print("\n[3] 獲取路由器信息...")
+        router.get_router_info(verify_cert=False)
+
+    cassette.save(cassette_path)
+    print(f"\n[OK] 已錄製 {len(cassette.interactions)} 筆交換: {cassette_path}")
+
+def show(cassette_path):
+    """列出 cassette 內容"""
+    cassette = Cassette.load(cassette_path)
+    for key, value in cassette.meta.items():
+        print(f"{key}: {value}")
+    print()
+    for interaction in cassette.interactions:
+        size = len(cassette.body(interaction["response"]))
+        print(f"{interaction['method']:<5} {interaction['url']}")
+        print(f"      -> {interaction['status']} {interaction['reason']}，{size:,} bytes，{interaction['elapsed'] * 1000:.0f} ms")
+
+def main():
+    """主函數"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    options = dict(arg[2:].partition("=")[::2] for arg in sys.argv[1:] if arg.startswith("--"))
+    if len(args) < 2 or args[0] not in ("record", "replay", "show"):
+        print("用法:")
+        print("  python router_cassette.py record <cassette> [主機] [端口] [--http]")
+        print("  python router_cassette.py replay <cassette> [--iterations=200]")
+        print("  python router_cassette.py show <cassette>")
+        return
+
+    command, cassette_path = args[0], args[1]
+    try:
+        if command == "record":
+            hostname = args[2] if len(args) > 2 else "220.135.21.74"
+            port = int(args[3]) if len(args) > 3 else 8443
+            record(cassette_path, hostname, port, use_https="http" not in options)
+        elif command == "show":
+            show(cassette_path)
+        else:
+            result = benchmark(cassette_path, iterations=int(options.get("iterations") or 200))
+            print(f"重播 {result['iterations']} 輪，共 {result['requests']:,} 個請求，{result['elapsed']:.3f} 秒")
+            print(f"吞吐量: {result['requests_per_s']:,.0f} 請求/秒")
+            print(f"登錄判斷: {'成功' if result['logged_in'] else '失敗'}")
+    except (OSError, ValueError) as e:
+        print(f"[ERROR] {e}")
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,16 @@ from urllib3.exceptions import InsecureRequestWarning
 import os
 import sys
 import base64
+import json
+import re
 import socket
+import threading
+import time
+
+import profiling
+import router_scheduler
+from nvram_cache import NvramCache
+from config_backup import ConfigStore, SettingsDecoder, iter_file, parse_settings
 
 # 設置 UTF-8 編碼以支持中文輸出
 if sys.platform == 'win32':
@@ -21,6 +30,27 @@ if sys.platform == 'win32':
 # 禁用 SSL 警告（如果使用自簽名證書）
 urllib3.disable_warnings(InsecureRequestWarning)
 
+# 頁面標題（預先編譯，避免每次回應都重新解析樣式）
+_TITLE_RE = re.compile(r'<title>(.*?)</title>', re.IGNORECASE)
+
+# nvram 鍵只允許這些字元（避免把其他 hook 注入請求）
+_NVRAM_KEY_RE = re.compile(r'^[A-Za-z0-9_.:-]+$')
+_NVRAM_PAIR_RE = re.compile(r'"([A-Za-z0-9_.:-]+)"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+# 單一 appGet.cgi 請求的 hook 長度上限（韌體對 URL 長度有限制）
+NVRAM_MAX_HOOK_LENGTH = 1500
+
+# 預先取得的登錄頁面超過此秒數就不再使用（路由器的登錄 session 可能已過期）
+PREWARM_MAX_AGE = 600
+
+# 稽核常用的 nvram 鍵：WAN 狀態、DDNS 設定、韌體版本、遠端管理
+NVRAM_AUDIT_KEYS = [
+    "productid", "firmver", "buildno", "extendno",
+    "wan0_state_t", "wan0_ipaddr", "wan0_gateway", "wan0_dns", "wan0_proto",
+    "ddns_enable_x", "ddns_server_x", "ddns_hostname_x", "ddns_ipaddr", "ddns_return_code",
+    "lan_ipaddr", "http_enable", "https_lanport", "misc_http_x", "misc_httpsport_x",
+]
+
 class AsusRouterConnection:
     def __init__(self, hostname="coffeeLofe.asuscomm.com", port=8443, use_https=True, cert_path=None, key_path=None):
         """
@@ -39,7 +69,12 @@ class AsusRouterConnection:
         self.protocol = "https" if use_https else "http"
         self.base_url = f"{self.protocol}://{self.hostname}:{self.port}"
         self.session = requests.Session()
+        # 同一行程內的路由器連線共用排程器：操作者的請求優先於背景輪詢
+        router_scheduler.install(self.session)
         self.logged_in = False
+        self.nvram_cache = NvramCache(f"{self.hostname}:{self.port}")
+        self._prewarm_thread = None
+        self._prewarm_result = None
         
         # 設置證書路徑
         if cert_path and key_path:
@@ -99,6 +134,7 @@ class AsusRouterConnection:
             else:
                 self.cert = None
         
+    @profiling.traced("stage")
     def test_connection(self, verify_cert=True):
         """
         測試連接到路由器
@@ -122,10 +158,11 @@ class AsusRouterConnection:
             if self.cert:
                 print(f"[INFO] 使用客戶端證書進行認證")
             
-            response = self.session.get(
-                url,
-                **request_kwargs
-            )
+            with router_scheduler.priority(router_scheduler.HEALTH):
+                response = self.session.get(
+                    url,
+                    **request_kwargs
+                )
             
             print(f"連接成功！狀態碼: {response.status_code}")
             print(f"響應標頭: {dict(response.headers)}")
@@ -136,8 +173,7 @@ class AsusRouterConnection:
             
             # 顯示頁面標題（如果有的話）
             if "<title>" in response.text:
-                import re
-                title_match = re.search(r'<title>(.*?)</title>', response.text, re.IGNORECASE)
+                title_match = _TITLE_RE.search(response.text)
                 if title_match:
                     print(f"頁面標題: {title_match.group(1)}")
             
@@ -166,6 +202,57 @@ class AsusRouterConnection:
             print(f"發生錯誤: {e}")
             return False
     
+    def prewarm(self, verify_cert=False):
+        """
+        在背景執行緒建立連線並預先取得登錄頁面
+        
+        在等待使用者輸入憑證前呼叫：連線（TCP + TLS）留在 session 的連線池中，
+        登錄頁面的 Cookie 也已取得，login() 只需送出一次 POST。
+        背景請求進行時不要使用 self.session（login() 會先等它完成）。
+        
+        Args:
+            verify_cert: 是否驗證 SSL 證書（需與之後 login() 的設定相同）
+        """
+        if self._prewarm_thread is not None:
+            return
+        
+        def run():
+            started = time.time()
+            try:
+                with profiling.span("prewarm", "network"):
+                    response = self.session.get(
+                        f"{self.base_url}/",
+                        **self._prepare_request_kwargs(verify_cert)
+                    )
+                self._prewarm_result = (verify_cert, started, response.status_code)
+            except Exception:
+                # 預熱失敗時 login() 照常重新取得登錄頁面
+                self._prewarm_result = None
+        
+        self._prewarm_thread = threading.Thread(target=run, name="router-prewarm", daemon=True)
+        self._prewarm_thread.start()
+    
+    def _take_prewarm(self, verify_cert):
+        """
+        等待背景預熱完成並取用結果（只能取用一次）
+        
+        Returns:
+            bool: 已預先取得登錄頁面
+        """
+        thread = self._prewarm_thread
+        if thread is None:
+            return False
+        with profiling.span("prewarm 等待", "network"):
+            thread.join()
+        result = self._prewarm_result
+        self._prewarm_thread = None
+        self._prewarm_result = None
+        if result is None:
+            return False
+        prewarm_verify, started, status_code = result
+        return prewarm_verify == verify_cert and status_code < 500 and time.time() - started < PREWARM_MAX_AGE
+    
+    @profiling.traced("stage")
     def login(self, username, password, verify_cert=False):
         """
         登錄到路由器
@@ -181,13 +268,16 @@ class AsusRouterConnection:
         try:
             print(f"\n正在嘗試登錄到 {self.hostname}...")
             
-            # 先獲取登錄頁面以建立 session
-            print("獲取登錄頁面...")
-            request_kwargs = self._prepare_request_kwargs(verify_cert)
-            response = self.session.get(
-                f"{self.base_url}/",
-                **request_kwargs
-            )
+            # 先獲取登錄頁面以建立 session（已預熱時直接使用背景取得的結果）
+            if self._take_prewarm(verify_cert):
+                print("使用預先取得的登錄頁面")
+            else:
+                print("獲取登錄頁面...")
+                request_kwargs = self._prepare_request_kwargs(verify_cert)
+                response = self.session.get(
+                    f"{self.base_url}/",
+                    **request_kwargs
+                )
             
             # 華碩路由器有多種登錄方式，嘗試常見的端點
             login_endpoints = [
@@ -292,6 +382,7 @@ class AsusRouterConnection:
             traceback.print_exc()
             return False
     
+    @profiling.traced("stage")
     def get_router_info(self, verify_cert=True):
         """
         獲取路由器信息
@@ -324,10 +415,160 @@ class AsusRouterConnection:
         except Exception as e:
             print(f"獲取路由器信息時發生錯誤: {e}")
             return None
+    
+    def _nvram_hooks(self, keys):
+        """
+        把多個鍵合併成 nvram_get(...) hook 字串，超過長度上限時分批
+        
+        Yields:
+            tuple: (hook 字串, 這批的鍵)
+        """
+        batch = []
+        length = 0
+        for key in keys:
+            part = f"nvram_get({key});"
+            if batch and length + len(part) > NVRAM_MAX_HOOK_LENGTH:
+                yield "".join(f"nvram_get({k});" for k in batch), batch
+                batch = []
+                length = 0
+            batch.append(key)
+            length += len(part)
+        if batch:
+            yield "".join(f"nvram_get({k});" for k in batch), batch
+    
+    @staticmethod
+    def _parse_nvram_response(text, keys):
+        """
+        解析 appGet.cgi 的 nvram 回應
+        
+        Returns:
+            dict: {鍵: 值}；不是 nvram 回應（如被導向登錄頁）時回傳 None
+        """
+        try:
+            data = json.loads(text)
+        except ValueError:
+            # 部分韌體的回應不是嚴格的 JSON，逐一擷取 "鍵":"值"；
+            # 個別值的跳脫字元無效時只略過該鍵，其他鍵照常回傳
+            data = {}
+            for key, value in _NVRAM_PAIR_RE.findall(text):
+                try:
+                    data[key] = json.loads(f'"{value}"')
+                except ValueError:
+                    continue
+        if not isinstance(data, dict):
+            return None
+        values = {key: str(data[key]) for key in keys if key in data}
+        return values or None
+    
+    @profiling.traced("stage")
+    def get_nvram(self, keys, verify_cert=False, max_age=None):
+        """
+        批次讀取 nvram 值（需先登錄）
+        
+        多個鍵合併成一個 appGet.cgi 請求（hook=nvram_get(a);nvram_get(b);...），
+        URL 過長時才分成多批；有效時間內的值直接取自本地快取，
+        與上次不同的鍵記錄在 self.nvram_cache.last_changed。
+        
+        Args:
+            keys: nvram 鍵列表
+            verify_cert: 是否驗證 SSL 證書
+            max_age: 快取有效秒數（None 使用預設值，0 表示強制重新讀取）
+        
+        Returns:
+            dict: {鍵: 值}，讀取失敗的鍵不包含在內
+        """
+        keys = list(dict.fromkeys(keys))
+        invalid = [key for key in keys if not _NVRAM_KEY_RE.match(key)]
+        if invalid:
+            raise ValueError(f"無效的 nvram 鍵: {', '.join(invalid)}")
+        
+        values, missing = self.nvram_cache.lookup(keys, max_age)
+        fetched = {}
+        for hook, batch in self._nvram_hooks(missing):
+            try:
+                request_kwargs = self._prepare_request_kwargs(verify_cert)
+                request_kwargs["params"] = {"hook": hook}
+                response = self.session.get(
+                    f"{self.base_url}/appGet.cgi",
+                    **request_kwargs
+                )
+                result = self._parse_nvram_response(response.text, batch) if response.status_code == 200 else None
+                if result is None:
+                    print(f"[WARN] 無法讀取 nvram（狀態碼 {response.status_code}，可能尚未登錄）")
+                    break
+                fetched.update(result)
+            except Exception as e:
+                print(f"讀取 nvram 時發生錯誤: {e}")
+                break
+        
+        if fetched:
+            self.nvram_cache.update(fetched)
+            try:
+                self.nvram_cache.save()
+            except OSError as e:
+                print(f"[WARN] 無法寫入 nvram 快取: {e}")
+        else:
+            # 全部取自快取（或讀取失敗）：這次沒有觀察到變動
+            self.nvram_cache.last_changed = []
+        values.update(fetched)
+        return values
+    
+    @profiling.traced("stage")
+    def backup_settings(self, store=None, verify_cert=False):
+        """
+        下載設定備份（Settings_backup.cgi）並與上次的快照比較（需先登錄）
+        
+        以串流逐塊寫入磁碟，同時解碼計算內容雜湊；雜湊與上次相同時不解析、不保存，
+        不同時才從磁碟串流解析 key=value，保存快照並記錄差異。
+        
+        Args:
+            store: ConfigStore（None 時使用預設備份目錄）
+            verify_cert: 是否驗證 SSL 證書
+        
+        Returns:
+            dict: {"changed", "first", "hash", "keys", "diff", "path"}；失敗時回傳 None
+        """
+        store = store or ConfigStore(f"{self.hostname}:{self.port}")
+        tmp_path = store.temp_path()
+        decoder = SettingsDecoder()
+        try:
+            request_kwargs = self._prepare_request_kwargs(verify_cert)
+            request_kwargs["stream"] = True
+            with profiling.span("Settings_backup.cgi", "network"), router_scheduler.priority(router_scheduler.BULK):
+                with self.session.get(f"{self.base_url}/Settings_backup.cgi", **request_kwargs) as response:
+                    if response.status_code != 200:
+                        print(f"[WARN] 無法下載設定備份（狀態碼 {response.status_code}，可能尚未登錄）")
+                        return None
+                    with open(tmp_path, "wb") as f:
+                        for chunk in response.iter_content(64 * 1024):
+                            decoder.feed(chunk)
+                            f.write(chunk)
+            if decoder.format is None:
+                raise ValueError("設定備份內容不完整")
+            
+            content_hash = decoder.hexdigest()
+            result = {"changed": False, "first": store.latest_hash() is None, "hash": content_hash,
+                      "keys": None, "diff": None, "path": store.raw_path}
+            if content_hash == store.latest_hash():
+                store.touch()
+                return result
+            
+            settings = dict(parse_settings(iter_file(tmp_path)))
+            diff = store.commit(tmp_path, content_hash, settings, decoder.format)
+            result.update(keys=len(settings), diff=diff,
+                          changed=result["first"] or any(diff.values()))
+            return result
+        except Exception as e:
+            print(f"下載設定備份時發生錯誤: {e}")
+            return None
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
 
 def main():
     """主函數"""
+    profiling.init_from_argv()
     print("=" * 50)
     print("華碩路由器 DDNS 連接工具")
     print("=" * 50)
@@ -385,6 +626,8 @@ def main():
     print("\n[2] 登錄路由器...")
     print("=" * 50)
     
+    # 等待輸入時在背景預熱連線與登錄頁面
+    router.prewarm(verify_cert=False)
     username = input("請輸入路由器管理員用戶名 (直接按 Enter 跳過登錄): ").strip()
     if username:
         import getpass
@@ -0,0 +1,185 @@
+"""
+路由器請求排程
+
+路由器的 CPU 很弱，每台同時處理的請求數有上限。背景輪詢（流量、日誌、設定備份）
+與操作者的請求（登錄、查詢）共用同一個 session 時，操作者不應排在大量輪詢後面：
+- 每個請求依目前執行緒的優先等級（INTERACTIVE / HEALTH / BULK）排隊
+- 每台路由器與全域各有並行上限，BULK 另外保留名額給較高優先的請求，
+  即使輪詢佔滿也能立即送出操作者的請求
+- 同等級的請求在各路由器之間輪流（round-robin），單一路由器的大量輪詢
+  不會讓其他路由器等待
+
+以 HTTPAdapter 掛在 session 上，呼叫端只需用 priority() 標記背景工作：
+
+    with router_scheduler.priority(router_scheduler.BULK):
+        sampler.poll()
+"""
+
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+
+import profiling
+
+INTERACTIVE = 0
+HEALTH = 1
+BULK = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", HEALTH: "health", BULK: "bulk"}
+
+DEFAULT_PER_HOST = 2
+DEFAULT_GLOBAL_LIMIT = 8
+DEFAULT_RESERVED = 1
+
+_local = threading.local()
+
+def current_priority():
+    """目前執行緒的優先等級（未標記時為 INTERACTIVE）"""
+    return getattr(_local, "priority", INTERACTIVE)
+
+@contextlib.contextmanager
+def priority(level):
+    """在此區塊內送出的請求使用指定的優先等級"""
+    previous = current_priority()
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+class RequestScheduler:
+    """各路由器的並行上限、優先等級與公平排隊"""
+
+    def __init__(self, per_host=DEFAULT_PER_HOST, global_limit=DEFAULT_GLOBAL_LIMIT, reserved=DEFAULT_RESERVED):
+        """
+        Args:
+            per_host: 每台路由器同時處理的請求數上限
+            global_limit: 所有路由器合計的上限
+            reserved: 保留給 INTERACTIVE / HEALTH 的名額（BULK 最多使用上限減去此數，至少 1）
+        """
+        self.per_host = per_host
+        self.global_limit = global_limit
+        self.bulk_per_host = max(1, per_host - reserved)
+        self.bulk_global = max(1, global_limit - reserved)
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting = {}      # 主機 → [(等級, 序號, ticket)]（heap）
+        self._rotation = deque()  # 有請求在排隊的主機，依輪替順序
+        self._active = {}
+        self._bulk_active = {}
+        self._total = 0
+        self._bulk_total = 0
+        self.stats = {level: {"count": 0, "wait": 0.0, "max_wait": 0.0} for level in PRIORITY_NAMES}
+
+    def _can_start(self, host, level):
+        if level >= BULK:
+            return (self._bulk_active.get(host, 0) < self.bulk_per_host and self._bulk_total < self.bulk_global
+                    and self._active.get(host, 0) < self.per_host and self._total < self.global_limit)
+        return self._active.get(host, 0) < self.per_host and self._total < self.global_limit
+
+    def _dispatch(self):
+        """把空出的名額分給最高等級的請求；同等級時依主機輪替順序"""
+        granted = False
+        while self._rotation:
+            best = None
+            for host in self._rotation:
+                level = self._waiting[host][0][0]
+                if (best is None or level < best[1]) and self._can_start(host, level):
+                    best = (host, level)
+            if best is None:
+                break
+            host, level = best
+            ticket = heapq.heappop(self._waiting[host])[2]
+            self._active[host] = self._active.get(host, 0) + 1
+            self._total += 1
+            if level >= BULK:
+                self._bulk_active[host] = self._bulk_active.get(host, 0) + 1
+                self._bulk_total += 1
+            ticket["granted"] = True
+            granted = True
+            # 取得名額的主機移到輪替的最後
+            self._rotation.remove(host)
+            if self._waiting[host]:
+                self._rotation.append(host)
+            else:
+                del self._waiting[host]
+        if granted:
+            self._cond.notify_all()
+
+    def acquire(self, host, level=INTERACTIVE):
+        """
+        等待取得名額
+
+        Returns:
+            float: 等待秒數
+        """
+        started = time.perf_counter()
+        ticket = {"granted": False}
+        with self._cond:
+            if host not in self._waiting:
+                self._waiting[host] = []
+                self._rotation.append(host)
+            heapq.heappush(self._waiting[host], (level, next(self._seq), ticket))
+            self._dispatch()
+            while not ticket["granted"]:
+                self._cond.wait()
+            waited = time.perf_counter() - started
+            stats = self.stats[level]
+            stats["count"] += 1
+            stats["wait"] += waited
+            stats["max_wait"] = max(stats["max_wait"], waited)
+        return waited
+
+    def release(self, host, level=INTERACTIVE):
+        """歸還名額"""
+        with self._cond:
+            self._active[host] -= 1
+            self._total -= 1
+            if level >= BULK:
+                self._bulk_active[host] -= 1
+                self._bulk_total -= 1
+            self._dispatch()
+
+    def print_stats(self):
+        """輸出各等級的請求數與等待時間"""
+        for level, stats in self.stats.items():
+            if stats["count"]:
+                average = stats["wait"] / stats["count"] * 1000
+                print(f"  {PRIORITY_NAMES[level]:<12} {stats['count']:>6} 次  平均等待 {average:8.1f} ms"
+                      f"  最長 {stats['max_wait'] * 1000:8.1f} ms")
+
+# 同一個行程內的所有路由器連線共用，才能套用全域上限與跨主機輪替
+default_scheduler = RequestScheduler()
+
+class ScheduledAdapter(HTTPAdapter):
+    """送出請求前向排程器取得名額"""
+
+    def __init__(self, scheduler=None, **kwargs):
+        self.scheduler = scheduler or default_scheduler
+        kwargs.setdefault("pool_maxsize", max(10, self.scheduler.per_host))
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        host = urlsplit(request.url).netloc
+        level = current_priority()
+        waited = self.scheduler.acquire(host, level)
+        if waited > 0.001:
+            profiling.record("排程等待", "scheduler", time.perf_counter() - waited, waited,
+                             host=host, priority=PRIORITY_NAMES[level])
+        try:
+            # 串流下載時只涵蓋到回應標頭，內容由呼叫端之後讀取
+            return super().send(request, **kwargs)
+        finally:
+            self.scheduler.release(host, level)
+
+def install(session, scheduler=None):
+    """在 session 上掛載排程 adapter（http 與 https）"""
+    adapter = ScheduledAdapter(scheduler)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return adapter
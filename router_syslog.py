@@ -0,0 +1,274 @@
+"""
+路由器系統日誌增量讀取
+
+每台路由器記錄已讀取的位置（位元組偏移）與最後一行的雜湊，下次只取新的行：
+- 先以 Range 請求只下載偏移之後的內容（連同最後一行用來確認日誌沒有輪替）
+- 韌體不支援 Range 時下載完整日誌，但只在偏移處比對，不重新解析舊的內容
+- 日誌輪替或前段被截斷時，由結尾往前找最後一行的雜湊；找不到則全部視為新行
+
+各步驟以產生器串接（切行 → 解碼與記錄偏移 → 解析 → 篩選），只處理實際用到的行；
+偏移隨每個交出的行前進，產生器結束或中途關閉時寫回狀態檔，重新啟動後從上次的位置繼續。
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+import profiling
+import router_scheduler
+from router_connection import AsusRouterConnection
+
+DEFAULT_STATE_PATH = os.path.join(os.path.expanduser("~"), ".wuchang_cache", "syslog_state.json")
+SYSLOG_PATH = "/syslog.txt"
+CHUNK_SIZE = 64 * 1024
+
+# 例: "May  5 12:00:01 dnsmasq-dhcp[1234]: DHCPACK(br0) ..."
+_SYSLOG_RE = re.compile(
+    r"^(?P<timestamp>[A-Z][a-z]{2}\s+\d{1,2}\s+\d\d:\d\d:\d\d)\s+"
+    r"(?:(?P<host>[\w.-]+)\s+)?"
+    r"(?P<process>[^\s:\[]+)(?:\[(?P<pid>\d+)\])?:\s?(?P<message>.*)$"
+)
+
+def line_hash(line):
+    """行的雜湊（含換行字元）"""
+    return hashlib.sha1(line).hexdigest()[:16]
+
+class SyslogState:
+    """各路由器日誌的讀取位置"""
+
+    def __init__(self, path=DEFAULT_STATE_PATH):
+        self.path = path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, key):
+        """回傳 {"offset", "hash", "length"}，沒有紀錄時 offset 為 0"""
+        return self.entries.get(key) or {"offset": 0, "hash": None, "length": 0}
+
+    def set(self, key, offset, last_line):
+        self.entries[key] = {
+            "offset": offset,
+            "hash": line_hash(last_line),
+            "length": len(last_line),
+            "updated": time.time(),
+        }
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+def split_lines(chunks):
+    """
+    把位元組區塊切成完整的行（含換行字元）
+
+    最後沒有換行的部分可能仍在寫入，不交出，下次再讀。
+    """
+    pending = b""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        data = pending + chunk
+        start = 0
+        while True:
+            end = data.find(b"\n", start)
+            if end < 0:
+                break
+            yield data[start:end + 1]
+            start = end + 1
+        pending = data[start:]
+
+def parse_lines(lines):
+    """
+    解析 syslog 行
+
+    Yields:
+        dict: {"timestamp", "host", "process", "pid", "message", "raw"}；
+              無法解析的行只有 raw 與 message
+    """
+    for line in lines:
+        match = _SYSLOG_RE.match(line)
+        if match:
+            record = match.groupdict()
+            record["raw"] = line
+        else:
+            record = {"timestamp": None, "host": None, "process": None, "pid": None, "message": line, "raw": line}
+        yield record
+
+def filter_records(records, process=None, pattern=None):
+    """依程序名稱（前綴）或訊息樣式篩選"""
+    regex = re.compile(pattern) if pattern else None
+    for record in records:
+        if process and not (record["process"] or "").startswith(process):
+            continue
+        if regex and not regex.search(record["message"]):
+            continue
+        yield record
+
+class SyslogTail:
+    """增量讀取單一路由器的系統日誌（需先登錄）"""
+
+    def __init__(self, router, state=None, path=SYSLOG_PATH, verify_cert=False):
+        """
+        Args:
+            router: 已登錄的 AsusRouterConnection
+            state: SyslogState（None 時使用預設狀態檔）
+            path: 日誌的 URL 路徑
+            verify_cert: 是否驗證 SSL 證書
+        """
+        self.router = router
+        self.state = state or SyslogState()
+        self.path = path
+        self.verify_cert = verify_cert
+        self.key = f"{router.hostname}:{router.port}{path}"
+        self.downloaded = 0
+
+    def _get(self, headers=None):
+        request_kwargs = self.router._prepare_request_kwargs(self.verify_cert)
+        request_kwargs["stream"] = True
+        if headers:
+            request_kwargs["headers"] = headers
+        with router_scheduler.priority(router_scheduler.BULK):
+            return self.router.session.get(f"{self.router.base_url}{self.path}", **request_kwargs)
+
+    def _chunks(self, response):
+        for chunk in response.iter_content(CHUNK_SIZE):
+            self.downloaded += len(chunk)
+            yield chunk
+
+    def _raw_lines(self, entry):
+        """
+        取得新的行
+
+        Yields:
+            tuple: (行, 該行結尾的偏移)
+        """
+        offset, anchor_hash, anchor_length = entry["offset"], entry["hash"], entry["length"]
+        response = None
+        try:
+            if offset and anchor_hash:
+                # 連同最後一行一起要求，用來確認日誌沒有被輪替
+                start = offset - anchor_length
+                with profiling.span("syslog Range", "network", start=start):
+                    response = self._get({"Range": f"bytes={start}-"})
+                if response.status_code == 206:
+                    chunks = self._chunks(response)
+                    lines = split_lines(chunks)
+                    first = next(lines, None)
+                    if first is not None and line_hash(first) == anchor_hash:
+                        position = offset
+                        for line in lines:
+                            position += len(line)
+                            yield line, position
+                        return
+                    # 對不上：日誌已輪替或前段被截斷，改為下載完整內容
+                    response.close()
+                    response = None
+                elif response.status_code != 200:
+                    # 416 等：日誌比上次短，已輪替
+                    response.close()
+                    response = None
+            if response is None:
+                with profiling.span("syslog 完整下載", "network"):
+                    response = self._get()
+                if response.status_code != 200:
+                    print(f"[WARN] 無法讀取日誌（狀態碼 {response.status_code}，可能尚未登錄）")
+                    return
+
+            # 不支援 Range：下載完整內容，但只在偏移處比對，不重新解析舊的行
+            content = b"".join(self._chunks(response))
+            start = self._resume_position(content, offset, anchor_hash, anchor_length)
+            position = start
+            for line in split_lines([content[start:]]):
+                position += len(line)
+                yield line, position
+        finally:
+            if response is not None:
+                response.close()
+
+    @staticmethod
+    def _resume_position(content, offset, anchor_hash, anchor_length):
+        """在完整內容中找出新行的起點"""
+        if not offset or not anchor_hash:
+            return 0
+        if len(content) >= offset and line_hash(content[offset - anchor_length:offset]) == anchor_hash:
+            return offset
+        # 前段被截斷或已輪替：由結尾往前找最後讀過的行
+        end = len(content)
+        while end > 0:
+            start = content.rfind(b"\n", 0, end - 1) + 1
+            if line_hash(content[start:end]) == anchor_hash:
+                return end
+            end = start
+        return 0
+
+    def lines(self):
+        """
+        新的日誌行（str）
+
+        偏移隨每個交出的行前進，產生器結束或被關閉時寫回狀態檔。
+        """
+        entry = self.state.get(self.key)
+        last = None
+        try:
+            for line, position in self._raw_lines(entry):
+                last = (position, line)
+                yield line.decode("utf-8", "replace").rstrip("\r\n")
+        finally:
+            if last is not None:
+                self.state.set(self.key, last[0], last[1])
+                try:
+                    self.state.save()
+                except OSError as e:
+                    print(f"[WARN] 無法寫入日誌狀態: {e}")
+
+    def records(self, process=None, pattern=None):
+        """新的日誌紀錄（解析後，可依程序或訊息篩選）"""
+        return filter_records(parse_lines(self.lines()), process=process, pattern=pattern)
+
+def main():
+    """主函數"""
+    import getpass
+
+    profiling.init_from_argv()
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    options = dict(arg[2:].partition("=")[::2] for arg in sys.argv[1:] if arg.startswith("--"))
+    hostname = args[0] if args else "220.135.21.74"
+    port = int(args[1]) if len(args) > 1 else 8443
+    interval = int(options["follow"] or 60) if "follow" in options else None
+
+    router = AsusRouterConnection(hostname=hostname, port=port, use_https=port in (443, 8443, 8444))
+    try:
+        username = input("請輸入路由器管理員用戶名: ").strip()
+        password = getpass.getpass("請輸入路由器管理員密碼: ")
+    except (EOFError, KeyboardInterrupt):
+        print("\n操作已取消")
+        return
+    if not router.login(username, password, verify_cert=False):
+        print("[FAIL] 登錄失敗")
+        return
+
+    tail = SyslogTail(router)
+    try:
+        while True:
+            count = 0
+            for record in tail.records(process=options.get("process"), pattern=options.get("grep")):
+                print(record["raw"])
+                count += 1
+            print(f"[INFO] 新增 {count} 行，下載 {tail.downloaded:,} bytes", file=sys.stderr)
+            if interval is None:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\n已停止")
+
+if __name__ == "__main__":
+    main()
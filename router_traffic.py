@@ -0,0 +1,327 @@
+"""
+路由器介面流量取樣
+
+以同一個 session（keep-alive 連線）定期讀取 appGet.cgi 的 netdev hook，
+由各介面的收發位元組計數器（十六進位字串）計算速率：
+- 計數器溢位（32 / 64 位元）時以環繞計算差值，重新開機歸零時不產生假的尖峰
+- 每個介面的樣本存在 array 環狀緩衝區，記憶體固定，不隨執行時間增加
+- 1 秒 / 1 分 / 5 分的平均與峰值隨每個樣本增量累計，不必重新掃描原始樣本
+"""
+
+from array import array
+import json
+import sys
+import time
+
+import profiling
+import router_scheduler
+import telemetry_store
+from router_connection import AsusRouterConnection
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_CAPACITY = 600
+AGGREGATE_PERIODS = (1, 60, 300)
+
+def parse_netdev(text):
+    """
+    解析 netdev hook 的回應
+
+    Returns:
+        dict: {介面: (接收位元組, 傳送位元組)}；格式不符時回傳 None
+    """
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    data = data.get("netdev", data)
+    counters = {}
+    for name, value in data.items():
+        if not isinstance(value, str) or not name.endswith(("_rx", "_tx")):
+            continue
+        try:
+            count = int(value, 16)
+        except ValueError:
+            continue
+        interface, direction = name.rsplit("_", 1)
+        rx, tx = counters.get(interface, (0, 0))
+        counters[interface] = (count, tx) if direction == "rx" else (rx, count)
+    return counters
+
+def counter_delta(old, new):
+    """
+    計數器差值（處理溢位與歸零）
+
+    舊值在 32 位元範圍內時以 2**32 環繞，否則以 2**64；
+    環繞後的差值超過範圍一半時視為路由器重新開機、計數器歸零。
+    """
+    if new >= old:
+        return new - old
+    width = 1 << (32 if old < (1 << 32) else 64)
+    wrapped = new + width - old
+    if wrapped > width // 2:
+        return new
+    return wrapped
+
+class RingBuffer:
+    """固定容量的多欄位環狀緩衝區（每欄一個 array('d')）"""
+
+    def __init__(self, capacity, fields):
+        self.capacity = capacity
+        self.fields = fields
+        self.columns = {field: array("d", bytes(8 * capacity)) for field in fields}
+        self.start = 0
+        self.count = 0
+
+    def append(self, *values):
+        index = (self.start + self.count) % self.capacity
+        for field, value in zip(self.fields, values):
+            self.columns[field][index] = value
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def __len__(self):
+        return self.count
+
+    def rows(self):
+        """由舊到新回傳各列（tuple）"""
+        columns = [self.columns[field] for field in self.fields]
+        for i in range(self.count):
+            index = (self.start + i) % self.capacity
+            yield tuple(column[index] for column in columns)
+
+    def last(self):
+        if not self.count:
+            return None
+        index = (self.start + self.count - 1) % self.capacity
+        return tuple(self.columns[field][index] for field in self.fields)
+
+class Downsampler:
+    """
+    固定時間區間的增量彙總
+
+    以位元組差值與經過時間累計目前區間，跨入下一個區間時
+    把平均速率與峰值寫入環狀緩衝區。
+    """
+
+    FIELDS = ("time", "rx_avg", "tx_avg", "rx_peak", "tx_peak")
+
+    def __init__(self, period, capacity):
+        self.period = period
+        self.buckets = RingBuffer(capacity, self.FIELDS)
+        self.bucket_start = None
+        self._reset()
+
+    def _reset(self):
+        self.rx_bytes = 0
+        self.tx_bytes = 0
+        self.seconds = 0.0
+        self.rx_peak = 0.0
+        self.tx_peak = 0.0
+
+    def add(self, timestamp, seconds, rx_bytes, tx_bytes):
+        bucket_start = timestamp - timestamp % self.period
+        if self.bucket_start is not None and bucket_start != self.bucket_start:
+            self.flush()
+        self.bucket_start = bucket_start
+        self.rx_bytes += rx_bytes
+        self.tx_bytes += tx_bytes
+        self.seconds += seconds
+        if seconds > 0:
+            self.rx_peak = max(self.rx_peak, rx_bytes / seconds)
+            self.tx_peak = max(self.tx_peak, tx_bytes / seconds)
+
+    def flush(self):
+        """結束目前區間"""
+        if self.bucket_start is None or self.seconds <= 0:
+            return
+        self.buckets.append(self.bucket_start, self.rx_bytes / self.seconds, self.tx_bytes / self.seconds,
+                            self.rx_peak, self.tx_peak)
+        self._reset()
+
+    def current(self):
+        """尚未結束的區間（平均速率），沒有資料時回傳 None"""
+        if self.seconds <= 0:
+            return None
+        return (self.bucket_start, self.rx_bytes / self.seconds, self.tx_bytes / self.seconds,
+                self.rx_peak, self.tx_peak)
+
+class InterfaceSeries:
+    """單一介面的原始樣本與各區間彙總"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, periods=AGGREGATE_PERIODS):
+        self.samples = RingBuffer(capacity, ("time", "rx_rate", "tx_rate"))
+        self.aggregates = {period: Downsampler(period, capacity) for period in periods}
+        self.rx_total = 0
+        self.tx_total = 0
+
+    def add(self, timestamp, seconds, rx_bytes, tx_bytes):
+        self.rx_total += rx_bytes
+        self.tx_total += tx_bytes
+        self.samples.append(timestamp, rx_bytes / seconds, tx_bytes / seconds)
+        for downsampler in self.aggregates.values():
+            downsampler.add(timestamp, seconds, rx_bytes, tx_bytes)
+
+class TrafficSampler:
+    """定期讀取 netdev 計數器並計算速率（需先登錄）"""
+
+    def __init__(self, router, interval=DEFAULT_INTERVAL, capacity=DEFAULT_CAPACITY, verify_cert=False):
+        """
+        Args:
+            router: 已登錄的 AsusRouterConnection
+            interval: 取樣間隔（秒，可小於 1）
+            capacity: 每個介面、每種區間保留的樣本數
+            verify_cert: 是否驗證 SSL 證書
+        """
+        self.router = router
+        self.interval = interval
+        self.capacity = capacity
+        self.verify_cert = verify_cert
+        self.series = {}
+        self.last_counters = None
+        self.last_time = None
+        self.errors = 0
+
+    def fetch(self):
+        """讀取一次計數器，失敗時回傳 None"""
+        request_kwargs = self.router._prepare_request_kwargs(self.verify_cert)
+        request_kwargs["params"] = {"hook": "netdev(appobj)"}
+        try:
+            with profiling.span("netdev", "network"), router_scheduler.priority(router_scheduler.BULK):
+                response = self.router.session.get(f"{self.router.base_url}/appGet.cgi", **request_kwargs)
+        except Exception as e:
+            print(f"讀取流量計數器時發生錯誤: {e}")
+            return None
+        if response.status_code != 200:
+            return None
+        return parse_netdev(response.text)
+
+    def poll(self):
+        """
+        取樣一次
+
+        Returns:
+            dict: {介面: (接收速率, 傳送速率)}（位元組/秒）；第一次取樣或失敗時為空
+        """
+        monotonic = time.monotonic()
+        counters = self.fetch()
+        if counters is None:
+            self.errors += 1
+            return {}
+        timestamp = time.time()
+        rates = {}
+        if self.last_counters is not None:
+            seconds = monotonic - self.last_time
+            if seconds > 0:
+                for interface, (rx, tx) in counters.items():
+                    if interface not in self.last_counters:
+                        continue
+                    old_rx, old_tx = self.last_counters[interface]
+                    rx_bytes = counter_delta(old_rx, rx)
+                    tx_bytes = counter_delta(old_tx, tx)
+                    series = self.series.get(interface)
+                    if series is None:
+                        series = self.series[interface] = InterfaceSeries(self.capacity)
+                    series.add(timestamp, seconds, rx_bytes, tx_bytes)
+                    rates[interface] = (rx_bytes / seconds, tx_bytes / seconds)
+        self.last_counters = counters
+        self.last_time = monotonic
+        return rates
+
+    def run(self, duration=None, callback=None):
+        """
+        持續取樣（以固定時間表排程，處理時間不會累積成漂移）
+
+        Args:
+            duration: 執行秒數（None 表示直到中斷）
+            callback: 每次取樣後呼叫 callback(rates)
+        """
+        started = time.monotonic()
+        ticks = 0
+        try:
+            while duration is None or time.monotonic() - started < duration:
+                rates = self.poll()
+                if callback and rates:
+                    callback(rates)
+                ticks += 1
+                delay = started + ticks * self.interval - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    # 請求比間隔慢時跳過錯過的時間點，避免連續補發
+                    ticks = int((time.monotonic() - started) / self.interval) + 1
+        finally:
+            for series in self.series.values():
+                for downsampler in series.aggregates.values():
+                    downsampler.flush()
+
+def format_rate(rate):
+    """位元組/秒 → Mbps"""
+    return f"{rate * 8 / 1e6:8.2f} Mbps"
+
+def print_summary(sampler):
+    """輸出各介面的總流量與各區間的平均與峰值"""
+    print()
+    for interface, series in sorted(sampler.series.items()):
+        print(f"{interface}: 接收 {series.rx_total / 1e6:.1f} MB，傳送 {series.tx_total / 1e6:.1f} MB")
+        for period, downsampler in series.aggregates.items():
+            rows = list(downsampler.buckets.rows())
+            if not rows:
+                continue
+            rx_avg = sum(row[1] for row in rows) / len(rows)
+            tx_avg = sum(row[2] for row in rows) / len(rows)
+            rx_peak = max(row[3] for row in rows)
+            tx_peak = max(row[4] for row in rows)
+            print(f"  {period:>4} 秒區間 x{len(rows):<4} 平均 ↓{format_rate(rx_avg)} ↑{format_rate(tx_avg)}"
+                  f"  峰值 ↓{format_rate(rx_peak)} ↑{format_rate(tx_peak)}")
+
+def main():
+    """主函數"""
+    import getpass
+
+    profiling.init_from_argv()
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    options = dict(arg[2:].partition("=")[::2] for arg in sys.argv[1:] if arg.startswith("--"))
+    hostname = args[0] if args else "220.135.21.74"
+    port = int(args[1]) if len(args) > 1 else 8443
+    interval = float(options.get("interval") or DEFAULT_INTERVAL)
+    duration = float(options["duration"]) if options.get("duration") else None
+
+    router = AsusRouterConnection(hostname=hostname, port=port, use_https=port in (443, 8443, 8444))
+    try:
+        username = input("請輸入路由器管理員用戶名: ").strip()
+        password = getpass.getpass("請輸入路由器管理員密碼: ")
+    except (EOFError, KeyboardInterrupt):
+        print("\n操作已取消")
+        return
+    if not router.login(username, password, verify_cert=False):
+        print("[FAIL] 登錄失敗")
+        return
+
+    # 加上 --export 時把每次取樣附加到欄式遙測資料表
+    writer = telemetry_store.open_table("traffic", telemetry_store.TRAFFIC_COLUMNS) if "export" in options else None
+    host = f"{hostname}:{port}"
+    
+    def show(rates):
+        if writer is not None:
+            now = time.time()
+            for name, (rx, tx) in rates.items():
+                writer.append({"time": now, "host": host, "interface": name, "rx_rate": rx, "tx_rate": tx})
+        parts = [f"{name} ↓{format_rate(rx)} ↑{format_rate(tx)}" for name, (rx, tx) in sorted(rates.items())]
+        print(f"{time.strftime('%H:%M:%S')}  " + "  ".join(parts), flush=True)
+
+    sampler = TrafficSampler(router, interval=interval)
+    try:
+        sampler.run(duration=duration, callback=show)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if writer is not None:
+            writer.close()
+    print_summary(sampler)
+
+if __name__ == "__main__":
+    main()
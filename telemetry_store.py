@@ -0,0 +1,447 @@
+"""
+遙測資料的欄式儲存
+
+路由器遙測（連線裝置數、回應時間、介面流量）與磁碟大小紀錄以欄式二進位格式附加保存，
+報表不必再重新解析文字紀錄：
+- 每個資料表一個目錄：schema.json（欄位名稱與型別、已提交的列數）與每欄一個固定寬度的檔案
+- 數值欄為原生位元組順序的 f64 / i64 / u32；字串欄以字典編碼（u32 代碼 + .dict 字典檔）
+- 寫入時先累積在 array 中，每 flush 一次把各欄附加到檔案，最後才更新 schema.json 的列數；
+  中斷時未提交的部分在下次開啟時截掉，讀取端只看已提交的列
+- 讀取端以 mmap 對應欄檔，memoryview.cast 直接當成型別陣列使用，不複製；
+  有安裝 numpy 時改為 numpy.frombuffer，篩選與彙總可向量化
+- 同一個資料表同時只允許一個寫入端：開啟時會截掉未提交的部分，
+  寫入端存續期間持有資料表目錄中鎖定檔的獨占鎖，其他程序開啟時直接失敗
+"""
+
+from array import array
+import json
+import mmap
+import os
+import re
+import sys
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+FORMAT_VERSION = 1
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser("~"), ".wuchang_cache", "telemetry")
+DEFAULT_FLUSH_ROWS = 4096
+LOCK_FILE_NAME = "writer.lock"
+
+# 欄位型別 → array / memoryview 的型別代碼（str 為字典編碼的 u32）
+TYPECODES = {"f64": "d", "i64": "q", "u32": "I", "str": "I"}
+NUMPY_DTYPES = {"d": "f8", "q": "i8", "I": "u4"}
+
+_MAC_RE = re.compile(r"^[0-9A-Fa-f]{2}(?::[0-9A-Fa-f]{2}){5}$")
+
+ROUTER_INFO_COLUMNS = [("time", "f64"), ("host", "str"), ("clients", "u32"), ("latency_ms", "f64")]
+TRAFFIC_COLUMNS = [("time", "f64"), ("host", "str"), ("interface", "str"), ("rx_rate", "f64"), ("tx_rate", "f64")]
+DISK_COLUMNS = [("time", "f64"), ("key", "str"), ("size", "i64")]
+
+def table_path(table, directory=DEFAULT_STORE_DIR):
+    """資料表目錄"""
+    return os.path.join(directory, table)
+
+def _load_schema(path):
+    with open(os.path.join(path, "schema.json"), "r", encoding="utf-8") as f:
+        schema = json.load(f)
+    if schema.get("version") != FORMAT_VERSION:
+        raise ValueError(f"不支援的資料表版本: {schema.get('version')}")
+    if schema.get("byteorder") != sys.byteorder:
+        raise ValueError(f"資料表的位元組順序（{schema.get('byteorder')}）與本機不同")
+    return schema
+
+def _lock_table(path):
+    """
+    取得資料表的獨占寫入鎖（非阻塞），回傳鎖定檔的 fd
+
+    Raises:
+        OSError: 其他寫入端正持有此資料表
+    """
+    fd = os.open(os.path.join(path, LOCK_FILE_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        elif msvcrt is not None:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        os.close(fd)
+        raise OSError(f"資料表 {path} 正由其他程序寫入") from None
+    return fd
+
+def _unlock_table(fd):
+    if fcntl is None and msvcrt is not None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    os.close(fd)
+
+class TableWriter:
+    """附加寫入一個資料表（存續期間獨占資料表，用完須 close）"""
+
+    def __init__(self, path, columns, flush_rows=DEFAULT_FLUSH_ROWS):
+        """
+        Args:
+            path: 資料表目錄
+            columns: [(欄位名稱, 型別)]，型別為 TYPECODES 的鍵
+            flush_rows: 累積多少列寫入一次
+        """
+        self.path = path
+        self.columns = [(name, kind) for name, kind in columns]
+        for name, kind in self.columns:
+            if kind not in TYPECODES:
+                raise ValueError(f"不支援的欄位型別: {name} {kind}")
+        self.flush_rows = flush_rows
+        os.makedirs(path, exist_ok=True)
+        # 開啟時會截掉未提交的部分，必須先取得獨占鎖，避免截掉其他寫入端正在附加的資料
+        self._lock_fd = _lock_table(path)
+        try:
+            self._open()
+        except BaseException:
+            self._release()
+            raise
+
+    def _open(self):
+        path = self.path
+        try:
+            self.schema = _load_schema(path)
+        except FileNotFoundError:
+            self.schema = {
+                "version": FORMAT_VERSION,
+                "byteorder": sys.byteorder,
+                "columns": [{"name": name, "type": kind} for name, kind in self.columns],
+                "rows": 0,
+                "dictionaries": {},
+            }
+        existing = [(column["name"], column["type"]) for column in self.schema["columns"]]
+        if existing != self.columns:
+            raise ValueError(f"資料表 {path} 的欄位與要寫入的不同")
+
+        self.rows = self.schema["rows"]
+        self.buffers = {name: array(TYPECODES[kind]) for name, kind in self.columns}
+        self.dictionaries = {}
+        self.new_strings = {}
+        for name, kind in self.columns:
+            column_path = self._column_path(name)
+            # 截掉上次中斷時未提交的部分
+            with open(column_path, "ab") as f:
+                f.truncate(self.rows * self.buffers[name].itemsize)
+            if kind == "str":
+                self.dictionaries[name] = self._load_dictionary(name)
+                self.new_strings[name] = []
+
+    def _column_path(self, name):
+        return os.path.join(self.path, f"{name}.col")
+
+    def _dictionary_path(self, name):
+        return os.path.join(self.path, f"{name}.dict")
+
+    def _load_dictionary(self, name):
+        # 只以 b"\n" 分行（json.dumps 會跳脫字串中的換行）：str.splitlines 也會在
+        # U+2028 等字元處分行，而 ensure_ascii=False 不會跳脫它們
+        size = self.schema["dictionaries"].get(name, 0)
+        with open(self._dictionary_path(name), "ab+") as f:
+            f.truncate(size)
+            f.seek(0)
+            lines = f.read().split(b"\n")[:-1]
+        return {json.loads(line): code for code, line in enumerate(lines)}
+
+    def append(self, row):
+        """
+        加入一列
+
+        Args:
+            row: {欄位名稱: 值}
+        """
+        for name, kind in self.columns:
+            value = row[name]
+            if kind == "str":
+                codes = self.dictionaries[name]
+                value = str(value)
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(codes)
+                    self.new_strings[name].append(value)
+                value = code
+            self.buffers[name].append(value)
+        if len(self.buffers[self.columns[0][0]]) >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        """把累積的列附加到欄檔並提交列數"""
+        pending = len(self.buffers[self.columns[0][0]])
+        if not pending:
+            return
+        for name, kind in self.columns:
+            with open(self._column_path(name), "ab") as f:
+                self.buffers[name].tofile(f)
+            self.buffers[name] = array(TYPECODES[kind])
+            if kind == "str" and self.new_strings[name]:
+                with open(self._dictionary_path(name), "ab") as f:
+                    f.write("".join(json.dumps(value, ensure_ascii=False) + "\n"
+                                    for value in self.new_strings[name]).encode("utf-8"))
+                    self.schema["dictionaries"][name] = f.tell()
+                self.new_strings[name] = []
+        self.rows += pending
+        self.schema["rows"] = self.rows
+        tmp_path = os.path.join(self.path, "schema.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.schema, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.path, "schema.json"))
+
+    def close(self):
+        """寫出剩餘的列並釋放寫入鎖"""
+        try:
+            self.flush()
+        finally:
+            self._release()
+
+    def _release(self):
+        if self._lock_fd is not None:
+            _unlock_table(self._lock_fd)
+            self._lock_fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class TableReader:
+    """以 mmap 讀取資料表（欄位不複製）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.schema = _load_schema(path)
+        self.rows = self.schema["rows"]
+        self.types = {column["name"]: column["type"] for column in self.schema["columns"]}
+        self._maps = {}
+        self._strings = {}
+
+    def _map(self, name):
+        mapped = self._maps.get(name)
+        if mapped is None:
+            with open(os.path.join(self.path, f"{name}.col"), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[name] = mapped
+        return mapped
+
+    def column(self, name):
+        """
+        欄位值（唯讀、不複製）
+
+        Returns:
+            numpy.ndarray（有安裝 numpy 時）或 memoryview；字串欄為字典代碼
+        """
+        typecode = TYPECODES[self.types[name]]
+        if not self.rows:
+            return numpy.empty(0, NUMPY_DTYPES[typecode]) if numpy is not None else memoryview(array(typecode))
+        mapped = self._map(name)
+        if numpy is not None:
+            return numpy.frombuffer(mapped, dtype=NUMPY_DTYPES[typecode], count=self.rows)
+        itemsize = array(typecode).itemsize
+        return memoryview(mapped)[:self.rows * itemsize].cast(typecode)
+
+    def strings(self, name):
+        """字串欄的字典（代碼 → 字串）"""
+        values = self._strings.get(name)
+        if values is None:
+            size = self.schema["dictionaries"].get(name, 0)
+            with open(os.path.join(self.path, f"{name}.dict"), "rb") as f:
+                values = [json.loads(line) for line in f.read(size).split(b"\n")[:-1]]
+            self._strings[name] = values
+        return values
+
+    def code(self, name, value):
+        """字串在字典中的代碼，不存在時回傳 None"""
+        try:
+            return self.strings(name).index(value)
+        except ValueError:
+            return None
+
+    def close(self):
+        for mapped in self._maps.values():
+            try:
+                mapped.close()
+            except BufferError:
+                # 仍有 column() 回傳的陣列在使用，交給垃圾回收
+                pass
+        self._maps = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def open_table(table, columns, directory=DEFAULT_STORE_DIR):
+    """開啟資料表供寫入；失敗時輸出警告並回傳 None（遙測不影響主要功能）"""
+    try:
+        return TableWriter(table_path(table, directory), columns)
+    except (OSError, ValueError) as e:
+        print(f"[WARN] 無法開啟遙測資料表 {table}: {e}")
+        return None
+
+def group_stats(reader, key, value, since=None):
+    """
+    依字串欄分組計算數值欄的筆數、平均與最大值
+
+    Args:
+        reader: TableReader
+        key: 分組用的字串欄
+        value: 數值欄
+        since: 只計算 time 欄不小於此值的列
+
+    Returns:
+        dict: {分組字串: (筆數, 平均, 最大值)}
+    """
+    names = reader.strings(key)
+    codes = reader.column(key)
+    values = reader.column(value)
+    if numpy is not None:
+        if since is not None:
+            mask = reader.column("time") >= since
+            codes, values = codes[mask], values[mask]
+        counts = numpy.bincount(codes, minlength=len(names))
+        sums = numpy.bincount(codes, weights=values, minlength=len(names))
+        peaks = numpy.full(len(names), -numpy.inf)
+        numpy.maximum.at(peaks, codes, values)
+        return {names[code]: (int(counts[code]), sums[code] / counts[code], float(peaks[code]))
+                for code in numpy.flatnonzero(counts)}
+
+    counts = [0] * len(names)
+    sums = [0.0] * len(names)
+    peaks = [float("-inf")] * len(names)
+    times = reader.column("time") if since is not None else None
+    for i in range(reader.rows):
+        if times is not None and times[i] < since:
+            continue
+        code = codes[i]
+        number = values[i]
+        counts[code] += 1
+        sums[code] += number
+        if number > peaks[code]:
+            peaks[code] = number
+    return {names[code]: (counts[code], sums[code] / counts[code], peaks[code])
+            for code in range(len(names)) if counts[code]}
+
+def count_clients(info):
+    """
+    由 get_router_info()（appGet.cgi 的 get_wireless_client() hook）的回應計算無線連線裝置數
+
+    回應為 {"get_wireless_client": {...}}，裝置以 MAC 位址為鍵或列在清單中，
+    依韌體不同可能再依頻段分組；以不重複的 MAC 位址計數。
+
+    Returns:
+        int: 裝置數；回應無法辨識（文字、登錄頁、沒有 MAC 位址的內容）時回傳 None
+    """
+    if isinstance(info, str):
+        try:
+            info = json.loads(info)
+        except ValueError:
+            return None
+    if isinstance(info, dict) and "get_wireless_client" in info:
+        info = info["get_wireless_client"]
+    if not isinstance(info, (dict, list)):
+        return None
+
+    macs = set()
+    others = 0
+    stack = [info]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if _MAC_RE.match(key):
+                    macs.add(key.upper())
+                stack.append(value)
+        elif isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, str) and _MAC_RE.match(node):
+            macs.add(node.upper())
+        else:
+            others += 1
+    if macs:
+        return len(macs)
+    # 完全沒有內容才是「沒有裝置」，有其他內容但找不到 MAC 位址則是無法辨識
+    return 0 if not others else None
+
+def record_router_info(router, writer=None, verify_cert=False):
+    """
+    讀取路由器信息並記錄連線裝置數與回應時間
+
+    Args:
+        router: 已登錄的 AsusRouterConnection
+        writer: ROUTER_INFO_COLUMNS 的 TableWriter（None 時寫入預設目錄的 router_info）
+
+    Returns:
+        get_router_info() 的結果（無法辨識連線裝置數時不記錄）
+    """
+    started = time.perf_counter()
+    info = router.get_router_info(verify_cert=verify_cert)
+    latency_ms = (time.perf_counter() - started) * 1000
+    if info is None:
+        return None
+    clients = count_clients(info)
+    if clients is None:
+        print("[INFO] 無法由回應辨識連線裝置清單，未記錄遙測")
+        return info
+    row = {"time": time.time(), "host": f"{router.hostname}:{router.port}",
+           "clients": clients, "latency_ms": latency_ms}
+    if writer is not None:
+        writer.append(row)
+        return info
+    default_writer = open_table("router_info", ROUTER_INFO_COLUMNS)
+    if default_writer is not None:
+        try:
+            with default_writer:
+                default_writer.append(row)
+        except OSError as e:
+            print(f"[WARN] 無法寫入遙測資料: {e}")
+    return info
+
+def print_table(path, key=None, value=None, hours=None):
+    """輸出資料表摘要（可依字串欄分組彙總數值欄）"""
+    with TableReader(path) as reader:
+        print(f"{path}: {reader.rows:,} 列")
+        for name, kind in reader.types.items():
+            print(f"  {name:<12} {kind}")
+        if key and value:
+            since = time.time() - hours * 3600 if hours else None
+            print(f"\n依 {key} 分組的 {value}:")
+            for group, (count, mean, peak) in sorted(group_stats(reader, key, value, since).items()):
+                print(f"  {group:<30} {count:>10,} 筆  平均 {mean:14.2f}  最大 {peak:14.2f}")
+
+def main():
+    """主函數：python telemetry_store.py <資料表> [--by=欄位 --value=欄位] [--hours=N]"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    options = dict(arg[2:].partition("=")[::2] for arg in sys.argv[1:] if arg.startswith("--"))
+    tables = args
+    if not tables and os.path.isdir(DEFAULT_STORE_DIR):
+        tables = sorted(os.listdir(DEFAULT_STORE_DIR))
+    if not tables:
+        print("尚無遙測資料")
+        return
+    for table in tables:
+        path = table if os.path.isdir(table) else table_path(table)
+        try:
+            print_table(path, key=options.get("by"), value=options.get("value"),
+                        hours=float(options["hours"]) if options.get("hours") else None)
+        except (OSError, ValueError) as e:
+            print(f"[FAIL] 無法讀取 {path}: {e}")
+        print()
+
+if __name__ == "__main__":
+    main()
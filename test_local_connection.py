@@ -7,6 +7,8 @@ import requests
 import urllib3
 from urllib3.exceptions import InsecureRequestWarning
 
+import profiling
+
 urllib3.disable_warnings(InsecureRequestWarning)
 
 def get_local_ip_range():
@@ -20,6 +22,7 @@ def get_local_ip_range():
     base_ip = '.'.join(ip_parts[:3])
     return base_ip
 
+@profiling.traced("stage")
 def test_local_router():
     """測試本地路由器連接"""
     print("=" * 60)
@@ -59,6 +62,7 @@ def test_local_router():
     return None, None, None
 
 def main():
+    profiling.init_from_argv()
     print("\n注意: DDNS 域名無法解析到公網 IP")
     print("這可能意味著:")
     print("  1. DDNS 服務未正確配置")
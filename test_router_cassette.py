@@ -0,0 +1,71 @@
+"""
+測試錄製時的憑證遮蔽（login() hook 的 base64 憑證含 '+' 時也不能寫入 cassette）
+"""
+
+import base64
+import gzip
+import os
+import tempfile
+
+import requests
+
+from router_cassette import REDACTED, Cassette, redact_url
+
+# "admin:pass>>word?" 的 base64 含 '+' 與 '='
+CREDENTIALS = "admin:pass>>word?"
+TOKEN = base64.b64encode(CREDENTIALS.encode("utf-8")).decode("ascii")
+
+def _record(url, method="GET", data=None):
+    """以 Cassette.add 錄製一筆交換，回傳寫入檔案的內容"""
+    request = requests.Request(method, url, data=data).prepare()
+    response = requests.Response()
+    response.status_code = 200
+    response.reason = "OK"
+    response._content = b"<html>ok</html>"
+    cassette = Cassette()
+    cassette.add(request, response, 0.01)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "test.cassette.gz")
+        cassette.save(path)
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return f.read()
+
+def test_token_contains_plus():
+    assert "+" in TOKEN
+
+def test_login_hook_with_plus_is_redacted():
+    url = f"https://192.168.1.1:8443/appGet.cgi?hook=login(){TOKEN}"
+    redacted = redact_url(url)
+    assert REDACTED in redacted
+    assert TOKEN not in redacted
+    assert TOKEN.split("+")[0] not in redacted
+
+def test_recorded_cassette_has_no_credentials():
+    for url in (
+        f"https://192.168.1.1:8443/appGet.cgi?hook=login(){TOKEN}",
+        f"https://192.168.1.1:8443/login.cgi?login_authorization={TOKEN}",
+    ):
+        content = _record(url)
+        for fragment in TOKEN.replace("=", "").split("+"):
+            assert fragment not in content
+        assert CREDENTIALS not in content
+
+def test_login_form_is_redacted():
+    content = _record("https://192.168.1.1:8443/login.cgi", method="POST",
+                      data={"login_authorization": TOKEN, "action_mode": "login"})
+    assert TOKEN.split("+")[0] not in content
+    assert "action_mode=login" in content
+
+def test_other_queries_unchanged():
+    url = "https://192.168.1.1:8443/appGet.cgi?hook=get_wireless_client()"
+    assert redact_url(url) == url
+
+def main():
+    """主函數"""
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"[OK] {name}")
+
+if __name__ == "__main__":
+    main()
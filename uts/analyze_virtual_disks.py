@@ -6,8 +6,24 @@
 
 from pathlib import Path
 import os
+import shutil
 import sys
-import subprocess
+
+from dir_size_index import DirSizeIndex
+from vhdx_parser import parse_vhdx, print_vhdx_report
+from tool_runner import ToolRunner
+from size_history import SizeHistory, print_forecast, record_volume, volume_key
+from disk_watcher import default_targets, parse_watch_options, watch
+from top_files import SpaceReport, parse_top_option, print_top_report
+from scan_planner import build_default_plan, wsl_roots
+
+# 共用的效能剖析與遙測模組位於上層目錄
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import profiling
+import telemetry_store
+
+# 可回收空間低於此值時不建議停機壓縮
+COMPACT_WORTHWHILE_BYTES = 1024**3
 
 # 設定 UTF-8 編碼輸出
 if sys.stdout.encoding != "utf-8":
@@ -36,7 +52,43 @@ def get_file_info(file_path: Path):
     except:
         return {"exists": False, "size": 0, "mtime": 0}
 
-def analyze_docker_disk():
+def inspect_vhdx(file_path: Path, indent: str = "  ", history=None):
+    """解析 VHDX 中繼資料並輸出區塊配置，無法解析時回傳 None"""
+    try:
+        with profiling.span("VHDX 解析", "fs", path=file_path):
+            info = parse_vhdx(file_path)
+    except (OSError, ValueError) as e:
+        print(f"{indent}無法解析 VHDX 中繼資料: {e}")
+        if history is not None:
+            record_growth(history, file_path, get_file_info(file_path)["size"], indent=indent)
+        return None
+    if history is not None:
+        record_growth(history, file_path, info["file_size"], capacity=info["virtual_size"], indent=indent)
+    print_vhdx_report(info, indent=indent)
+    if info["reclaimable_bytes"] >= COMPACT_WORTHWHILE_BYTES:
+        print(f"{indent}→ 值得壓縮（Optimize-VHD）")
+    else:
+        print(f"{indent}→ 可回收空間很少，暫不需要停機壓縮")
+    return info
+
+def record_growth(history, file_path: Path, size: int, capacity=None, indent: str = "  "):
+    """記錄大小並輸出成長趨勢與預計填滿時間"""
+    history.record(str(file_path), size)
+    try:
+        volume_free = shutil.disk_usage(file_path).free
+    except OSError:
+        volume_free = None
+    print_forecast(history, str(file_path), capacity=capacity, volume_free=volume_free, indent=indent)
+
+def print_docker_df(records):
+    """以表格輸出 docker system df 的 JSON 結果"""
+    print(f"  {'類型':<16}{'總數':>8}{'使用中':>8}{'大小':>12}{'可回收':>20}")
+    for record in records:
+        print(f"  {record.get('Type', ''):<16}{record.get('TotalCount', ''):>8}{record.get('Active', ''):>8}"
+              f"{record.get('Size', ''):>12}{record.get('Reclaimable', ''):>20}")
+
+@profiling.traced("stage")
+def analyze_docker_disk(runner=None, history=None, top=None):
     """分析 Docker 虛擬硬碟"""
     print("=" * 80)
     print("Docker 虛擬硬碟分析")
@@ -55,21 +107,19 @@ def analyze_docker_disk():
             
             print(f"檔案: {docker_path}")
             print(f"  大小: {format_size(info['size'])} ({size_gb:.2f} GB)")
+            inspect_vhdx(docker_path, history=history)
+            if top is not None:
+                top.add_file(docker_path, info["size"])
             print()
             
-            # 檢查 Docker 使用情況
-            try:
-                result = subprocess.run(
-                    ["docker", "system", "df"],
-                    capture_output=True,
-                    text=True,
-                    timeout=10
-                )
-                if result.returncode == 0:
-                    print("Docker 磁碟使用情況：")
-                    print(result.stdout)
-                    print()
-            except:
+            # 檢查 Docker 使用情況（查詢已在背景執行）
+            with profiling.span("docker system df", "subprocess"):
+                result = (runner or ToolRunner()).get("docker_df")
+            if result["ok"]:
+                print("Docker 磁碟使用情況：")
+                print_docker_df(result["data"])
+                print()
+            else:
                 print("  無法檢查 Docker 使用情況（Docker 可能未運行）")
                 print()
             
@@ -88,8 +138,15 @@ def analyze_docker_disk():
     print()
     return 0
 
-def analyze_wsl_disk():
-    """分析 WSL 虛擬硬碟"""
+@profiling.traced("stage")
+def analyze_wsl_disk(vhdx_files=None, history=None, top=None):
+    """
+    分析 WSL 虛擬硬碟
+    
+    Args:
+        vhdx_files: 已由 ScanPlan 找到的 .vhdx 檔案 [(Path, 大小)]；None 時以目錄索引掃描
+        top: SpaceReport，以目錄索引掃描時由索引加入排行（使用 ScanPlan 時由呼叫端以 tree_handler 加入）
+    """
     print("=" * 80)
     print("WSL 虛擬硬碟分析")
     print("=" * 80)
@@ -102,20 +159,34 @@ def analyze_wsl_disk():
     
     total_size = 0
     
-    for wsl_base in wsl_paths:
-        if wsl_base.exists():
-            print(f"檢查目錄: {wsl_base}")
-            print()
-            
-            for vhdx_file in wsl_base.rglob("*.vhdx"):
-                info = get_file_info(vhdx_file)
-                if info["exists"]:
-                    size_gb = info["size"] / (1024**3)
-                    total_size += info["size"]
-                    
-                    print(f"  檔案: {vhdx_file.name}")
-                    print(f"    大小: {format_size(info['size'])} ({size_gb:.2f} GB)")
-                    print()
+    if vhdx_files is None:
+        vhdx_files = []
+        index = DirSizeIndex()
+        for wsl_base in wsl_paths:
+            if wsl_base.exists():
+                print(f"檢查目錄: {wsl_base}")
+                print()
+                
+                # 只重新列出有變動的目錄，.vhdx 由索引追蹤
+                with profiling.span("目錄索引掃描", "fs", path=wsl_base):
+                    index.scan(wsl_base)
+                vhdx_files.extend(index.find(wsl_base, (".vhdx",)))
+                if top is not None:
+                    top.add_index(index, wsl_base)
+        
+        try:
+            index.save()
+        except OSError:
+            pass
+    
+    for vhdx_file, size in vhdx_files:
+        size_gb = size / (1024**3)
+        total_size += size
+        
+        print(f"  檔案: {vhdx_file.name}")
+        print(f"    大小: {format_size(size)} ({size_gb:.2f} GB)")
+        inspect_vhdx(vhdx_file, indent="    ", history=history)
+        print()
     
     if total_size > 0:
         print(f"WSL 總大小: {format_size(total_size)}")
@@ -129,7 +200,8 @@ def analyze_wsl_disk():
     
     return total_size
 
-def analyze_bluestacks_disk():
+@profiling.traced("stage")
+def analyze_bluestacks_disk(history=None, top=None):
     """分析 BlueStacks 虛擬硬碟"""
     print("=" * 80)
     print("BlueStacks 虛擬硬碟分析")
@@ -144,6 +216,9 @@ def analyze_bluestacks_disk():
         
         print(f"檔案: {bs_path}")
         print(f"  大小: {format_size(info['size'])} ({size_gb:.2f} GB)")
+        inspect_vhdx(bs_path, history=history)
+        if top is not None:
+            top.add_file(bs_path, info["size"])
         print()
         
         print("建議：")
@@ -178,6 +253,7 @@ def check_virtual_disk_usage():
 
 def main():
     """主函數"""
+    profiling.init_from_argv()
     print("=" * 80)
     print("虛擬硬碟大小分析")
     print("=" * 80)
@@ -185,16 +261,33 @@ def main():
     
     total_size = 0
     
+    # 外部工具查詢在背景執行，與檔案系統分析同時進行
+    runner = ToolRunner()
+    runner.prefetch(["docker_df"])
+    
+    # 加上 --top[=N] 參數時輸出最大檔案排行
+    top_n = parse_top_option(sys.argv[1:])
+    top = SpaceReport(top_n) if top_n else None
+    
     # 分析 Docker
-    docker_size = analyze_docker_disk()
+    # 大小紀錄另外附加到欄式遙測資料表，供報表直接讀取
+    history = SizeHistory(export=telemetry_store.open_table("disk_sizes", telemetry_store.DISK_COLUMNS))
+    docker_size = analyze_docker_disk(runner, history=history, top=top)
     total_size += docker_size
     
-    # 分析 WSL
-    wsl_size = analyze_wsl_disk()
+    # 分析 WSL（.vhdx 由掃描計畫走訪找出，排行也在同一次走訪中累計）
+    plan = build_default_plan(["wsl_vhdx"])
+    if top is not None:
+        plan.add("wsl_top", wsl_roots(), ["*"], handler=top.tree_handler(wsl_roots()), collect=False)
+    with profiling.span("掃描計畫", "fs"):
+        planned = plan.run()
+    if top is not None:
+        top.finish_trees()
+    wsl_size = analyze_wsl_disk(vhdx_files=planned["wsl_vhdx"], history=history, top=top)
     total_size += wsl_size
     
     # 分析 BlueStacks
-    bs_size = analyze_bluestacks_disk()
+    bs_size = analyze_bluestacks_disk(history=history, top=top)
     total_size += bs_size
     
     # 檢查使用情況
@@ -209,6 +302,24 @@ def main():
     print(f"虛擬硬碟總大小: {format_size(total_size)} ({total_size / (1024**3):.2f} GB)")
     print()
     
+    if top is not None:
+        print("空間使用排行：")
+        print()
+        print_top_report(top, limit=top.top_files.n)
+        print()
+    
+    # 記錄系統磁碟區使用量並預測何時填滿
+    home = Path(os.path.expanduser("~"))
+    usage = record_volume(history, home)
+    if usage:
+        print(f"磁碟區 {home.anchor or os.sep}: 已使用 {format_size(usage.used)} / {format_size(usage.total)}")
+        print_forecast(history, volume_key(home), capacity=usage.total, capacity_label="填滿磁碟區")
+        print()
+    try:
+        history.save()
+    except OSError:
+        pass
+    
     print("為什麼虛擬硬碟這麼大？")
     print("  1. 動態擴展機制：虛擬硬碟會自動增長以容納資料")
     print("  2. 不會自動縮小：刪除內部檔案不會減少 .vhdx 檔案大小")
@@ -223,7 +334,14 @@ def main():
     print("  2. 壓縮虛擬硬碟（需要停止相關服務）：")
     print("     Optimize-VHD -Path \"路徑\" -Mode Full")
     print("  3. 如果不再使用，刪除虛擬硬碟")
+    print("  4. 多個映像檔內容相近時，估算共用基底映像可節省的空間：")
+    print("     python dedup_estimator.py <映像檔1> <映像檔2> ...")
     print()
+    
+    # 加上 --watch 參數時持續監看虛擬硬碟成長（--limit-gb=N、--growth-gb=N 設定警示門檻）
+    if "--watch" in sys.argv:
+        limit, growth = parse_watch_options(sys.argv[1:])
+        watch(default_targets(limit=limit, growth=growth))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+檔案系統分析器效能基準
+
+在本機磁碟產生合成測試資料（可重複使用）：
+- 寬且深的目錄樹（預設 2 萬個檔案，可調到數百萬），模擬 VirtualBox VMs
+- 多 GB 的稀疏映像檔（VDI 與原始映像），大部分是空洞
+- 假的 VHDX 標頭與 BAT（數 TB 虛擬容量，檔案本身是稀疏的）
+- 內容相同的映像檔副本（重複檔案比對）
+
+每個基準在獨立子行程執行，量測 entries/s、bytes/s 與峰值 RSS，
+並與儲存的基準值比較，速度下降或記憶體增加超過容許範圍時視為退化。
+
+用法:
+    python benchmark_analyzers.py [--files=20000] [--image-gb=2] [--only=名稱,...]
+                                  [--repeat=3] [--tolerance=0.2] [--save-baseline]
+"""
+
+from pathlib import Path
+import contextlib
+import json
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+import vhdx_parser
+
+# 設定 UTF-8 編碼輸出
+if sys.stdout.encoding != "utf-8":
+    try:
+        sys.stdout.reconfigure(encoding="utf-8")
+    except:
+        pass
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+MB = 1024 * 1024
+GB = 1024 ** 3
+
+FIXTURE_VERSION = 1
+DEFAULT_FIXTURE_DIR = Path(tempfile.gettempdir()) / "wuchang_bench"
+DEFAULT_BASELINE_PATH = Path(os.path.expanduser("~")) / ".wuchang_cache" / "benchmark_baseline.json"
+DEFAULT_FILES = 20000
+DEFAULT_IMAGE_GB = 2
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.2
+
+TREE_FANOUT = 8
+TREE_DEPTH = 4
+VM_COUNT = 4
+VDI_BLOCK_SIZE = 1 * MB
+VHDX_BLOCK_SIZE = 32 * MB
+VHDX_VIRTUAL_SIZE = 2 * 1024 * GB
+
+def format_size(size: int) -> str:
+    """格式化檔案大小"""
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if abs(size) < 1024.0:
+            return f"{size:.2f} {unit}"
+        size /= 1024.0
+    return f"{size:.2f} PB"
+
+# ---------------------------------------------------------------------------
+# 測試資料
+# ---------------------------------------------------------------------------
+
+def make_tree(root, files, fanout=TREE_FANOUT, depth=TREE_DEPTH, vms=VM_COUNT):
+    """
+    建立合成的虛擬機器目錄樹
+
+    檔案以 truncate 建立（內容為空洞），大小分散在 0-64 KB；
+    每 997 個檔案有一個 .vdi、每 1009 個有一個 .ova、每 101 個有一個 .log。
+
+    Returns:
+        dict: {"files", "dirs", "bytes"}
+    """
+    dirs = []
+    for vm in range(vms):
+        base = os.path.join(root, f"vm{vm:02d}")
+        level = [base]
+        dirs.append(base)
+        for d in range(depth):
+            level = [os.path.join(parent, f"d{d}_{i}") for parent in level for i in range(fanout if d < 2 else 2)]
+            dirs.extend(level)
+    for directory in dirs:
+        os.makedirs(directory, exist_ok=True)
+
+    total = 0
+    for i in range(files):
+        if i % 997 == 0:
+            suffix = ".vdi"
+        elif i % 1009 == 0:
+            suffix = ".ova"
+        elif i % 101 == 0:
+            suffix = ".log"
+        else:
+            suffix = ".dat"
+        size = (i * 7919) % (64 * 1024)
+        path = os.path.join(dirs[i % len(dirs)], f"f{i}{suffix}")
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+        finally:
+            os.close(fd)
+        total += size
+    return {"files": files, "dirs": len(dirs) + 1, "bytes": total}
+
+def make_vdi(path, disk_size, block_size=VDI_BLOCK_SIZE, every=8):
+    """
+    建立稀疏的動態 VDI：每 every 個虛擬區塊配置一個，
+    配置的區塊一半是隨機資料、一半是全零（留成空洞）
+
+    Returns:
+        dict: {"blocks", "allocated", "data_bytes"}
+    """
+    blocks = disk_size // block_size
+    allocated = list(range(0, blocks, every))
+    off_blocks = 512
+    off_data = -(-(off_blocks + blocks * 4) // block_size) * block_size
+    block_map = [0xFFFFFFFF] * blocks
+    for index, block in enumerate(allocated):
+        block_map[block] = index
+
+    with open(path, "wb") as f:
+        pre = bytearray(72)
+        pre[:40] = b"<<< Oracle VM VirtualBox Disk Image >>>\n"
+        struct.pack_into("<II", pre, 64, 0xBEDA107F, 0x00010001)
+        header = bytearray(328)
+        struct.pack_into("<III", header, 0, 400, 1, 0)
+        struct.pack_into("<II", header, 268, off_blocks, off_data)
+        struct.pack_into("<QIIII", header, 296, disk_size, block_size, 0, blocks, len(allocated))
+        f.write(pre)
+        f.write(header)
+        f.seek(off_blocks)
+        f.write(struct.pack(f"<{blocks}I", *block_map))
+        data_bytes = 0
+        for index in range(len(allocated)):
+            if index % 2:
+                f.seek(off_data + index * block_size)
+                f.write(os.urandom(block_size))
+                data_bytes += block_size
+        f.truncate(off_data + len(allocated) * block_size)
+    return {"blocks": blocks, "allocated": len(allocated), "data_bytes": data_bytes}
+
+def make_raw_image(path, size, stride=64 * MB, chunk=1 * MB):
+    """建立稀疏原始映像：每 stride 寫入 chunk 的隨機資料"""
+    data_bytes = 0
+    with open(path, "wb") as f:
+        for offset in range(0, size, stride):
+            f.seek(offset)
+            f.write(os.urandom(chunk))
+            data_bytes += chunk
+        f.truncate(size)
+    return {"data_bytes": data_bytes}
+
+def make_vhdx(path, virtual_size=VHDX_VIRTUAL_SIZE, block_size=VHDX_BLOCK_SIZE, present_every=64):
+    """
+    建立只有標頭、區域表、中繼資料與 BAT 的 VHDX（資料區為空洞）
+
+    Returns:
+        dict: {"bat_entries", "bat_bytes"}
+    """
+    chunk_ratio = (2 ** 23 * 512) // block_size
+    data_blocks = -(-virtual_size // block_size)
+    total = data_blocks + (data_blocks - 1) // chunk_ratio
+    bat_offset = 2 * MB
+    bat_length = max(MB, -(-total * 8 // MB) * MB)
+    meta_offset = bat_offset + bat_length
+    meta_length = MB
+    data_offset = meta_offset + meta_length
+
+    with open(path, "wb") as f:
+        f.write(vhdx_parser.FILE_IDENTIFIER)
+        header = bytearray(vhdx_parser.HEADER_SIZE)
+        header[0:4] = b"head"
+        struct.pack_into("<Q", header, 8, 1)
+        struct.pack_into("<HHIQ", header, 64, 0, 1, MB, MB)
+        struct.pack_into("<I", header, 4, vhdx_parser.crc32c(header))
+        for offset in vhdx_parser.HEADER_OFFSETS:
+            f.seek(offset)
+            f.write(header)
+
+        regions = bytearray(vhdx_parser.REGION_TABLE_SIZE)
+        regions[0:4] = b"regi"
+        struct.pack_into("<I", regions, 8, 2)
+        regions[16:32] = vhdx_parser.BAT_GUID.bytes_le
+        struct.pack_into("<QII", regions, 32, bat_offset, bat_length, 1)
+        regions[48:64] = vhdx_parser.METADATA_GUID.bytes_le
+        struct.pack_into("<QII", regions, 64, meta_offset, meta_length, 1)
+        struct.pack_into("<I", regions, 4, vhdx_parser.crc32c(regions))
+        for offset in vhdx_parser.REGION_TABLE_OFFSETS:
+            f.seek(offset)
+            f.write(regions)
+
+        bat = [0] * total
+        next_offset = data_offset
+        payload = 0
+        for i in range(total):
+            if i % (chunk_ratio + 1) == chunk_ratio:
+                continue
+            if payload % present_every == 0:
+                bat[i] = vhdx_parser.PAYLOAD_BLOCK_FULLY_PRESENT | ((next_offset // MB) << 20)
+                next_offset += block_size
+            payload += 1
+        f.seek(bat_offset)
+        f.write(struct.pack(f"<{total}Q", *bat))
+
+        metadata = bytearray(64 * 1024)
+        metadata[0:8] = b"metadata"
+        struct.pack_into("<H", metadata, 10, 3)
+        items = [
+            (vhdx_parser.FILE_PARAMETERS_GUID, struct.pack("<II", block_size, 0)),
+            (vhdx_parser.VIRTUAL_DISK_SIZE_GUID, struct.pack("<Q", virtual_size)),
+            (vhdx_parser.LOGICAL_SECTOR_SIZE_GUID, struct.pack("<I", 512)),
+        ]
+        item_offset = 64 * 1024
+        for k, (guid, data) in enumerate(items):
+            pos = 32 + k * 32
+            metadata[pos:pos + 16] = guid.bytes_le
+            struct.pack_into("<II", metadata, pos + 16, item_offset, len(data))
+            f.seek(meta_offset + item_offset)
+            f.write(data)
+            item_offset += len(data)
+        f.seek(meta_offset)
+        f.write(metadata)
+        f.truncate(next_offset)
+    return {"bat_entries": total, "bat_bytes": total * 8}
+
+def make_duplicates(directory, size=64 * MB, copies=4):
+    """建立內容相同的映像檔副本與一個只有結尾不同的檔案"""
+    os.makedirs(directory, exist_ok=True)
+    data = os.urandom(size)
+    for i in range(copies):
+        with open(os.path.join(directory, f"copy{i}.vdi"), "wb") as f:
+            f.write(data)
+    with open(os.path.join(directory, "near.vdi"), "wb") as f:
+        f.write(data[:-1] + b"\x01")
+    return {"files": copies + 1, "bytes": size * (copies + 1)}
+
+def ensure_fixtures(directory, files=DEFAULT_FILES, image_gb=DEFAULT_IMAGE_GB):
+    """
+    建立（或沿用）測試資料
+
+    Returns:
+        dict: 測試資料的描述（含各項數量，供計算速率）
+    """
+    directory = Path(directory)
+    meta_path = directory / "fixtures.json"
+    params = {"version": FIXTURE_VERSION, "files": files, "image_gb": image_gb}
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("params") == params:
+            return meta
+    except (OSError, ValueError):
+        pass
+
+    if directory.exists():
+        shutil.rmtree(directory)
+    home = directory / "home"
+    images = directory / "images"
+    images.mkdir(parents=True)
+
+    print(f"建立測試資料: {directory}")
+    started = time.perf_counter()
+    meta = {"params": params}
+    meta["tree"] = make_tree(str(home / "VirtualBox VMs"), files)
+    print(f"  目錄樹: {files:,} 個檔案，{meta['tree']['dirs']:,} 個目錄")
+    meta["vdi"] = make_vdi(images / "sparse.vdi", image_gb * GB)
+    meta["raw"] = make_raw_image(images / "sparse.img", image_gb * GB)
+    meta["vhdx"] = make_vhdx(images / "fake.vhdx")
+    meta["duplicates"] = make_duplicates(str(images / "duplicates"))
+    print(f"  映像檔: {image_gb} GB VDI / 原始映像，{format_size(VHDX_VIRTUAL_SIZE)} VHDX")
+    print(f"  耗時 {time.perf_counter() - started:.1f} 秒")
+    print()
+
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+# ---------------------------------------------------------------------------
+# 基準項目：每個函數回傳 (entries, bytes)，None 表示不適用
+# ---------------------------------------------------------------------------
+
+def _tree_entries(meta):
+    return meta["tree"]["files"] + meta["tree"]["dirs"]
+
+def bench_rglob(directory, meta):
+    """原本各分析器使用的 Path.rglob"""
+    sum(1 for _ in (Path(directory) / "home" / "VirtualBox VMs").rglob("*.ova"))
+    return _tree_entries(meta), None
+
+def bench_scan_plan(directory, meta):
+    from scan_planner import ScanPlan
+    ScanPlan().add("ova", [Path(directory) / "home" / "VirtualBox VMs"], ["*.ova"]).run()
+    return _tree_entries(meta), None
+
+def bench_dir_index_cold(directory, meta):
+    from dir_size_index import DirSizeIndex
+    index = DirSizeIndex(index_path=Path(directory) / "home" / ".bench_index.json")
+    index.entries = {}
+    index.scan(Path(directory) / "home" / "VirtualBox VMs")
+    return _tree_entries(meta), None
+
+def bench_dir_index_warm(directory, meta):
+    from dir_size_index import DirSizeIndex
+    index_path = Path(directory) / "home" / ".bench_index.json"
+    root = Path(directory) / "home" / "VirtualBox VMs"
+    warm = DirSizeIndex(index_path=index_path)
+    warm.scan(root)
+    warm.save()
+    # 只計時第二次（沿用索引）的掃描
+    started = time.perf_counter()
+    DirSizeIndex(index_path=index_path).scan(root)
+    return _tree_entries(meta), None, time.perf_counter() - started
+
+def bench_top_files(directory, meta):
+    from top_files import SpaceReport
+    SpaceReport().walk(Path(directory) / "home" / "VirtualBox VMs")
+    return _tree_entries(meta), None
+
+def bench_analyze_vm_files(directory, meta):
+    """完整的 check_virtualbox.analyze_vm_files（HOME 指向測試資料，索引從空白開始）"""
+    shutil.rmtree(Path(directory) / "home" / ".wuchang_cache", ignore_errors=True)
+    from check_virtualbox import analyze_vm_files
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        analyze_vm_files(ova_files=[])
+    return _tree_entries(meta), None
+
+def bench_vhdx_parse(directory, meta):
+    vhdx_parser.parse_vhdx(Path(directory) / "images" / "fake.vhdx")
+    return meta["vhdx"]["bat_entries"], meta["vhdx"]["bat_bytes"]
+
+def bench_zero_scan_vdi(directory, meta):
+    from zero_scanner import scan_image
+    result = scan_image(Path(directory) / "images" / "sparse.vdi")
+    return meta["vdi"]["allocated"], result["scanned_bytes"]
+
+def bench_zero_scan_raw(directory, meta):
+    from zero_scanner import scan_image
+    result = scan_image(Path(directory) / "images" / "sparse.img")
+    return None, result["scanned_bytes"]
+
+def bench_duplicates(directory, meta):
+    from duplicate_finder import find_duplicates
+    folder = Path(directory) / "images" / "duplicates"
+    find_duplicates(sorted(folder.iterdir()))
+    return meta["duplicates"]["files"], meta["duplicates"]["bytes"]
+
+BENCHMARKS = {
+    "rglob": bench_rglob,
+    "scan_plan": bench_scan_plan,
+    "dir_index_cold": bench_dir_index_cold,
+    "dir_index_warm": bench_dir_index_warm,
+    "top_files": bench_top_files,
+    "analyze_vm_files": bench_analyze_vm_files,
+    "vhdx_parse": bench_vhdx_parse,
+    "zero_scan_vdi": bench_zero_scan_vdi,
+    "zero_scan_raw": bench_zero_scan_raw,
+    "duplicates": bench_duplicates,
+}
+
+def peak_rss():
+    """目前行程的峰值 RSS（位元組），無法取得時回傳 None"""
+    # Linux 的 ru_maxrss 在 exec 後仍保留父行程的值（建立測試資料時很大），改讀 VmHWM
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 回報，macOS 以位元組回報
+    return rss if sys.platform == "darwin" else rss * 1024
+
+def run_one(name, directory):
+    """在目前行程執行單一基準（由子行程呼叫），輸出 JSON"""
+    with open(Path(directory) / "fixtures.json", "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    started = time.perf_counter()
+    result = BENCHMARKS[name](directory, meta)
+    elapsed = time.perf_counter() - started
+    if len(result) == 3:
+        entries, nbytes, elapsed = result
+    else:
+        entries, nbytes = result
+    print(json.dumps({
+        "elapsed": elapsed,
+        "entries_per_s": entries / elapsed if entries and elapsed > 0 else None,
+        "bytes_per_s": nbytes / elapsed if nbytes and elapsed > 0 else None,
+        "peak_rss": peak_rss(),
+    }))
+
+def run_benchmark(name, directory, repeat=DEFAULT_REPEAT):
+    """
+    以子行程執行基準（每次都是乾淨的行程，RSS 不互相影響），取最快的一次
+
+    Returns:
+        dict: 結果，失敗時含 "error"
+    """
+    env = dict(os.environ, HOME=str(Path(directory) / "home"), USERPROFILE=str(Path(directory) / "home"))
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), f"--run-one={name}", f"--dir={directory}"],
+            capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        if proc.returncode != 0:
+            return {"error": (proc.stderr.strip().splitlines() or [f"exit {proc.returncode}"])[-1]}
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        if best is None or result["elapsed"] < best["elapsed"]:
+            best = result
+    return best
+
+def compare(name, result, baseline, tolerance):
+    """
+    與基準值比較
+
+    Returns:
+        list: 退化說明（空列表表示正常）
+    """
+    problems = []
+    for key in ("entries_per_s", "bytes_per_s"):
+        old, new = baseline.get(key), result.get(key)
+        if old and new and new < old * (1 - tolerance):
+            problems.append(f"{key} 下降 {(1 - new / old) * 100:.0f}%")
+    old, new = baseline.get("peak_rss"), result.get("peak_rss")
+    if old and new and new > old * (1 + tolerance):
+        problems.append(f"峰值 RSS 增加 {(new / old - 1) * 100:.0f}%")
+    return problems
+
+def _rate(value, unit):
+    if value is None:
+        return "-"
+    if unit == "B":
+        return f"{format_size(value)}/s"
+    return f"{value:,.0f}/s"
+
+def main():
+    """主函數"""
+    options = {}
+    for arg in sys.argv[1:]:
+        if arg.startswith("--"):
+            key, _, value = arg[2:].partition("=")
+            options[key] = value
+
+    directory = Path(options.get("dir") or DEFAULT_FIXTURE_DIR)
+    if "run-one" in options:
+        run_one(options["run-one"], directory)
+        return
+
+    files = int(options.get("files") or DEFAULT_FILES)
+    image_gb = int(options.get("image-gb") or DEFAULT_IMAGE_GB)
+    repeat = max(1, int(options.get("repeat") or DEFAULT_REPEAT))
+    tolerance = float(options.get("tolerance") or DEFAULT_TOLERANCE)
+    baseline_path = Path(options.get("baseline") or DEFAULT_BASELINE_PATH)
+    names = options["only"].split(",") if options.get("only") else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"未知的基準: {', '.join(unknown)}（可用: {', '.join(BENCHMARKS)}）")
+        return 2
+
+    meta = ensure_fixtures(directory, files=files, image_gb=image_gb)
+
+    try:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = {}
+    if baseline and baseline.get("params") != meta["params"]:
+        print("注意: 基準值使用不同的測試資料參數，不進行比較")
+        print()
+        baseline = {}
+
+    print(f"{'基準':<20}{'耗時(秒)':>10}{'項目速率':>16}{'資料速率':>16}{'峰值 RSS':>14}  比較")
+    results = {}
+    regressions = 0
+    for name in names:
+        result = run_benchmark(name, directory, repeat=repeat)
+        results[name] = result
+        if "error" in result:
+            print(f"{name:<20}失敗: {result['error']}")
+            regressions += 1
+            continue
+        rss = format_size(result["peak_rss"]) if result["peak_rss"] else "-"
+        status = ""
+        if name in baseline.get("results", {}):
+            problems = compare(name, result, baseline["results"][name], tolerance)
+            status = "退化: " + "，".join(problems) if problems else "OK"
+            regressions += bool(problems)
+        print(f"{name:<20}{result['elapsed']:>10.3f}{_rate(result['entries_per_s'], 'n'):>16}"
+              f"{_rate(result['bytes_per_s'], 'B'):>16}{rss:>14}  {status}")
+
+    if "save-baseline" in options:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        saved = {"params": meta["params"], "time": time.time(), "results": {
+            name: result for name, result in results.items() if "error" not in result}}
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(saved, f, ensure_ascii=False, indent=2)
+        print()
+        print(f"基準值已儲存: {baseline_path}")
+    elif not baseline:
+        print()
+        print("尚無基準值，可加上 --save-baseline 儲存本次結果")
+
+    if regressions:
+        print()
+        print(f"發現 {regressions} 項退化或失敗（容許範圍 {tolerance * 100:.0f}%）")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大型映像檔搬移工具
+
+用於把虛擬機器、模擬器資料搬到其他磁碟（如 J 碟）：
+- 以 os.copy_file_range / os.sendfile 零複製傳輸（平台不支援時退回緩衝複製）
+- 只複製資料範圍（SEEK_DATA/SEEK_HOLE），保留稀疏檔的空洞
+- 多個檔案平行複製，並以總頻寬預算限制 I/O
+- 檢查點記錄每個檔案的進度，中斷後可繼續
+- 可選驗證：複製時逐段計算來源雜湊並記錄在檢查點，完成後丟棄目的檔的
+  頁面快取再回讀比對；中斷續傳時沿用先前記錄的雜湊，不必重讀來源
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from pathlib import Path
+import bisect
+import errno
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+from zero_scanner import data_ranges, format_size
+
+# 設定 UTF-8 編碼輸出
+if sys.stdout.encoding != "utf-8":
+    try:
+        sys.stdout.reconfigure(encoding="utf-8")
+    except:
+        pass
+
+MB = 1024 * 1024
+
+DEFAULT_CHUNK_SIZE = 64 * MB
+DEFAULT_WORKERS = 2
+STATE_FILE_NAME = ".bulk-move-state.json"
+CHECKPOINT_SECONDS = 5.0
+
+class IoBudget:
+    """跨執行緒共用的頻寬預算（token bucket，每秒位元組數；None 表示不限制）"""
+
+    def __init__(self, bytes_per_second=None):
+        self.rate = bytes_per_second
+        self._lock = threading.Lock()
+        self._allowance = float(bytes_per_second or 0)
+        self._last = time.monotonic()
+
+    def acquire(self, amount):
+        """取得 amount 位元組的額度，額度不足時等待"""
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate)
+            self._last = now
+            self._allowance -= amount
+            wait_time = -self._allowance / self.rate if self._allowance < 0 else 0
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+class MoveCheckpoint:
+    """搬移進度檢查點（JSON，記錄每個檔案已完成的偏移與分段雜湊）"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.files = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+        except (OSError, ValueError):
+            self.files = {}
+
+    def get(self, key, st):
+        """取得檔案進度；來源檔案有變動時重新開始"""
+        with self._lock:
+            entry = self.files.get(key)
+            if not entry or entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns:
+                entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "offset": 0, "done": False, "hashes": {}}
+                self.files[key] = entry
+            return entry
+
+    def record(self, entry, offset, chunk_offset=None, length=None, digest=None, done=False):
+        """更新檔案進度（與 save 互斥，避免寫出時內容被其他執行緒修改）"""
+        with self._lock:
+            entry["offset"] = offset
+            if digest is not None:
+                entry["hashes"][str(chunk_offset)] = [length, digest]
+            if done:
+                entry["done"] = True
+
+    def save(self):
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"files": self.files}, f)
+            os.replace(tmp_path, self.path)
+
+    def remove(self):
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+def _zero_copy(src_fd, dst_fd, offset, count):
+    """
+    零複製傳輸一段資料，回傳實際傳輸的位元組數；平台不支援時回傳 None
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        os.lseek(dst_fd, offset, os.SEEK_SET)
+        return os.sendfile(dst_fd, src_fd, offset, count)
+    return None
+
+def _read_at(fd, buf, offset):
+    if hasattr(os, "preadv"):
+        return os.preadv(fd, [buf], offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    data = os.read(fd, len(buf))
+    buf[:len(data)] = data
+    return len(data)
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def _drop_cache(fd):
+    """
+    請核心丟棄檔案的頁面快取（資料需已 fsync），之後的讀取才會真正讀取磁碟
+
+    Returns:
+        bool: 平台不支援 posix_fadvise 時回傳 False（回讀可能來自快取）
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    return True
+
+def _write_at(fd, data, offset):
+    if hasattr(os, "pwrite"):
+        return os.pwrite(fd, data, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.write(fd, data)
+
+class BulkMover:
+    """平行、可繼續、可驗證的大檔案搬移"""
+
+    def __init__(self, workers=DEFAULT_WORKERS, bytes_per_second=None, chunk_size=DEFAULT_CHUNK_SIZE, verify=False):
+        """
+        Args:
+            workers: 同時複製的檔案數
+            bytes_per_second: 總 I/O 頻寬預算（None 表示不限制）
+            chunk_size: 每次傳輸的大小
+            verify: 是否逐段計算來源雜湊，完成後略過快取回讀目的檔比對
+        """
+        self.workers = workers
+        self.budget = IoBudget(bytes_per_second)
+        self.chunk_size = chunk_size
+        self.verify = verify
+        self.copied_bytes = 0
+        self._progress_lock = threading.Lock()
+
+    def _add_progress(self, amount):
+        with self._progress_lock:
+            self.copied_bytes += amount
+
+    def plan(self, source, destination):
+        """列出要複製的檔案 [(來源, 目的, 大小)]，大檔案優先"""
+        source = Path(source)
+        destination = Path(destination)
+        if source.is_file():
+            return [(source, destination, source.stat().st_size)]
+        items = []
+        for root, dirs, files in os.walk(source):
+            for file_name in files:
+                src = Path(root) / file_name
+                try:
+                    size = src.stat().st_size
+                except OSError:
+                    continue
+                items.append((src, destination / src.relative_to(source), size))
+        items.sort(key=lambda item: item[2], reverse=True)
+        return items
+
+    def copy_file(self, src, dst, checkpoint):
+        """複製單一檔案（從檢查點的偏移繼續）"""
+        st = src.stat()
+        key = str(src)
+        entry = checkpoint.get(key, st)
+        if entry["done"] and dst.exists() and dst.stat().st_size == st.st_size:
+            self._add_progress(st.st_size)
+            return
+        resume = entry["offset"]
+        dst.parent.mkdir(parents=True, exist_ok=True)
+
+        src_fd = os.open(src, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        flags = os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0)
+        if resume == 0:
+            flags |= os.O_TRUNC
+        dst_fd = os.open(dst, flags, 0o644)
+        buf = bytearray(self.chunk_size) if self.verify else None
+        zero_copy_ok = True
+        last_checkpoint = time.monotonic()
+        counted = resume
+        try:
+            # 先設定最終大小，未寫入的範圍即為空洞
+            os.ftruncate(dst_fd, st.st_size)
+            self._add_progress(counted)
+            for start, length in data_ranges(src_fd, st.st_size):
+                end = start + length
+                pos = max(start, resume)
+                while pos < end:
+                    count = min(self.chunk_size, end - pos)
+                    self.budget.acquire(count)
+                    copied, digest, zero_copy_ok = self._transfer(src_fd, dst_fd, buf, pos, count, zero_copy_ok)
+                    if copied == 0:
+                        raise OSError(f"讀取中斷: {src} @ {pos}")
+                    checkpoint.record(entry, pos + copied, pos, copied, digest)
+                    pos += copied
+                    self._add_progress(copied)
+                    counted += copied
+                    if time.monotonic() - last_checkpoint >= CHECKPOINT_SECONDS:
+                        os.fsync(dst_fd)
+                        checkpoint.save()
+                        last_checkpoint = time.monotonic()
+            # 空洞不需要複製，但仍計入進度
+            self._add_progress(max(0, st.st_size - counted))
+            os.fsync(dst_fd)
+            if self.verify:
+                self._verify(src_fd, dst, st.st_size, entry, buf)
+        finally:
+            os.close(src_fd)
+            os.close(dst_fd)
+
+        shutil.copystat(src, dst)
+        checkpoint.record(entry, st.st_size, done=True)
+        checkpoint.save()
+
+    def _transfer(self, src_fd, dst_fd, buf, pos, count, zero_copy):
+        """
+        傳輸一段資料，回傳 (位元組數, 來源雜湊, 之後是否仍可零複製)
+
+        驗證模式下先把來源讀入緩衝區計算雜湊，資料本身仍以零複製傳輸；
+        平台不支援零複製時直接寫出同一個緩衝區，不必再讀一次。
+        """
+        got = None
+        if self.verify:
+            got = _read_at(src_fd, memoryview(buf)[:count], pos)
+        copied = _zero_copy(src_fd, dst_fd, pos, count) if zero_copy else None
+        if copied is None:
+            zero_copy = False
+            copied = self._copy_buffered(src_fd, dst_fd, buf, pos, count, got)
+        digest = None
+        if self.verify and copied <= got:
+            digest = _digest(memoryview(buf)[:copied])
+        return copied, digest, zero_copy
+
+    def _copy_buffered(self, src_fd, dst_fd, buf, pos, count, got=None):
+        """緩衝複製（got 不為 None 表示來源已讀入 buf），回傳位元組數"""
+        if buf is None:
+            buf = bytearray(count)
+        view = memoryview(buf)[:count]
+        if got is None:
+            got = _read_at(src_fd, view, pos)
+        written = 0
+        while written < got:
+            written += _write_at(dst_fd, view[written:got], pos + written)
+        return got
+
+    def _verify(self, src_fd, dst, size, entry, buf):
+        """
+        回讀驗證目的檔
+
+        目的檔已 fsync，先丟棄它的頁面快取，讀到的才是實際寫入磁碟的內容；
+        與檢查點中的分段雜湊（含中斷前的紀錄）比對，沒有紀錄的範圍才重新讀取來源計算。
+        """
+        hashes = {int(offset): chunk for offset, chunk in entry["hashes"].items()}
+        offsets = sorted(hashes)
+        check_fd = os.open(dst, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            _drop_cache(check_fd)
+            for start, length in data_ranges(src_fd, size):
+                end = start + length
+                pos = start
+                while pos < end:
+                    saved = hashes.get(pos)
+                    if saved and pos + saved[0] <= end:
+                        count, digest = saved
+                        if count > len(buf):
+                            buf = bytearray(count)
+                    else:
+                        # 沒有雜湊紀錄（如前次未加 --verify）：讀到下一個有紀錄的分段為止
+                        i = bisect.bisect_right(offsets, pos)
+                        limit = offsets[i] if i < len(offsets) and offsets[i] < end else end
+                        count = min(len(buf), limit - pos)
+                        view = memoryview(buf)[:count]
+                        if _read_at(src_fd, view, pos) != count:
+                            raise OSError(f"讀取中斷: 來源 @ {pos}")
+                        digest = _digest(view)
+                    self.budget.acquire(count)
+                    view = memoryview(buf)[:count]
+                    if _read_at(check_fd, view, pos) != count or _digest(view) != digest:
+                        raise OSError(f"驗證失敗: {dst} 偏移 {pos} 的資料不一致")
+                    pos += count
+        finally:
+            os.close(check_fd)
+
+    def move(self, source, destination, remove_source=False, checkpoint_path=None, progress=True):
+        """
+        複製（或搬移）檔案或目錄
+
+        Args:
+            source: 來源檔案或目錄
+            destination: 目的路徑
+            remove_source: 全部完成後刪除來源
+            checkpoint_path: 檢查點檔案（預設放在目的目錄）
+            progress: 是否輸出進度
+
+        Returns:
+            dict: 統計資訊
+        """
+        source = Path(source)
+        destination = Path(destination)
+        items = self.plan(source, destination)
+        total = sum(size for _, _, size in items)
+        if checkpoint_path is None:
+            base = destination if source.is_dir() else destination.parent
+            checkpoint_path = base / STATE_FILE_NAME
+        checkpoint = MoveCheckpoint(checkpoint_path)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            futures = [pool.submit(self.copy_file, src, dst, checkpoint) for src, dst, _ in items]
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=1.0, return_when=FIRST_EXCEPTION)
+                if progress:
+                    elapsed = time.perf_counter() - started
+                    rate = self.copied_bytes / elapsed if elapsed > 0 else 0
+                    print(f"\r  進度: {format_size(self.copied_bytes)} / {format_size(total)} ({format_size(rate)}/s)",
+                          end="", flush=True)
+                for future in done:
+                    if future.exception():
+                        for other in pending:
+                            other.cancel()
+                        checkpoint.save()
+                        raise future.exception()
+        if progress:
+            print()
+
+        if remove_source:
+            for src, _, _ in items:
+                src.unlink()
+            if source.is_dir():
+                shutil.rmtree(source, ignore_errors=True)
+        checkpoint.remove()
+
+        elapsed = time.perf_counter() - started
+        return {
+            "files": len(items),
+            "total_bytes": total,
+            "elapsed": elapsed,
+            "throughput": total / elapsed if elapsed > 0 else 0.0,
+        }
+
+def main():
+    """主函數"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    options = [arg for arg in sys.argv[1:] if arg.startswith("--")]
+    if len(args) != 2:
+        print("用法: python bulk_mover.py <來源> <目的> [--move] [--verify] [--workers=N] [--limit-mb=N]")
+        print("  --move       完成後刪除來源")
+        print("  --verify     複製時逐段雜湊，完成後略過快取回讀驗證")
+        print("  --workers=N  同時複製的檔案數（預設 2）")
+        print("  --limit-mb=N 總頻寬上限（MB/s）")
+        return
+
+    workers = DEFAULT_WORKERS
+    limit = None
+    for option in options:
+        if option.startswith("--workers="):
+            workers = int(option.split("=", 1)[1])
+        elif option.startswith("--limit-mb="):
+            limit = int(float(option.split("=", 1)[1]) * MB)
+
+    mover = BulkMover(workers=workers, bytes_per_second=limit, verify="--verify" in options)
+    print(f"來源: {args[0]}")
+    print(f"目的: {args[1]}")
+    try:
+        result = mover.move(args[0], args[1], remove_source="--move" in options)
+    except (OSError, ValueError) as e:
+        print(f"\n錯誤: {e}")
+        print("進度已記錄，重新執行相同命令即可繼續")
+        return
+    print(f"完成: {result['files']} 個檔案，{format_size(result['total_bytes'])}，"
+          f"{result['elapsed']:.1f} 秒（{format_size(result['throughput'])}/s）")
+
+if __name__ == "__main__":
+    main()
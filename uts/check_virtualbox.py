@@ -5,9 +5,23 @@
 """
 
 from pathlib import Path
-import subprocess
 import sys
 import os
+import shutil
+
+from dir_size_index import DirSizeIndex
+from zero_scanner import scan_image
+from duplicate_finder import find_duplicates, find_redundant_ova, print_duplicate_report
+from scan_planner import build_default_plan, parse_depth_option
+from tool_runner import ToolRunner
+from size_history import SizeHistory, print_forecast
+from disk_watcher import default_targets, parse_watch_options, watch
+from top_files import SpaceReport, parse_top_option, print_top_report
+
+# 共用的效能剖析與遙測模組位於上層目錄
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import profiling
+import telemetry_store
 
 # 設定 UTF-8 編碼輸出
 if sys.stdout.encoding != "utf-8":
@@ -24,7 +38,7 @@ def format_size(size: int) -> str:
         size /= 1024.0
     return f"{size:.2f} PB"
 
-def check_virtualbox_installed():
+def check_virtualbox_installed(runner=None):
     """檢查 VirtualBox 是否安裝"""
     print("=" * 80)
     print("檢查 VirtualBox 安裝狀態")
@@ -32,21 +46,12 @@ def check_virtualbox_installed():
     print()
     
     # 檢查 VBoxManage 命令
-    try:
-        result = subprocess.run(
-            ["VBoxManage", "--version"],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        if result.returncode == 0:
-            print(f"✓ VirtualBox 已安裝")
-            print(f"  版本: {result.stdout.strip()}")
-            return True
-    except FileNotFoundError:
-        pass
-    except Exception as e:
-        pass
+    with profiling.span("VBoxManage --version", "subprocess"):
+        result = (runner or ToolRunner()).get("vbox_version")
+    if result["ok"]:
+        print(f"✓ VirtualBox 已安裝")
+        print(f"  版本: {result['data']}")
+        return True
     
     # 檢查安裝目錄
     vbox_paths = [
@@ -63,7 +68,7 @@ def check_virtualbox_installed():
     print("✗ VirtualBox 未安裝或未在 PATH 中")
     return False
 
-def list_virtual_machines():
+def list_virtual_machines(runner=None):
     """列出所有虛擬機器"""
     print()
     print("=" * 80)
@@ -71,34 +76,28 @@ def list_virtual_machines():
     print("=" * 80)
     print()
     
-    try:
-        result = subprocess.run(
-            ["VBoxManage", "list", "vms"],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        
-        if result.returncode == 0:
-            vms = result.stdout.strip().splitlines()
-            if vms:
-                for vm in vms:
-                    print(f"  {vm}")
-                return len(vms)
-            else:
-                print("  沒有找到虛擬機器")
-                return 0
+    with profiling.span("VBoxManage list vms", "subprocess"):
+        result = (runner or ToolRunner()).get("vbox_vms")
+    if result["ok"]:
+        vms = result["data"]
+        if vms:
+            for vm in vms:
+                print(f"  {vm['line']}")
+            return len(vms)
         else:
-            print("  無法列出虛擬機器（可能需要管理員權限）")
-            return -1
-    except FileNotFoundError:
+            print("  沒有找到虛擬機器")
+            return 0
+    elif result["error"] == "not_found":
         print("  VBoxManage 命令不可用")
         return -1
-    except Exception as e:
-        print(f"  錯誤: {e}")
+    elif result["returncode"] is not None:
+        print("  無法列出虛擬機器（可能需要管理員權限）")
+        return -1
+    else:
+        print(f"  錯誤: {result['error']}")
         return -1
 
-def check_vm_status():
+def check_vm_status(runner=None):
     """檢查虛擬機器運行狀態"""
     print()
     print("=" * 80)
@@ -106,31 +105,34 @@ def check_vm_status():
     print("=" * 80)
     print()
     
-    try:
-        result = subprocess.run(
-            ["VBoxManage", "list", "runningvms"],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        
-        if result.returncode == 0:
-            running_vms = result.stdout.strip().splitlines()
-            if running_vms:
-                print("正在運行的虛擬機器：")
-                for vm in running_vms:
-                    print(f"  {vm}")
-            else:
-                print("  目前沒有運行中的虛擬機器")
+    with profiling.span("VBoxManage list runningvms", "subprocess"):
+        result = (runner or ToolRunner()).get("vbox_running")
+    if result["ok"]:
+        running_vms = result["data"]
+        if running_vms:
+            print("正在運行的虛擬機器：")
+            for vm in running_vms:
+                print(f"  {vm['line']}")
         else:
-            print("  無法檢查運行狀態")
-    except FileNotFoundError:
+            print("  目前沒有運行中的虛擬機器")
+    elif result["error"] == "not_found":
         print("  VBoxManage 命令不可用")
-    except Exception as e:
-        print(f"  錯誤: {e}")
+    elif result["returncode"] is not None:
+        print("  無法檢查運行狀態")
+    else:
+        print(f"  錯誤: {result['error']}")
 
-def analyze_vm_files():
-    """分析虛擬機器檔案"""
+@profiling.traced("stage")
+def analyze_vm_files(scan_zero=False, ova_files=None, history=None, top=None):
+    """
+    分析虛擬機器檔案
+    
+    Args:
+        scan_zero: 是否掃描 VDI 的全零區塊以估算壓縮可回收空間（需完整讀取映像檔）
+        ova_files: 已由 ScanPlan 找到的 OVA 檔案 [(Path, 大小)]；None 時自行掃描
+        history: SizeHistory，提供時記錄各虛擬機器大小並輸出成長趨勢
+        top: SpaceReport，提供時由目錄索引產生虛擬機器目錄的最大檔案排行
+    """
     print()
     print("=" * 80)
     print("虛擬機器檔案分析")
@@ -145,6 +147,9 @@ def analyze_vm_files():
     
     total_size = 0
     vm_count = 0
+    index = DirSizeIndex()
+    vm_dirs = []
+    disk_files = []
     
     for vm_base_path in vm_paths:
         if vm_base_path.exists():
@@ -154,26 +159,41 @@ def analyze_vm_files():
             for vm_dir in vm_base_path.iterdir():
                 if vm_dir.is_dir():
                     vm_count += 1
-                    vm_size = 0
-                    file_count = 0
+                    vm_dirs.append(vm_dir)
                     
                     print(f"  虛擬機器: {vm_dir.name}")
                     
-                    # 計算目錄大小
-                    for root, dirs, files in os.walk(vm_dir):
-                        for file_name in files:
-                            try:
-                                file_path = Path(root) / file_name
-                                if file_path.exists():
-                                    stat = file_path.stat()
-                                    vm_size += stat.st_size
-                                    file_count += 1
-                            except:
-                                pass
+                    # 計算目錄大小（未變動的目錄沿用索引中的統計）
+                    with profiling.span("目錄索引掃描", "fs", path=vm_dir):
+                        result = index.scan(vm_dir) or {"size": 0, "files": 0}
+                    vm_size = result["size"]
+                    file_count = result["files"]
+                    disk_files.extend(path for path, _ in index.find(vm_dir, (".vdi", ".vmdk")))
+                    if top is not None:
+                        top.add_index(index, vm_dir)
                     
                     total_size += vm_size
                     print(f"    大小: {format_size(vm_size)}")
                     print(f"    檔案數: {file_count:,} 個")
+                    
+                    if history is not None:
+                        key = f"vm:{vm_dir}"
+                        history.record(key, vm_size)
+                        try:
+                            volume_free = shutil.disk_usage(vm_dir).free
+                        except OSError:
+                            volume_free = None
+                        print_forecast(history, key, volume_free=volume_free, indent="    ")
+                    
+                    if scan_zero:
+                        for vdi_path, _ in index.find(vm_dir, (".vdi",)):
+                            try:
+                                with profiling.span("VDI 全零掃描", "fs", path=vdi_path):
+                                    scan = scan_image(vdi_path)
+                                print(f"    {vdi_path.name}: 可回收 {scan['reclaimable_bytes'] / (1024**3):.2f} GB"
+                                      f"（{scan['throughput'] / (1024**2):.0f} MB/s）")
+                            except (OSError, ValueError) as e:
+                                print(f"    {vdi_path.name}: 無法掃描 ({e})")
                     print()
             
             if vm_count == 0:
@@ -182,29 +202,20 @@ def analyze_vm_files():
                 print(f"  總計: {vm_count} 個虛擬機器，總大小: {format_size(total_size)}")
             print()
     
+    try:
+        index.save()
+    except OSError:
+        pass
+    
     # 檢查 OVA 檔案
     print("檢查 OVA/OVF 匯出檔案...")
     print()
     
-    ova_paths = [
-        Path(os.path.expanduser("~")) / "OneDrive" / "文件",
-        Path(os.path.expanduser("~")) / "Documents",
-        Path("C:\\Users") / os.getenv("USERNAME", "") / "Downloads",
-    ]
-    
-    ova_files = []
-    for ova_path in ova_paths:
-        if ova_path.exists():
-            for file_path in ova_path.rglob("*.ova"):
-                if file_path.exists():
-                    try:
-                        stat = file_path.stat()
-                        ova_files.append({
-                            "path": file_path,
-                            "size": stat.st_size
-                        })
-                    except:
-                        pass
+    # 三個搜尋目錄合併為一次走訪（含排除規則）
+    if ova_files is None:
+        with profiling.span("OVA 掃描", "fs"):
+            ova_files = build_default_plan(["ova"]).run()["ova"]
+    ova_files = [{"path": path, "size": size} for path, size in ova_files]
     
     if ova_files:
         print(f"找到 {len(ova_files)} 個 OVA 檔案：")
@@ -215,27 +226,67 @@ def analyze_vm_files():
     else:
         print("  沒有找到 OVA 檔案")
     
+    # 重複檔案：先依大小分組，再比對頭尾雜湊，最後才完整雜湊
+    if ova_files or disk_files:
+        print()
+        print("檢查重複的映像檔與匯出檔...")
+        with profiling.span("重複檔案比對", "fs"):
+            duplicates, _ = find_duplicates(disk_files + [ova["path"] for ova in ova_files])
+            redundant_ova = find_redundant_ova([ova["path"] for ova in ova_files], vm_dirs)
+        print_duplicate_report(duplicates, redundant_ova)
+        print()
+    
+    if top is not None:
+        for ova in ova_files:
+            top.add_file(ova["path"], ova["size"])
+        print("空間使用排行：")
+        print()
+        print_top_report(top, limit=top.top_files.n)
+        print()
+    
     return total_size, vm_count
 
 def main():
     """主函數"""
+    profiling.init_from_argv()
     print("=" * 80)
     print("VirtualBox 虛擬機器使用情況檢查")
     print("=" * 80)
     print()
     
+    # 三個 VBoxManage 查詢同時在背景執行
+    runner = ToolRunner()
+    runner.prefetch(["vbox_version", "vbox_vms", "vbox_running"])
+    
     # 檢查安裝狀態
-    is_installed = check_virtualbox_installed()
+    is_installed = check_virtualbox_installed(runner)
     
     if is_installed:
         # 列出虛擬機器
-        vm_count = list_virtual_machines()
+        vm_count = list_virtual_machines(runner)
         
         # 檢查運行狀態
-        check_vm_status()
+        check_vm_status(runner)
     
-    # 分析檔案
-    total_size, file_vm_count = analyze_vm_files()
+    # OVA 匯出檔由掃描計畫一次走訪找出（--ova-max-depth=N 限制搜尋深度）
+    plan = build_default_plan(["ova"], ova_max_depth=parse_depth_option(sys.argv[1:]))
+    with profiling.span("掃描計畫", "fs"):
+        planned = plan.run()
+
+    # 分析檔案（加上 --scan-zero 參數時掃描 VDI 全零區塊，--top[=N] 輸出最大檔案排行）
+    # 大小紀錄另外附加到欄式遙測資料表，供報表直接讀取
+    history = SizeHistory(export=telemetry_store.open_table("disk_sizes", telemetry_store.DISK_COLUMNS))
+    top_n = parse_top_option(sys.argv[1:])
+    total_size, file_vm_count = analyze_vm_files(
+        scan_zero="--scan-zero" in sys.argv,
+        ova_files=planned["ova"],
+        history=history,
+        top=SpaceReport(top_n) if top_n else None,
+    )
+    try:
+        history.save()
+    except OSError:
+        pass
     
     # 總結
     print("=" * 80)
@@ -264,6 +315,14 @@ def main():
         print("  2. 使用 VBoxManage 命令移動：")
         print("     VBoxManage modifyvm \"VM名稱\" --groups \"/新路徑\"")
         print("  3. 或手動移動 VDI 檔案並在 VirtualBox 中重新註冊")
+        print("     大型映像檔可用 bulk_mover.py 搬移（零複製、保留稀疏、可中斷續傳）：")
+        print("     python bulk_mover.py \"<VM目錄>\" \"J:\\VirtualBox VMs\\<VM名稱>\" --move --verify")
+    
+    # 加上 --watch 參數時持續監看虛擬機器目錄成長（--limit-gb=N、--growth-gb=N 設定警示門檻）
+    if "--watch" in sys.argv:
+        print()
+        limit, growth = parse_watch_options(sys.argv[1:])
+        watch(default_targets(limit=limit, growth=growth))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨映像檔區塊去重估算
+
+Docker / WSL / BlueStacks 的 VHDX 與 VirtualBox 的 VDI 常包含相同的
+作業系統區塊。本工具串流讀取多個映像檔，計算固定大小或內容定義（CDC）
+區塊的指紋，估算跨映像檔去重或共用基底映像可節省的空間。
+
+指紋以 array('Q') 存放（每個區塊 8 位元組，不使用 dict/bytes 物件），
+並依最高位元分成多個桶，統計時一次只排序一個桶，記憶體用量可控。
+映像檔遠大於記憶體時可設定 sample 只保留部分指紋（依指紋值取樣，
+相同內容在所有映像檔中都會被一致地取樣），結果按比例放大。
+"""
+
+from array import array
+from pathlib import Path
+import hashlib
+import os
+import random
+import sys
+
+from zero_scanner import data_ranges, format_size, is_vdi, parse_vdi_header, vdi_data_ranges
+
+# 設定 UTF-8 編碼輸出
+if sys.stdout.encoding != "utf-8":
+    try:
+        sys.stdout.reconfigure(encoding="utf-8")
+    except:
+        pass
+
+MB = 1024 * 1024
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_READ_SIZE = 16 * MB
+BUCKET_BITS = 8
+IMAGE_BITS = 8
+MAX_IMAGES = 1 << IMAGE_BITS
+
+# CDC（gear hash）的區塊大小限制
+CDC_MIN = 16 * 1024
+CDC_MAX = 256 * 1024
+
+def _gear_table():
+    rng = random.Random(0x5EED)
+    return [rng.getrandbits(64) for _ in range(256)]
+
+_GEAR = _gear_table()
+
+class FingerprintIndex:
+    """
+    以 array 儲存的指紋索引
+
+    每個值為 (56 位元指紋 << 8) | 映像檔編號，依指紋最高位元分桶。
+    """
+
+    def __init__(self, sample=1):
+        self.sample = sample
+        self.buckets = [array("Q") for _ in range(1 << BUCKET_BITS)]
+        self.images = []
+        self.zero_chunks = []
+        self.chunk_bytes = []
+
+    def add_image(self, name):
+        """登記映像檔，回傳其編號"""
+        if len(self.images) >= MAX_IMAGES:
+            raise ValueError(f"最多支援 {MAX_IMAGES} 個映像檔")
+        self.images.append(name)
+        self.zero_chunks.append(0)
+        self.chunk_bytes.append(0)
+        return len(self.images) - 1
+
+    def add(self, image_id, chunk):
+        """加入一個區塊"""
+        self.chunk_bytes[image_id] += len(chunk)
+        fp = int.from_bytes(hashlib.blake2b(chunk, digest_size=7).digest(), "big")
+        if self.sample > 1 and fp % self.sample:
+            return
+        self.buckets[fp >> (56 - BUCKET_BITS)].append((fp << IMAGE_BITS) | image_id)
+
+    def memory_bytes(self):
+        """索引目前佔用的記憶體（不含 Python 物件開銷）"""
+        return sum(len(bucket) * bucket.itemsize for bucket in self.buckets)
+
+    def summarize(self):
+        """
+        統計去重結果
+
+        Returns:
+            dict: 各項估算（已依 sample 放大，單位為區塊數）
+        """
+        count = len(self.images)
+        all_mask = (1 << count) - 1
+        mask_bits = IMAGE_BITS
+        id_mask = (1 << mask_bits) - 1
+
+        total = 0
+        unique = 0
+        common_to_all = 0
+        per_image = [{"chunks": 0, "distinct": 0, "shared": 0} for _ in range(count)]
+
+        for bucket in self.buckets:
+            # 一次只把一個桶轉成排序後的 list
+            values = sorted(bucket)
+            i = 0
+            n = len(values)
+            while i < n:
+                fp = values[i] >> mask_bits
+                j = i
+                mask = 0
+                counts = {}
+                while j < n and values[j] >> mask_bits == fp:
+                    image_id = values[j] & id_mask
+                    mask |= 1 << image_id
+                    counts[image_id] = counts.get(image_id, 0) + 1
+                    j += 1
+                occurrences = j - i
+                total += occurrences
+                unique += 1
+                shared = mask & (mask - 1) != 0
+                if count > 1 and mask == all_mask:
+                    common_to_all += 1
+                for image_id, c in counts.items():
+                    stats = per_image[image_id]
+                    stats["chunks"] += c
+                    stats["distinct"] += 1
+                    if shared:
+                        stats["shared"] += 1
+                i = j
+
+        scale = self.sample
+        for stats in per_image:
+            for key in stats:
+                stats[key] *= scale
+        return {
+            "total_chunks": total * scale,
+            "unique_chunks": unique * scale,
+            "common_chunks": common_to_all * scale,
+            "per_image": per_image,
+        }
+
+def _cdc_chunks(data, avg_size):
+    """以 gear hash 切出內容定義區塊（純 Python，速度較慢）"""
+    mask = (1 << max(1, avg_size.bit_length() - 1)) - 1
+    gear = _GEAR
+    start = 0
+    n = len(data)
+    while start < n:
+        h = 0
+        pos = min(start + CDC_MIN, n)
+        end = min(start + CDC_MAX, n)
+        while pos < end:
+            h = ((h << 1) + gear[data[pos]]) & 0xFFFFFFFFFFFFFFFF
+            pos += 1
+            if not h & mask:
+                break
+        yield data[start:pos]
+        start = pos
+
+def _image_ranges(path):
+    """VDI 只讀取已配置的資料區塊，其他格式略過空洞"""
+    if is_vdi(path):
+        return vdi_data_ranges(parse_vdi_header(path))
+    with open(path, "rb") as f:
+        return data_ranges(f.fileno(), os.fstat(f.fileno()).st_size)
+
+def index_image(index, path, chunk_size=DEFAULT_CHUNK_SIZE, cdc=False, read_size=DEFAULT_READ_SIZE):
+    """
+    串流讀取映像檔並把區塊指紋加入索引
+
+    Args:
+        index: FingerprintIndex
+        path: 映像檔路徑
+        chunk_size: 固定區塊大小（CDC 時為平均大小）
+        cdc: 是否使用內容定義區塊
+        read_size: 每次讀取的大小
+    """
+    image_id = index.add_image(str(path))
+    zero_chunk = bytes(chunk_size)
+    read_size = max(chunk_size, read_size - read_size % chunk_size)
+    buf = bytearray(read_size)
+    carry = b""
+    with open(path, "rb", buffering=0) as f:
+        for offset, length in _image_ranges(path):
+            end = offset + length
+            while offset < end:
+                f.seek(offset)
+                got = f.readinto(memoryview(buf)[:min(read_size, end - offset)])
+                if not got:
+                    break
+                offset += got
+                if cdc:
+                    # CDC 需跨讀取邊界，最後一個未完成的區塊留到下一輪
+                    data = carry + bytes(buf[:got])
+                    chunks = list(_cdc_chunks(data, chunk_size))
+                    carry = chunks.pop() if chunks and offset < end else b""
+                    for chunk in chunks:
+                        index.add(image_id, chunk)
+                    continue
+                view = memoryview(buf)
+                for pos in range(0, got, chunk_size):
+                    if pos + chunk_size <= got and buf.startswith(zero_chunk, pos):
+                        index.zero_chunks[image_id] += 1
+                        index.chunk_bytes[image_id] += chunk_size
+                        continue
+                    index.add(image_id, view[pos:min(pos + chunk_size, got)])
+            if carry:
+                index.add(image_id, carry)
+                carry = b""
+
+def estimate(paths, chunk_size=DEFAULT_CHUNK_SIZE, cdc=False, sample=1):
+    """
+    估算多個映像檔的去重效益
+
+    Returns:
+        dict: 統計結果（位元組）
+    """
+    index = FingerprintIndex(sample=sample)
+    for path in paths:
+        index_image(index, path, chunk_size=chunk_size, cdc=cdc)
+    summary = index.summarize()
+
+    # 以平均區塊大小換算位元組（固定區塊時即為 chunk_size）
+    indexed = summary["total_chunks"]
+    data_bytes = sum(index.chunk_bytes) - sum(index.zero_chunks) * chunk_size
+    avg_chunk = data_bytes / indexed if indexed else chunk_size
+
+    images = []
+    for name, stats, zeros in zip(index.images, summary["per_image"], index.zero_chunks):
+        images.append({
+            "path": name,
+            "data_bytes": int(stats["chunks"] * avg_chunk),
+            "zero_bytes": zeros * chunk_size,
+            "intra_duplicate_bytes": int((stats["chunks"] - stats["distinct"]) * avg_chunk),
+            "shared_bytes": int(stats["shared"] * avg_chunk),
+        })
+    return {
+        "images": images,
+        "data_bytes": int(indexed * avg_chunk),
+        "unique_bytes": int(summary["unique_chunks"] * avg_chunk),
+        "dedup_savings": int((indexed - summary["unique_chunks"]) * avg_chunk),
+        "common_bytes": int(summary["common_chunks"] * avg_chunk),
+        "index_memory": index.memory_bytes(),
+        "sample": sample,
+    }
+
+def print_estimate(result):
+    """輸出估算結果"""
+    for image in result["images"]:
+        print(f"映像檔: {image['path']}")
+        print(f"  非零資料: {format_size(image['data_bytes'])}，全零: {format_size(image['zero_bytes'])}")
+        print(f"  映像檔內重複: {format_size(image['intra_duplicate_bytes'])}")
+        print(f"  與其他映像檔共用: {format_size(image['shared_bytes'])}")
+    print()
+    print(f"非零資料總計: {format_size(result['data_bytes'])}")
+    print(f"去重後: {format_size(result['unique_bytes'])}（可節省 {format_size(result['dedup_savings'])}）")
+    if len(result["images"]) > 1:
+        print(f"所有映像檔共有的區塊: {format_size(result['common_bytes'])}（可作為共用基底映像）")
+    note = f"，取樣 1/{result['sample']}" if result["sample"] > 1 else ""
+    print(f"指紋索引記憶體: {format_size(result['index_memory'])}{note}")
+
+def main():
+    """主函數"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    options = [arg for arg in sys.argv[1:] if arg.startswith("--")]
+    if not args:
+        print("用法: python dedup_estimator.py <映像檔> [...] [--cdc] [--chunk-kb=64] [--sample=N]")
+        return
+
+    chunk_size = DEFAULT_CHUNK_SIZE
+    sample = 1
+    for option in options:
+        if option.startswith("--chunk-kb="):
+            chunk_size = int(option.split("=", 1)[1]) * 1024
+        elif option.startswith("--sample="):
+            sample = max(1, int(option.split("=", 1)[1]))
+
+    try:
+        result = estimate([Path(arg) for arg in args], chunk_size=chunk_size, cdc="--cdc" in options, sample=sample)
+    except (OSError, ValueError) as e:
+        print(f"錯誤: {e}")
+        return
+    print_estimate(result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目錄大小增量索引
+
+把每個目錄的大小、檔案數與 mtime/inode 存到磁碟上的索引檔，
+下次掃描時只重新列出 mtime 或 inode 有變動的目錄，其餘沿用快取的統計
+（類似 ncdu 的 export/import）。
+
+注意：在原地增長的檔案不會改變目錄的 mtime，因此虛擬硬碟等
+「追蹤檔案」（大檔案或映像檔副檔名）即使目錄未變動也會重新 stat。
+
+其餘檔案只保留每個目錄最大的幾個與依副檔名彙總的數量和大小，
+空間排行（top_files.SpaceReport.add_index）可直接由索引產生，不必再走訪。
+"""
+
+from pathlib import Path
+import json
+import os
+import sys
+
+from top_files import extension
+
+# 設定 UTF-8 編碼輸出
+if sys.stdout.encoding != "utf-8":
+    try:
+        sys.stdout.reconfigure(encoding="utf-8")
+    except:
+        pass
+
+INDEX_VERSION = 2
+
+DEFAULT_INDEX_PATH = Path(os.path.expanduser("~")) / ".wuchang_cache" / "dir_size_index.json"
+
+# 超過此大小的檔案會被追蹤，目錄未變動時仍重新 stat
+DEFAULT_TRACK_THRESHOLD = 64 * 1024 * 1024
+
+# 映像檔副檔名一律追蹤，方便之後直接從索引找出檔案
+IMAGE_SUFFIXES = (".vhdx", ".vhd", ".vdi", ".vmdk", ".ova", ".ovf", ".img", ".qcow2")
+
+# 每個目錄保留的最大非追蹤檔案數量（供空間排行使用），其餘只依副檔名彙總
+KEEP_LARGEST = 20
+
+class DirSizeIndex:
+    """持久化的目錄大小索引"""
+
+    def __init__(self, index_path=DEFAULT_INDEX_PATH, track_threshold=DEFAULT_TRACK_THRESHOLD):
+        """
+        初始化索引
+
+        Args:
+            index_path: 索引檔路徑
+            track_threshold: 追蹤檔案的大小門檻（位元組）
+        """
+        self.index_path = Path(index_path)
+        self.track_threshold = track_threshold
+        self.entries = {}
+        self.scanned_dirs = 0
+        self.reused_dirs = 0
+        self._seen = set()
+        self._roots = set()
+        self.load()
+
+    def load(self):
+        """從磁碟載入索引（檔案不存在或版本不符時從空索引開始）"""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self.entries = data.get("entries", {})
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        """寫回索引，並移除本次掃描根目錄下已不存在的項目"""
+        for path in list(self.entries):
+            if path in self._seen:
+                continue
+            for root in self._roots:
+                if path.startswith(root + os.sep):
+                    del self.entries[path]
+                    break
+
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "entries": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def _is_tracked(self, name, size):
+        """判斷檔案是否需要追蹤"""
+        return size >= self.track_threshold or name.lower().endswith(IMAGE_SUFFIXES)
+
+    def scan(self, path):
+        """
+        掃描目錄並回傳統計
+
+        Args:
+            path: 目錄路徑
+
+        Returns:
+            dict: {"size": 總大小, "files": 檔案數}，目錄無法讀取時回傳 None
+        """
+        path = os.path.abspath(str(path))
+        self._roots.add(path)
+        node = self._scan_dir(path)
+        if node is None:
+            return None
+        return {"size": node["size"], "files": node["files"]}
+
+    def _scan_dir(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        cached = self.entries.get(path)
+        if cached and cached["ino"] == st.st_ino and cached["mtime_ns"] == st.st_mtime_ns:
+            node = self._reuse(path, cached)
+        else:
+            node = self._rescan(path, st)
+            if node is None:
+                return None
+
+        # 子目錄內的變動不會反映到上層 mtime，因此仍逐一檢查（每個目錄只需一次 stat）
+        size = node["own_size"]
+        files = node["own_files"]
+        alive = []
+        for name in node["subdirs"]:
+            child = self._scan_dir(os.path.join(path, name))
+            if child is not None:
+                size += child["size"]
+                files += child["files"]
+                alive.append(name)
+        node["subdirs"] = alive
+        node["size"] = size
+        node["files"] = files
+
+        self.entries[path] = node
+        self._seen.add(path)
+        return node
+
+    def _reuse(self, path, cached):
+        """目錄未變動：沿用快取，只重新 stat 追蹤檔案"""
+        self.reused_dirs += 1
+        own_size = cached["own_size"]
+        tracked = cached["tracked"]
+        for name, old_size in list(tracked.items()):
+            try:
+                new_size = os.stat(os.path.join(path, name)).st_size
+            except OSError:
+                new_size = 0
+            if new_size != old_size:
+                own_size += new_size - old_size
+                tracked[name] = new_size
+        cached["own_size"] = own_size
+        return cached
+
+    def _rescan(self, path, st):
+        """目錄有變動：重新列出內容"""
+        self.scanned_dirs += 1
+        own_size = 0
+        own_files = 0
+        tracked = {}
+        others = []
+        subdirs = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                        elif entry.is_file(follow_symlinks=False):
+                            size = entry.stat(follow_symlinks=False).st_size
+                            own_size += size
+                            own_files += 1
+                            if self._is_tracked(entry.name, size):
+                                tracked[entry.name] = size
+                            else:
+                                others.append((size, entry.name))
+                    except OSError:
+                        pass
+        except OSError:
+            return None
+
+        others.sort(reverse=True)
+        exts = {}
+        for size, name in others[KEEP_LARGEST:]:
+            group = exts.setdefault(extension(name), [0, 0])
+            group[0] += 1
+            group[1] += size
+
+        return {
+            "ino": st.st_ino,
+            "mtime_ns": st.st_mtime_ns,
+            "own_size": own_size,
+            "own_files": own_files,
+            "tracked": tracked,
+            "largest": {name: size for size, name in others[:KEEP_LARGEST]},
+            "exts": exts,
+            "subdirs": subdirs,
+        }
+
+    def find(self, path, suffixes=IMAGE_SUFFIXES):
+        """
+        從索引中找出目錄樹內符合副檔名的追蹤檔案（需先 scan）
+
+        Args:
+            path: 目錄路徑
+            suffixes: 副檔名（小寫）
+
+        Yields:
+            tuple: (Path, 大小)
+        """
+        path = os.path.abspath(str(path))
+        stack = [path]
+        while stack:
+            current = stack.pop()
+            node = self.entries.get(current)
+            if node is None:
+                continue
+            for name, size in node["tracked"].items():
+                if name.lower().endswith(suffixes):
+                    yield Path(current) / name, size
+            stack.extend(os.path.join(current, name) for name in node["subdirs"])
+
+def main():
+    """主函數"""
+    if len(sys.argv) < 2:
+        print("用法: python dir_size_index.py <目錄> [<目錄> ...]")
+        return
+
+    index = DirSizeIndex()
+    for target in sys.argv[1:]:
+        result = index.scan(target)
+        if result is None:
+            print(f"無法讀取: {target}")
+            continue
+        print(f"{target}")
+        print(f"  大小: {result['size']:,} bytes")
+        print(f"  檔案數: {result['files']:,} 個")
+    index.save()
+    print()
+    print(f"重新掃描目錄: {index.scanned_dirs:,} 個，沿用快取: {index.reused_dirs:,} 個")
+
+if __name__ == "__main__":
+    main()
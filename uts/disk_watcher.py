@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+虛擬硬碟與虛擬機器目錄的即時監看
+
+Linux 上以 inotify 訂閱檔案系統事件，只對有事件的檔案重新 stat，
+增量更新各監看目標的總大小，不必定期重新走訪整棵目錄樹；
+超過大小上限或短時間內成長過快時立即發出警示。
+其他平台沒有 inotify，退回定期 stat 已知檔案的輪詢模式。
+"""
+
+from collections import deque
+from pathlib import Path
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+# 設定 UTF-8 編碼輸出
+if sys.stdout.encoding != "utf-8":
+    try:
+        sys.stdout.reconfigure(encoding="utf-8")
+    except:
+        pass
+
+GB = 1024 ** 3
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+EVENT_HEADER = struct.Struct("iIII")
+
+# 寫入頻繁時合併事件，每隔此秒數才重新 stat 有變動的檔案
+FLUSH_INTERVAL = 1.0
+POLL_INTERVAL = 10.0
+
+# 未指定 --growth-gb 時的成長警示門檻（預設 10 分鐘視窗內）
+DEFAULT_GROWTH = 5 * GB
+
+def format_size(size: int) -> str:
+    """格式化檔案大小"""
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if abs(size) < 1024.0:
+            return f"{size:.2f} {unit}"
+        size /= 1024.0
+    return f"{size:.2f} PB"
+
+class Inotify:
+    """最小的 inotify 封裝（ctypes）"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def remove_watch(self, wd):
+        self._rm_watch(self.fd, wd)
+
+    def read_events(self, timeout):
+        """等待事件，回傳 [(wd, mask, 名稱)]"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        pos = 0
+        while pos + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, pos)
+            pos += EVENT_HEADER.size
+            name = data[pos:pos + length].rstrip(b"\0")
+            pos += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class WatchTarget:
+    """監看目標（檔案或目錄樹）與警示設定"""
+
+    def __init__(self, path, limit=None, growth=None, window=600.0):
+        """
+        Args:
+            path: 檔案或目錄
+            limit: 總大小上限（位元組），超過時警示
+            growth: window 秒內的成長上限（位元組），超過時警示
+            window: 成長速度的觀察時間（秒）
+        """
+        self.path = os.path.abspath(str(path))
+        self.is_dir = os.path.isdir(self.path)
+        self.limit = limit
+        self.growth = growth
+        self.window = window
+        self.total = 0
+        self.samples = deque()
+        self.alerted = set()
+
+class DiskWatcher:
+    """增量維護監看目標的總大小並發出警示"""
+
+    def __init__(self, targets, on_alert=None, on_change=None):
+        """
+        Args:
+            targets: WatchTarget 列表
+            on_alert: 警示回呼 on_alert(target, 訊息)
+            on_change: 總大小變動時的回呼 on_change(target)
+        """
+        self.targets = targets
+        self.on_alert = on_alert or (lambda target, message: print(f"[ALERT] {message}", flush=True))
+        self.on_change = on_change
+        self.sizes = {}        # 檔案路徑 -> 大小
+        self.owner = {}        # 檔案路徑 -> WatchTarget
+        self.watches = {}      # wd -> 目錄路徑
+        self.dirty = set()
+        self.inotify = None
+
+    def _owner_of(self, path):
+        for target in self.targets:
+            if path == target.path or (target.is_dir and path.startswith(target.path + os.sep)):
+                return target
+        return None
+
+    def _set_size(self, path, size):
+        """更新單一檔案大小並調整所屬目標的總計"""
+        target = self.owner.get(path) or self._owner_of(path)
+        if target is None:
+            return
+        old = self.sizes.get(path, 0)
+        if size is None:
+            self.sizes.pop(path, None)
+            self.owner.pop(path, None)
+            size = 0
+        else:
+            self.sizes[path] = size
+            self.owner[path] = target
+        if size != old:
+            target.total += size - old
+            self._check(target)
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path, follow_symlinks=False)
+        except OSError:
+            return None
+        return st.st_size if not os.path.isdir(path) else None
+
+    def _add_tree(self, directory):
+        """監看目錄樹並登記其中所有檔案"""
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            if self.inotify:
+                try:
+                    self.watches[self.inotify.add_watch(current)] = current
+                except OSError as e:
+                    print(f"  無法監看 {current}: {e}")
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            self._set_size(entry.path, entry.stat(follow_symlinks=False).st_size)
+            except OSError:
+                pass
+
+    def _remove_tree(self, directory):
+        prefix = directory + os.sep
+        for path in [p for p in self.sizes if p.startswith(prefix)]:
+            self._set_size(path, None)
+
+    def start(self):
+        """建立初始統計與監看"""
+        try:
+            self.inotify = Inotify() if sys.platform.startswith("linux") else None
+        except (OSError, AttributeError):
+            self.inotify = None
+        for target in self.targets:
+            if target.is_dir:
+                self._add_tree(target.path)
+            else:
+                # 監看檔案所在目錄，檔案被取代或重新建立時仍能追蹤
+                parent = os.path.dirname(target.path)
+                if self.inotify:
+                    try:
+                        self.watches[self.inotify.add_watch(parent, WATCH_MASK & ~IN_DELETE_SELF)] = parent
+                    except OSError as e:
+                        print(f"  無法監看 {parent}: {e}")
+                size = self._stat(target.path)
+                if size is not None:
+                    self._set_size(target.path, size)
+
+    def _handle(self, wd, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            # 事件佇列溢位，遺失的事件無從得知，重新建立統計
+            self.sizes.clear()
+            self.owner.clear()
+            self.dirty.clear()
+            for target in self.targets:
+                target.total = 0
+            self.rescan()
+            return
+        directory = self.watches.get(wd)
+        if directory is None:
+            return
+        if mask & IN_IGNORED:
+            self.watches.pop(wd, None)
+            return
+        if not name:
+            return
+        path = os.path.join(directory, name)
+        if self._owner_of(path) is None:
+            return
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._add_tree(path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._remove_tree(path)
+            return
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            self.dirty.discard(path)
+            self._set_size(path, None)
+        else:
+            self.dirty.add(path)
+
+    def rescan(self):
+        """重新統計所有目標（目錄監看已存在時 inotify 會沿用原本的 wd）"""
+        for target in self.targets:
+            if target.is_dir:
+                self._add_tree(target.path)
+            else:
+                size = self._stat(target.path)
+                if size is not None:
+                    self._set_size(target.path, size)
+
+    def _flush(self):
+        """重新 stat 有事件的檔案"""
+        changed = set()
+        for path in self.dirty:
+            before = self.sizes.get(path)
+            self._set_size(path, self._stat(path))
+            if self.sizes.get(path) != before:
+                changed.add(self.owner.get(path) or self._owner_of(path))
+        self.dirty.clear()
+        now = time.time()
+        for target in self.targets:
+            target.samples.append((now, target.total))
+            while target.samples and now - target.samples[0][0] > target.window:
+                target.samples.popleft()
+            self._check(target)
+        if self.on_change:
+            for target in changed:
+                if target is not None:
+                    self.on_change(target)
+
+    def _check(self, target):
+        """檢查警示條件（跨越門檻時只警示一次，回落後重新啟用）"""
+        if target.limit is not None:
+            if target.total >= target.limit and "limit" not in target.alerted:
+                target.alerted.add("limit")
+                self.on_alert(target, f"{target.path} 已達 {format_size(target.total)}（上限 {format_size(target.limit)}）")
+            elif target.total < target.limit:
+                target.alerted.discard("limit")
+        if target.growth is not None and target.samples:
+            grown = target.total - min(size for _, size in target.samples)
+            if grown >= target.growth and "growth" not in target.alerted:
+                target.alerted.add("growth")
+                self.on_alert(target, f"{target.path} 在 {target.window / 60:.0f} 分鐘內成長 {format_size(grown)}")
+            elif grown < target.growth:
+                target.alerted.discard("growth")
+
+    def poll_once(self, timeout=FLUSH_INTERVAL):
+        """處理一輪事件（無 inotify 時改為 stat 已知檔案）"""
+        if self.inotify:
+            for wd, mask, name in self.inotify.read_events(timeout):
+                self._handle(wd, mask, name)
+        else:
+            time.sleep(timeout)
+            self.dirty.update(self.sizes)
+            self.dirty.update(t.path for t in self.targets if not t.is_dir)
+        self._flush()
+
+    def run(self):
+        """持續監看直到中斷"""
+        self.start()
+        interval = FLUSH_INTERVAL if self.inotify else POLL_INTERVAL
+        try:
+            while True:
+                self.poll_once(interval)
+        finally:
+            if self.inotify:
+                self.inotify.close()
+
+def default_targets(limit=None, growth=None):
+    """各分析器關注的映像檔與虛擬機器目錄（只回傳存在的路徑）"""
+    home = Path(os.path.expanduser("~"))
+    candidates = [
+        home / "AppData" / "Local" / "Docker" / "wsl" / "disk" / "docker_data.vhdx",
+        home / "AppData" / "Local" / "wsl",
+        Path("C:\\ProgramData\\BlueStacks_msi5\\Engine\\Nougat64\\Data.vhdx"),
+        home / "VirtualBox VMs",
+        Path("C:\\VirtualBox VMs"),
+    ]
+    return [WatchTarget(path, limit=limit, growth=growth) for path in candidates if path.exists()]
+
+def parse_watch_options(argv):
+    """
+    解析 --limit-gb=N 與 --growth-gb=N 參數
+
+    Returns:
+        tuple: (大小上限, 成長上限)（位元組）；未指定上限時為 None，成長上限預設為 DEFAULT_GROWTH
+    """
+    limit = None
+    growth = DEFAULT_GROWTH
+    for option in argv:
+        if option.startswith("--limit-gb="):
+            limit = int(float(option.split("=", 1)[1]) * GB)
+        elif option.startswith("--growth-gb="):
+            growth = int(float(option.split("=", 1)[1]) * GB)
+    return limit, growth
+
+def watch(targets):
+    """執行監看並輸出變動（供各分析腳本的 --watch 使用）"""
+    if not targets:
+        print("沒有可監看的目標")
+        return
+
+    def on_change(target):
+        print(f"{time.strftime('%H:%M:%S')} {target.path}: {format_size(target.total)}", flush=True)
+
+    watcher = DiskWatcher(targets, on_change=on_change)
+    mode = "inotify" if sys.platform.startswith("linux") else "輪詢"
+    print(f"監看模式: {mode}（Ctrl+C 結束）")
+    for target in targets:
+        print(f"  {target.path}")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        print("\n已停止監看")
+
+def main():
+    """主函數"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    limit, growth = parse_watch_options(sys.argv[1:])
+
+    if args:
+        targets = [WatchTarget(path, limit=limit, growth=growth) for path in args]
+    else:
+        targets = default_targets(limit=limit, growth=growth)
+    watch(targets)
+
+if __name__ == "__main__":
+    main()
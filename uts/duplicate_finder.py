@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大型映像檔與匯出檔的重複檔案偵測
+
+分階段縮小需要完整雜湊的範圍：
+1. 依檔案大小分組（大小不同的檔案不可能相同）
+2. 只雜湊頭尾各一段，再依結果分組
+3. 仍有多個候選的群組才完整雜湊（多執行緒平行）
+另外找出已有對應虛擬機器（VDI/VMDK 仍在）的多餘 OVA 匯出檔。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import hashlib
+import os
+import re
+import sys
+import tarfile
+
+# 設定 UTF-8 編碼輸出
+if sys.stdout.encoding != "utf-8":
+    try:
+        sys.stdout.reconfigure(encoding="utf-8")
+    except:
+        pass
+
+MB = 1024 * 1024
+
+DEFAULT_MIN_SIZE = 1 * MB
+DEFAULT_EDGE_SIZE = 1 * MB
+DEFAULT_BUFFER_SIZE = 8 * MB
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+_OVF_NAME_RE = re.compile(rb'<VirtualSystem[^>]*\sovf:id="([^"]+)"')
+
+def format_size(size: int) -> str:
+    """格式化檔案大小"""
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if size < 1024.0:
+            return f"{size:.2f} {unit}"
+        size /= 1024.0
+    return f"{size:.2f} PB"
+
+def edge_hash(path, size, edge_size=DEFAULT_EDGE_SIZE):
+    """雜湊檔案頭尾各 edge_size 位元組"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        h.update(f.read(edge_size))
+        if size > edge_size:
+            f.seek(max(edge_size, size - edge_size))
+            h.update(f.read(edge_size))
+    return h.hexdigest()
+
+def full_hash(path, buffer_size=DEFAULT_BUFFER_SIZE):
+    """完整雜湊檔案（重複使用同一個緩衝區）"""
+    h = hashlib.blake2b(digest_size=16)
+    buf = bytearray(buffer_size)
+    view = memoryview(buf)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            got = f.readinto(buf)
+            if not got:
+                break
+            h.update(view[:got])
+    return h.hexdigest()
+
+def _regroup(groups, key_func, workers):
+    """對每個群組的檔案平行計算 key，回傳仍有多個成員的新群組"""
+    items = [(size, path) for size, paths in groups for path in paths]
+
+    def compute(item):
+        size, path = item
+        try:
+            return key_func(path, size)
+        except OSError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        keys = list(pool.map(compute, items))
+
+    buckets = {}
+    for (size, path), key in zip(items, keys):
+        if key is not None:
+            buckets.setdefault((size, key), []).append(path)
+    return [(size, paths) for (size, _), paths in buckets.items() if len(paths) > 1]
+
+def find_duplicates(paths, min_size=DEFAULT_MIN_SIZE, workers=DEFAULT_WORKERS):
+    """
+    找出內容完全相同的檔案
+
+    Args:
+        paths: 候選檔案路徑
+        min_size: 忽略小於此大小的檔案
+        workers: 平行雜湊的執行緒數
+
+    Returns:
+        tuple: (重複群組列表, 各階段統計)
+               群組: {"size", "paths", "reclaimable"}
+    """
+    by_size = {}
+    seen_inodes = set()
+    candidates = 0
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        # 硬連結指向同一份資料，不算重複
+        inode = (st.st_dev, st.st_ino)
+        if st.st_ino and inode in seen_inodes:
+            continue
+        seen_inodes.add(inode)
+        if st.st_size < min_size:
+            continue
+        candidates += 1
+        by_size.setdefault(st.st_size, []).append(Path(path))
+
+    groups = [(size, files) for size, files in by_size.items() if len(files) > 1]
+    stats = {"candidates": candidates, "size_matched": sum(len(f) for _, f in groups)}
+
+    groups = _regroup(groups, edge_hash, workers)
+    stats["edge_matched"] = sum(len(f) for _, f in groups)
+
+    # 檔案小於頭尾兩段時，頭尾雜湊已涵蓋全部內容
+    small = [(size, files) for size, files in groups if size <= 2 * DEFAULT_EDGE_SIZE]
+    large = [(size, files) for size, files in groups if size > 2 * DEFAULT_EDGE_SIZE]
+    groups = small + _regroup(large, lambda path, size: full_hash(path), workers)
+    stats["fully_hashed"] = sum(len(f) for _, f in large)
+
+    duplicates = [
+        {"size": size, "paths": sorted(files), "reclaimable": size * (len(files) - 1)}
+        for size, files in groups
+    ]
+    duplicates.sort(key=lambda group: group["reclaimable"], reverse=True)
+    return duplicates, stats
+
+def ova_vm_name(path):
+    """從 OVA 內的 OVF 描述檔讀取虛擬機器名稱（只讀取 tar 的第一個成員），失敗時使用檔名"""
+    try:
+        with tarfile.open(path, mode="r|") as tar:
+            for member in tar:
+                if member.name.lower().endswith(".ovf"):
+                    ovf = tar.extractfile(member)
+                    match = _OVF_NAME_RE.search(ovf.read(256 * 1024)) if ovf else None
+                    if match:
+                        return match.group(1).decode("utf-8", "replace")
+                break
+    except (OSError, tarfile.TarError):
+        pass
+    return Path(path).stem
+
+def find_redundant_ova(ova_paths, vm_dirs):
+    """
+    找出對應虛擬機器仍存在（目錄內有 VDI/VMDK）的 OVA 匯出檔
+
+    Args:
+        ova_paths: OVA 檔案路徑
+        vm_dirs: 虛擬機器目錄
+
+    Returns:
+        list: [{"path", "vm", "size"}]
+    """
+    vms_with_disks = {}
+    for vm_dir in vm_dirs:
+        vm_dir = Path(vm_dir)
+        try:
+            has_disk = any(p.suffix.lower() in (".vdi", ".vmdk") for p in vm_dir.iterdir())
+        except OSError:
+            has_disk = False
+        if has_disk:
+            vms_with_disks[vm_dir.name.lower()] = vm_dir
+
+    redundant = []
+    for ova_path in ova_paths:
+        name = ova_vm_name(ova_path)
+        if name.lower() in vms_with_disks:
+            try:
+                size = os.stat(ova_path).st_size
+            except OSError:
+                continue
+            redundant.append({"path": Path(ova_path), "vm": name, "size": size})
+    return redundant
+
+def print_duplicate_report(duplicates, redundant_ova=(), indent="  "):
+    """輸出重複檔案與多餘 OVA 報告"""
+    if duplicates:
+        total = sum(group["reclaimable"] for group in duplicates)
+        print(f"{indent}完全相同的檔案: {len(duplicates)} 組，可回收 {format_size(total)}")
+        for group in duplicates:
+            print(f"{indent}  {format_size(group['size'])} × {len(group['paths'])}")
+            for path in group["paths"]:
+                print(f"{indent}    {path}")
+    else:
+        print(f"{indent}沒有找到完全相同的檔案")
+
+    if redundant_ova:
+        total = sum(item["size"] for item in redundant_ova)
+        print(f"{indent}虛擬機器仍存在的 OVA 匯出檔: {len(redundant_ova)} 個，可回收 {format_size(total)}")
+        for item in redundant_ova:
+            print(f"{indent}  {item['path']}（{item['vm']}，{format_size(item['size'])}）")
+
+def main():
+    """主函數"""
+    if len(sys.argv) < 2:
+        print("用法: python duplicate_finder.py <目錄或檔案> [...]")
+        return
+
+    paths = []
+    for target in sys.argv[1:]:
+        target = Path(target)
+        if target.is_file():
+            paths.append(target)
+        else:
+            for root, dirs, files in os.walk(target):
+                paths.extend(Path(root) / name for name in files)
+
+    duplicates, stats = find_duplicates(paths)
+    print(f"候選檔案: {stats['candidates']:,}，大小相同: {stats['size_matched']:,}，"
+          f"頭尾相同: {stats['edge_matched']:,}，完整雜湊: {stats['fully_hashed']:,}")
+    print_duplicate_report(duplicates)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+單次走訪的多樣式檔案掃描
+
+各分析器原本各自 rglob（WSL 的 *.vhdx、家目錄三個子目錄的 *.ova、
+VirtualBox VMs 的磁碟檔），同一批目錄會被走訪多次。ScanPlan 把所有
+根目錄與樣式合併成一次走訪：
+- 重疊的根目錄只走訪一次（巢狀根目錄由外層根目錄帶到）
+- 依排除規則與深度限制剪枝，與任何規則無關的子樹不會進入
+- 每個符合的檔案依規則名稱分派給對應的分析器
+"""
+
+from fnmatch import fnmatch
+from pathlib import Path
+import os
+import sys
+
+# 設定 UTF-8 編碼輸出
+if sys.stdout.encoding != "utf-8":
+    try:
+        sys.stdout.reconfigure(encoding="utf-8")
+    except:
+        pass
+
+# 預設不進入的目錄名稱
+DEFAULT_EXCLUDES = (
+    ".git",
+    "node_modules",
+    "__pycache__",
+    ".venv",
+    "venv",
+    "$RECYCLE.BIN",
+    "System Volume Information",
+)
+
+# OneDrive 底下常有很深的同步目錄，可用 --ova-max-depth=N 限制 OVA 搜尋深度
+# （預設不限，與原本的 rglob 相同，不會漏掉放得很深的匯出檔）
+OVA_MAX_DEPTH = None
+
+def _norm(path):
+    return os.path.normcase(os.path.abspath(str(path)))
+
+def _is_within(path, root):
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+class ScanPlan:
+    """合併多個掃描規則，以一次走訪完成"""
+
+    def __init__(self, excludes=DEFAULT_EXCLUDES):
+        """
+        Args:
+            excludes: 不進入的目錄名稱樣式（fnmatch，不分大小寫）
+        """
+        self.excludes = [pattern.lower() for pattern in excludes]
+        self.rules = []
+        self.visited_dirs = 0
+        self.visited_files = 0
+
+    def add(self, name, roots, patterns, max_depth=None, handler=None, collect=True):
+        """
+        新增規則
+
+        Args:
+            name: 規則名稱（結果依此分組）
+            roots: 根目錄列表
+            patterns: 檔名樣式（fnmatch，不分大小寫），如 ["*.vhdx"]
+            max_depth: 相對根目錄的最大深度（根目錄本身的檔案為 0，None 表示不限）
+            handler: 符合時呼叫 handler(path, stat)（可選）
+            collect: 是否把符合的檔案放進結果（只用 handler 串流處理時設為 False，避免保留完整清單）
+        """
+        roots = [_norm(root) for root in roots]
+        self.rules.append({
+            "name": name,
+            "roots": [root for i, root in enumerate(roots) if root not in roots[:i]],
+            "patterns": [pattern.lower() for pattern in patterns],
+            "max_depth": max_depth,
+            "handler": handler,
+            "collect": collect,
+        })
+        return self
+
+    def _walk_roots(self):
+        """合併所有根目錄：被其他根目錄包含的不必另外走訪"""
+        roots = sorted({root for rule in self.rules for root in rule["roots"]}, key=len)
+        merged = []
+        for root in roots:
+            if not any(_is_within(root, outer) for outer in merged):
+                merged.append(root)
+        return merged
+
+    def _active_rules(self, directory):
+        """
+        回傳 (在此目錄生效的規則與深度, 是否需要繼續往下走訪)
+        """
+        active = []
+        descend = False
+        for rule in self.rules:
+            for root in rule["roots"]:
+                if _is_within(directory, root):
+                    rel = directory[len(root):].strip(os.sep)
+                    depth = rel.count(os.sep) + 1 if rel else 0
+                    if rule["max_depth"] is None or depth <= rule["max_depth"]:
+                        active.append(rule)
+                        if rule["max_depth"] is None or depth < rule["max_depth"]:
+                            descend = True
+                        break
+                elif _is_within(root, directory):
+                    # 目錄是某個巢狀根目錄的上層，必須經過它才能到達
+                    descend = True
+        return active, descend
+
+    def _excluded(self, name):
+        lowered = name.lower()
+        return any(fnmatch(lowered, pattern) for pattern in self.excludes)
+
+    def run(self):
+        """
+        執行掃描
+
+        Returns:
+            dict: {規則名稱: [(Path, 大小), ...]}
+        """
+        results = {rule["name"]: [] for rule in self.rules}
+        stack = [root for root in self._walk_roots() if os.path.isdir(root)]
+        while stack:
+            directory = stack.pop()
+            active, descend = self._active_rules(directory)
+            if not active and not descend:
+                continue
+            self.visited_dirs += 1
+            try:
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if descend and not self._excluded(entry.name):
+                            stack.append(os.path.join(directory, entry.name))
+                        continue
+                    if not active or not entry.is_file(follow_symlinks=False):
+                        continue
+                    self.visited_files += 1
+                    lowered = entry.name.lower()
+                    stat = None
+                    for rule in active:
+                        if any(fnmatch(lowered, pattern) for pattern in rule["patterns"]):
+                            stat = stat or entry.stat(follow_symlinks=False)
+                            path = Path(entry.path)
+                            if rule["collect"]:
+                                results[rule["name"]].append((path, stat.st_size))
+                            if rule["handler"]:
+                                rule["handler"](path, stat)
+                except OSError:
+                    continue
+        return results
+
+def home_path(*parts):
+    return Path(os.path.expanduser("~")).joinpath(*parts)
+
+def user_path(*parts):
+    return Path("C:\\Users", os.getenv("USERNAME", ""), *parts)
+
+def wsl_roots():
+    """WSL 發行版虛擬硬碟所在的目錄"""
+    return [home_path("AppData", "Local", "wsl"), user_path("AppData", "Local", "wsl")]
+
+def parse_depth_option(argv, default=OVA_MAX_DEPTH):
+    """解析 --ova-max-depth=N 參數，未指定時回傳 default"""
+    for option in argv:
+        if option.startswith("--ova-max-depth="):
+            return max(0, int(option.split("=", 1)[1]))
+    return default
+
+def build_default_plan(names=None, ova_max_depth=OVA_MAX_DEPTH):
+    """
+    建立各分析器共用的掃描計畫
+
+    規則名稱：
+        wsl_vhdx    WSL 虛擬硬碟（analyze_virtual_disks.analyze_wsl_disk）
+        ova         OVA 匯出檔（check_virtualbox.analyze_vm_files）
+
+    VirtualBox VMs 的大小統計由 DirSizeIndex 增量處理，不在此重新走訪。
+
+    Args:
+        names: 只加入指定名稱的規則（None 表示全部）
+        ova_max_depth: OVA 搜尋的最大深度（None 表示不限）
+    """
+    rules = {
+        "wsl_vhdx": (wsl_roots(), ["*.vhdx"], None),
+        "ova": ([home_path("OneDrive", "文件"), home_path("Documents"), user_path("Downloads")], ["*.ova"], ova_max_depth),
+    }
+    plan = ScanPlan()
+    for name, (roots, patterns, max_depth) in rules.items():
+        if names is None or name in names:
+            plan.add(name, roots, patterns, max_depth=max_depth)
+    return plan
+
+def main():
+    """主函數：一次走訪後把結果分派給各分析器"""
+    from analyze_virtual_disks import analyze_wsl_disk
+    from check_virtualbox import analyze_vm_files
+
+    plan = build_default_plan(ova_max_depth=parse_depth_option(sys.argv[1:]))
+    results = plan.run()
+    print(f"走訪目錄: {plan.visited_dirs:,} 個，檔案: {plan.visited_files:,} 個")
+    print()
+
+    analyze_wsl_disk(vhdx_files=results["wsl_vhdx"])
+    analyze_vm_files(ova_files=results["ova"])
+
+if __name__ == "__main__":
+    main()
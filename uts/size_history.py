@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+虛擬硬碟大小歷史與成長預測
+
+每次執行分析時記錄各映像檔、虛擬機器目錄與磁碟區的大小：
+- 歷史以固定長度的二進位紀錄（時間 + 大小，16 位元組）附加到每個項目的檔案
+- 另外維護指數衰減加權的迴歸累計值（摘要檔），每筆新紀錄以 O(1) 更新，
+  預測時不必重新讀取完整歷史；較新的資料權重較高，能反映最近的成長速度
+"""
+
+from pathlib import Path
+import hashlib
+import json
+import math
+import os
+import shutil
+import struct
+import sys
+import time
+
+# 設定 UTF-8 編碼輸出
+if sys.stdout.encoding != "utf-8":
+    try:
+        sys.stdout.reconfigure(encoding="utf-8")
+    except:
+        pass
+
+DEFAULT_HISTORY_DIR = Path(os.path.expanduser("~")) / ".wuchang_cache" / "size_history"
+DEFAULT_HALF_LIFE_DAYS = 30.0
+DAY = 86400.0
+GB = 1024 ** 3
+MAX_FORECAST_DAYS = 3650
+
+RECORD = struct.Struct("<dQ")
+
+def format_size(size: int) -> str:
+    """格式化檔案大小"""
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if abs(size) < 1024.0:
+            return f"{size:.2f} {unit}"
+        size /= 1024.0
+    return f"{size:.2f} PB"
+
+class SizeHistory:
+    """大小歷史紀錄與增量迴歸"""
+
+    def __init__(self, directory=DEFAULT_HISTORY_DIR, half_life_days=DEFAULT_HALF_LIFE_DAYS, export=None):
+        """
+        Args:
+            directory: 歷史資料目錄
+            half_life_days: 權重減半所需天數
+            export: 另外附加每筆紀錄的目標（有 append({"time", "key", "size"}) 與 flush()，
+                    如 telemetry_store 的 TableWriter）
+        """
+        self.directory = Path(directory)
+        self.half_life_days = half_life_days
+        self.export = export
+        self.summary_path = self.directory / "summary.json"
+        try:
+            with open(self.summary_path, "r", encoding="utf-8") as f:
+                self.summary = json.load(f)
+        except (OSError, ValueError):
+            self.summary = {}
+
+    def _data_path(self, key):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        return self.directory / f"{digest}.bin"
+
+    def record(self, key, size, timestamp=None):
+        """
+        記錄一筆大小
+
+        Args:
+            key: 項目名稱（如檔案路徑）
+            size: 大小（位元組）
+            timestamp: 時間（秒，預設為現在）
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self._data_path(key), "ab") as f:
+            f.write(RECORD.pack(timestamp, size))
+        if self.export is not None:
+            self.export.append({"time": timestamp, "key": key, "size": size})
+
+        state = self.summary.get(key)
+        if state is None:
+            # x 以第一筆紀錄為原點（天），y 以 GB 計，避免累計值過大失去精度
+            state = {"t0": timestamp, "last_t": timestamp, "w": 0.0, "sx": 0.0, "sy": 0.0, "sxx": 0.0, "sxy": 0.0, "n": 0}
+            self.summary[key] = state
+
+        decay = 0.5 ** (max(0.0, timestamp - state["last_t"]) / DAY / self.half_life_days)
+        for name in ("w", "sx", "sy", "sxx", "sxy"):
+            state[name] *= decay
+        x = (timestamp - state["t0"]) / DAY
+        y = size / GB
+        state["w"] += 1.0
+        state["sx"] += x
+        state["sy"] += y
+        state["sxx"] += x * x
+        state["sxy"] += x * y
+        state["n"] += 1
+        state["last_t"] = max(state["last_t"], timestamp)
+        state["last_size"] = size
+
+    def growth(self, key):
+        """
+        成長速度（位元組/天）；樣本不足或時間跨度為 0 時回傳 None
+        """
+        state = self.summary.get(key)
+        if not state or state["n"] < 2:
+            return None
+        denominator = state["w"] * state["sxx"] - state["sx"] ** 2
+        if denominator <= 1e-12:
+            return None
+        slope = (state["w"] * state["sxy"] - state["sx"] * state["sy"]) / denominator
+        return slope * GB
+
+    def forecast(self, key, limit):
+        """
+        預測還有多少天會成長到 limit
+
+        Args:
+            key: 項目名稱
+            limit: 目標大小（位元組）
+
+        Returns:
+            float: 天數；不成長或無法預測時回傳 None
+        """
+        rate = self.growth(key)
+        state = self.summary.get(key)
+        if rate is None or rate <= 0 or state is None:
+            return None
+        return max(0.0, (limit - state["last_size"]) / rate)
+
+    def history(self, key):
+        """讀取完整歷史 [(時間, 大小)]（僅供報表使用，預測不需要）"""
+        try:
+            with open(self._data_path(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            return []
+        usable = len(data) - len(data) % RECORD.size
+        return list(RECORD.iter_unpack(data[:usable]))
+
+    def save(self):
+        """寫回摘要檔"""
+        if self.export is not None:
+            self.export.flush()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.summary_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.summary, f, ensure_ascii=False)
+        os.replace(tmp_path, self.summary_path)
+
+def volume_key(path):
+    """磁碟區的項目名稱"""
+    anchor = Path(path).anchor or os.sep
+    return f"volume:{anchor}"
+
+def record_volume(history, path):
+    """記錄檔案所在磁碟區的使用量，回傳 shutil.disk_usage 結果（失敗時為 None）"""
+    try:
+        usage = shutil.disk_usage(path)
+    except OSError:
+        return None
+    history.record(volume_key(path), usage.used)
+    return usage
+
+def print_forecast(history, key, capacity=None, volume_free=None, indent="  ", capacity_label="達到虛擬容量上限"):
+    """
+    輸出成長速度與預計填滿時間
+
+    Args:
+        history: SizeHistory
+        key: 項目名稱
+        capacity: 項目本身的上限（如虛擬硬碟的虛擬容量）
+        volume_free: 所在磁碟區的剩餘空間
+        capacity_label: 達到 capacity 時的說明文字
+    """
+    rate = history.growth(key)
+    if rate is None:
+        print(f"{indent}成長趨勢: 資料不足（需要至少兩次紀錄）")
+        return
+    print(f"{indent}成長速度: {format_size(rate)}/天")
+    if rate <= 0:
+        return
+
+    size = history.summary[key]["last_size"]
+    candidates = []
+    if capacity:
+        candidates.append((history.forecast(key, capacity), capacity_label))
+    if volume_free is not None:
+        candidates.append((history.forecast(key, size + volume_free), "填滿磁碟剩餘空間"))
+    if candidates:
+        days, reason = min(candidates)
+        days = max(0.0, days)
+        if days > MAX_FORECAST_DAYS:
+            # 成長極慢時天數可能超出 time_t 範圍
+            print(f"{indent}以目前速度 {MAX_FORECAST_DAYS // 365} 年內不會{reason}")
+            return
+        when = time.strftime("%Y-%m-%d", time.localtime(time.time() + days * DAY))
+        print(f"{indent}預計 {math.ceil(days)} 天後（{when}）{reason}，請在此之前安排壓縮")
+
+def main():
+    """主函數：輸出所有項目的成長趨勢"""
+    history = SizeHistory()
+    if not history.summary:
+        print("尚無歷史紀錄，請先執行 analyze_virtual_disks.py 或 check_virtualbox.py")
+        return
+    for key, state in sorted(history.summary.items()):
+        print(f"{key}")
+        print(f"  目前大小: {format_size(state['last_size'])}（{state['n']} 筆紀錄）")
+        print_forecast(history, key, capacity_label="達到上限")
+        print()
+
+if __name__ == "__main__":
+    main()
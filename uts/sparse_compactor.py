@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+稀疏壓縮工具（Linux）
+
+取代只能在 Windows 上執行的 Optimize-VHD，適用於 raw 與 VDI 映像檔：
+- punch：就地以 fallocate(PUNCH_HOLE) 把全零區塊打成空洞
+- copy：複製到新檔案時略過全零區塊，輸出稀疏檔
+以 SEEK_DATA/SEEK_HOLE 略過既有空洞，固定大小的緩衝區串流處理，
+並定期寫入檢查點，中斷後可從上次進度繼續。
+"""
+
+from pathlib import Path
+import ctypes
+import ctypes.util
+import json
+import os
+import sys
+import time
+
+from zero_scanner import data_ranges, format_size, is_vdi, parse_vdi_header, split_ranges, vdi_data_ranges
+
+# 設定 UTF-8 編碼輸出
+if sys.stdout.encoding != "utf-8":
+    try:
+        sys.stdout.reconfigure(encoding="utf-8")
+    except:
+        pass
+
+MB = 1024 * 1024
+
+FALLOC_FL_KEEP_SIZE = 0x01
+FALLOC_FL_PUNCH_HOLE = 0x02
+
+DEFAULT_CHUNK_SIZE = 16 * MB
+DEFAULT_BLOCK_SIZE = 64 * 1024
+CHECKPOINT_INTERVAL = 1024 * MB
+STATE_SUFFIX = ".compact-state"
+
+_libc = None
+
+def punch_hole(fd, offset, length):
+    """
+    在檔案中打洞（保留檔案大小）
+
+    Raises:
+        OSError: 平台或檔案系統不支援
+    """
+    global _libc
+    if not sys.platform.startswith("linux"):
+        raise OSError("打洞僅支援 Linux")
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        _libc.fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+    if _libc.fallocate(fd, FALLOC_FL_PUNCH_HOLE | FALLOC_FL_KEEP_SIZE, offset, length) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+def allocated_bytes(path) -> int:
+    """檔案實際佔用的磁碟空間"""
+    st = os.stat(path)
+    return getattr(st, "st_blocks", 0) * 512 or st.st_size
+
+def _plan(path, block_size, image_aware):
+    """回傳 (資料範圍, 區塊大小, 是否對齊)：image_aware 時 VDI 只處理已配置的資料區塊"""
+    if image_aware and is_vdi(path):
+        header = parse_vdi_header(path)
+        return vdi_data_ranges(header), header["block_size"], False
+    with open(path, "rb") as f:
+        return data_ranges(f.fileno(), os.fstat(f.fileno()).st_size), block_size, True
+
+def _zero_runs(buf, length, block_size, base):
+    """找出緩衝區中連續的全零區塊，回傳 [(檔案偏移, 長度)]"""
+    zero_block = bytes(block_size)
+    runs = []
+    for pos in range(0, length - block_size + 1, block_size):
+        if buf.startswith(zero_block, pos):
+            if runs and runs[-1][0] + runs[-1][1] == base + pos:
+                runs[-1][1] += block_size
+            else:
+                runs.append([base + pos, block_size])
+    return runs
+
+def _load_state(state_path, source_stat, in_place=False):
+    """
+    讀取檢查點；來源檔案有變動時視為無效
+
+    就地打洞會改變來源檔本身的修改時間，因此 in_place 時只比對大小與 inode。
+    """
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    if not isinstance(state, dict):
+        return 0
+    if state.get("size") != source_stat.st_size or state.get("inode") != source_stat.st_ino:
+        return 0
+    if not in_place and state.get("mtime_ns") != source_stat.st_mtime_ns:
+        return 0
+    offset = state.get("offset", 0)
+    return offset if isinstance(offset, int) and offset > 0 else 0
+
+def _save_state(state_path, source_stat, offset):
+    tmp_path = str(state_path) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"size": source_stat.st_size, "inode": source_stat.st_ino,
+                   "mtime_ns": source_stat.st_mtime_ns, "offset": offset}, f)
+    os.replace(tmp_path, state_path)
+
+def print_progress(done, total, started):
+    """預設的進度輸出"""
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed > 0 else 0
+    percent = done * 100 / total if total else 100
+    print(f"\r  進度: {percent:5.1f}% ({format_size(done)} / {format_size(total)}, {format_size(rate)}/s)",
+          end="", flush=True)
+
+def _process(path, block_size, chunk_size, state_path, handle_chunk, progress, image_aware, in_place=False):
+    """
+    共用的串流流程：依資料範圍讀取、交給 handle_chunk 處理、定期寫入檢查點
+
+    in_place 表示 handle_chunk 會修改來源檔本身（就地打洞）
+    """
+    ranges, block_size, align = _plan(path, block_size, image_aware)
+    chunk_size = max(block_size, chunk_size - chunk_size % block_size)
+    jobs = split_ranges(ranges, chunk_size, block_size, align=align)
+    total = sum(length for _, length in jobs)
+
+    # 檢查點記錄的是「已處理到的檔案偏移」，且之前的工作單位都已完成
+    source_stat = os.stat(path)
+    resume_offset = _load_state(state_path, source_stat, in_place)
+    done = sum(length for offset, length in jobs if offset + length <= resume_offset)
+
+    buf = bytearray(chunk_size)
+    started = time.perf_counter()
+    last_report = 0.0
+    since_checkpoint = 0
+    with open(path, "rb", buffering=0) as src:
+        for offset, length in jobs:
+            if offset + length <= resume_offset:
+                continue
+            src.seek(offset)
+            got = src.readinto(memoryview(buf)[:length])
+            handle_chunk(buf, got, offset, block_size)
+            done += got
+            since_checkpoint += got
+            if since_checkpoint >= CHECKPOINT_INTERVAL:
+                handle_chunk(None, 0, offset + got, block_size)  # 讓呼叫端先 fsync
+                _save_state(state_path, source_stat, offset + got)
+                since_checkpoint = 0
+            now = time.perf_counter()
+            if progress and now - last_report >= 1.0:
+                progress(done, total, started)
+                last_report = now
+    if progress:
+        progress(done, total, started)
+        print()
+
+    try:
+        os.remove(state_path)
+    except OSError:
+        pass
+    return total
+
+def punch_zero_blocks(path, block_size=DEFAULT_BLOCK_SIZE, chunk_size=DEFAULT_CHUNK_SIZE, progress=print_progress):
+    """
+    就地把全零區塊打成空洞（映像檔必須未被虛擬機器使用）
+
+    Args:
+        path: 映像檔路徑
+        block_size: raw 映像檔的判斷單位（需為檔案系統區塊大小的倍數；VDI 使用其區塊大小）
+        chunk_size: 每次讀取的大小
+        progress: 進度回呼 progress(done, total, started)，None 表示不輸出
+
+    Returns:
+        dict: 處理統計
+    """
+    path = Path(path)
+    before = allocated_bytes(path)
+    punched = [0]
+
+    fd = os.open(path, os.O_RDWR)
+    try:
+        def handle_chunk(buf, length, offset, block):
+            if buf is None:
+                os.fsync(fd)
+                return
+            for run_offset, run_length in _zero_runs(buf, length, block, offset):
+                punch_hole(fd, run_offset, run_length)
+                punched[0] += run_length
+
+        processed = _process(path, block_size, chunk_size, str(path) + STATE_SUFFIX, handle_chunk, progress, True,
+                             in_place=True)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    after = allocated_bytes(path)
+    return {
+        "processed_bytes": processed,
+        "punched_bytes": punched[0],
+        "allocated_before": before,
+        "allocated_after": after,
+        "reclaimed_bytes": max(0, before - after),
+    }
+
+def sparse_copy(source, destination, block_size=DEFAULT_BLOCK_SIZE, chunk_size=DEFAULT_CHUNK_SIZE, progress=print_progress):
+    """
+    複製映像檔並略過全零區塊，輸出稀疏檔（可中斷後繼續）
+
+    VDI 的標頭與區塊對照表也需要複製，因此一律以 raw 方式處理整個檔案。
+
+    Args:
+        source: 來源映像檔
+        destination: 目的檔案
+        block_size: 判斷全零的單位
+        chunk_size: 每次讀取的大小
+        progress: 進度回呼，None 表示不輸出
+
+    Returns:
+        dict: 處理統計
+    """
+    source = Path(source)
+    destination = Path(destination)
+    state_path = str(destination) + STATE_SUFFIX
+    written = [0]
+
+    # 有有效的檢查點時沿用既有的目的檔，否則重新建立
+    # （從頭開始時若不截斷，略過的全零區塊會留下目的檔的舊資料）
+    flags = os.O_WRONLY | os.O_CREAT
+    if _load_state(state_path, source.stat()) <= 0:
+        flags |= os.O_TRUNC
+    fd = os.open(destination, flags, 0o644)
+    try:
+        def handle_chunk(buf, length, offset, block):
+            if buf is None:
+                os.fsync(fd)
+                return
+            view = memoryview(buf)
+            zero_block = bytes(block)
+            pos = 0
+            while pos < length:
+                end = min(pos + block, length)
+                if end - pos == block and buf.startswith(zero_block, pos):
+                    pos = end
+                    continue
+                # 合併連續的非零區塊，減少寫入次數
+                while end < length and not (end + block <= length and buf.startswith(zero_block, end)):
+                    end = min(end + block, length)
+                os.lseek(fd, offset + pos, os.SEEK_SET)
+                os.write(fd, view[pos:end])
+                written[0] += end - pos
+                pos = end
+
+        processed = _process(source, block_size, chunk_size, state_path, handle_chunk, progress, False)
+        os.ftruncate(fd, source.stat().st_size)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    return {
+        "processed_bytes": processed,
+        "written_bytes": written[0],
+        "skipped_bytes": processed - written[0],
+        "source_allocated": allocated_bytes(source),
+        "destination_allocated": allocated_bytes(destination),
+    }
+
+def main():
+    """主函數"""
+    if len(sys.argv) < 3 or sys.argv[1] not in ("punch", "copy") or (sys.argv[1] == "copy" and len(sys.argv) < 4):
+        print("用法:")
+        print("  python sparse_compactor.py punch <映像檔>          就地打洞（需先關閉虛擬機器）")
+        print("  python sparse_compactor.py copy <來源> <目的>      稀疏複製")
+        return
+
+    try:
+        if sys.argv[1] == "punch":
+            print(f"就地壓縮: {sys.argv[2]}")
+            result = punch_zero_blocks(sys.argv[2])
+            print(f"  打洞: {format_size(result['punched_bytes'])}")
+            print(f"  佔用空間: {format_size(result['allocated_before'])} → {format_size(result['allocated_after'])}")
+        else:
+            print(f"稀疏複製: {sys.argv[2]} → {sys.argv[3]}")
+            result = sparse_copy(sys.argv[2], sys.argv[3])
+            print(f"  寫入: {format_size(result['written_bytes'])}，略過全零: {format_size(result['skipped_bytes'])}")
+            print(f"  佔用空間: {format_size(result['source_allocated'])} → {format_size(result['destination_allocated'])}")
+    except (OSError, ValueError) as e:
+        print(f"\n錯誤: {e}")
+        print("已處理的進度已記錄，可重新執行相同命令繼續")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+外部工具查詢執行器
+
+以 asyncio 子行程同時執行 docker / VBoxManage 等查詢，整體耗時取決於
+最慢的工具而非所有工具的總和。優先使用機器可讀的輸出格式並解析成結構，
+結果在短時間（TTL）內快取到磁碟，連續執行多個分析腳本時不必重複查詢；
+會隨時變動的狀態（如執行中的虛擬機器）不快取。
+工具以 PATH 尋找，測試時可在 PATH 前面放置假的執行檔。
+"""
+
+from pathlib import Path
+import asyncio
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+# 設定 UTF-8 編碼輸出
+if sys.stdout.encoding != "utf-8":
+    try:
+        sys.stdout.reconfigure(encoding="utf-8")
+    except:
+        pass
+
+DEFAULT_CACHE_PATH = Path(os.path.expanduser("~")) / ".wuchang_cache" / "tool_cache.json"
+DEFAULT_TTL = 30.0
+
+_VBOX_LIST_RE = re.compile(r'^"(.*)"\s+\{([0-9a-fA-F-]+)\}\s*$')
+
+def parse_text(stdout):
+    """原樣回傳（去除前後空白）"""
+    return stdout.strip()
+
+def parse_json_lines(stdout):
+    """解析每行一個 JSON 物件的輸出（如 docker --format '{{json .}}'）"""
+    records = []
+    for line in stdout.splitlines():
+        line = line.strip()
+        if line:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                pass
+    return records
+
+def parse_vbox_list(stdout):
+    """解析 VBoxManage list vms / runningvms 的 "名稱" {uuid} 格式"""
+    vms = []
+    for line in stdout.splitlines():
+        match = _VBOX_LIST_RE.match(line.strip())
+        if match:
+            vms.append({"name": match.group(1), "uuid": match.group(2), "line": line.strip()})
+    return vms
+
+# 名稱: (命令, 逾時秒數, 解析函數)
+QUERIES = {
+    "docker_df": (["docker", "system", "df", "--format", "{{json .}}"], 10, parse_json_lines),
+    "vbox_version": (["VBoxManage", "--version"], 5, parse_text),
+    "vbox_vms": (["VBoxManage", "list", "vms"], 10, parse_vbox_list),
+    "vbox_running": (["VBoxManage", "list", "runningvms"], 10, parse_vbox_list),
+}
+
+# 個別查詢的快取秒數（未列出的使用 ToolRunner 的 ttl，0 表示不快取）
+# 執行狀態隨時會變，沿用 30 秒前的結果會把剛啟動或關閉的虛擬機器報錯
+QUERY_TTL = {
+    "vbox_running": 0,
+}
+
+class ToolRunner:
+    """同時執行外部工具查詢並快取結果"""
+
+    def __init__(self, cache_path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, queries=None, query_ttl=None):
+        """
+        Args:
+            cache_path: 快取檔路徑（None 表示不使用磁碟快取）
+            ttl: 快取有效秒數
+            queries: 查詢定義（預設為 QUERIES）
+            query_ttl: 個別查詢的快取秒數（預設為 QUERY_TTL）
+        """
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.ttl = ttl
+        self.queries = queries or QUERIES
+        self.query_ttl = QUERY_TTL if query_ttl is None else query_ttl
+        self.results = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _load_cache(self):
+        if not self.cache_path:
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self, fresh):
+        if not self.cache_path or not fresh:
+            return
+        with self._lock:
+            cache = self._load_cache()
+            cache.update(fresh)
+            try:
+                self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.cache_path.with_suffix(".tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(cache, f, ensure_ascii=False)
+                os.replace(tmp_path, self.cache_path)
+            except OSError:
+                pass
+
+    async def _run_one(self, name):
+        argv, timeout, parser = self.queries[name]
+        started = time.perf_counter()
+        result = {"argv": argv, "ok": False, "returncode": None, "stdout": "", "data": None, "error": None}
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *argv,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except FileNotFoundError:
+            result["error"] = "not_found"
+            result["elapsed"] = time.perf_counter() - started
+            return result
+        except OSError as e:
+            result["error"] = str(e)
+            result["elapsed"] = time.perf_counter() - started
+            return result
+
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            result["error"] = "timeout"
+            result["elapsed"] = time.perf_counter() - started
+            return result
+
+        result["returncode"] = proc.returncode
+        result["stdout"] = stdout.decode("utf-8", "replace")
+        result["ok"] = proc.returncode == 0
+        if result["ok"]:
+            result["data"] = parser(result["stdout"])
+        else:
+            result["error"] = stderr.decode("utf-8", "replace").strip() or f"exit {proc.returncode}"
+        result["elapsed"] = time.perf_counter() - started
+        return result
+
+    async def _run_many(self, names):
+        return await asyncio.gather(*(self._run_one(name) for name in names))
+
+    def run(self, names):
+        """
+        同時執行多個查詢（TTL 內的結果直接取自快取）
+
+        Args:
+            names: 查詢名稱列表
+
+        Returns:
+            dict: {名稱: 結果}，結果含 ok / data / stdout / error / elapsed / cached
+        """
+        now = time.time()
+        cache = self._load_cache()
+        results = {}
+        pending = []
+        for name in names:
+            entry = cache.get(name)
+            if (entry and entry.get("argv") == self.queries[name][0] and now - entry.get("time", 0) < self._ttl(name)
+                    and entry["result"].get("ok")):
+                results[name] = dict(entry["result"], cached=True)
+            else:
+                pending.append(name)
+
+        fresh = {}
+        if pending:
+            for name, result in zip(pending, asyncio.run(self._run_many(pending))):
+                results[name] = dict(result, cached=False)
+                # 只快取成功的結果；找不到工具、逾時或非零結束（如 docker 服務尚未啟動）下次仍重新嘗試
+                if result["ok"] and self._ttl(name) > 0:
+                    fresh[name] = {"argv": result["argv"], "time": now, "result": result}
+        self._save_cache(fresh)
+        self.results.update(results)
+        return results
+
+    def _ttl(self, name):
+        return self.query_ttl.get(name, self.ttl)
+
+    def prefetch(self, names):
+        """在背景執行緒開始查詢，之後以 get() 取得結果"""
+        self._thread = threading.Thread(target=self.run, args=(list(names),), daemon=True)
+        self._thread.start()
+
+    def get(self, name):
+        """取得查詢結果（背景查詢尚未完成時等待；未查詢過則立即執行）"""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if name not in self.results:
+            self.run([name])
+        return self.results[name]
+
+def main():
+    """主函數"""
+    names = sys.argv[1:] or list(QUERIES)
+    started = time.perf_counter()
+    results = ToolRunner().run(names)
+    for name, result in results.items():
+        status = "OK" if result["ok"] else f"失敗 ({result['error']})"
+        source = "快取" if result["cached"] else f"{result['elapsed']:.2f} 秒"
+        print(f"{name}: {status}，{source}")
+        if result["ok"]:
+            print(f"  {json.dumps(result['data'], ensure_ascii=False)}")
+    print(f"總耗時: {time.perf_counter() - started:.2f} 秒")
+
+if __name__ == "__main__":
+    main()
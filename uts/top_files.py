@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+最大檔案與目錄排行（固定記憶體）
+
+走訪時以最小堆積（heapq）只保留前 N 大的檔案與目錄，另依副檔名與
+類別（vhdx / vdi / ova / snapshots / logs）累計大小；無論掃描多少檔案，
+記憶體用量只與 N 和類別數有關，不保留完整的檔案清單。
+目錄大小以後序走訪計算，子目錄統計完成後即可丟棄。
+
+已由 DirSizeIndex 掃描過的目錄可用 add_index 直接從索引產生排行；
+由 ScanPlan 走訪的目錄可用 tree_handler 在同一次走訪中加入排行。
+"""
+
+from pathlib import Path
+import heapq
+import itertools
+import os
+import sys
+
+# 設定 UTF-8 編碼輸出
+if sys.stdout.encoding != "utf-8":
+    try:
+        sys.stdout.reconfigure(encoding="utf-8")
+    except:
+        pass
+
+DEFAULT_TOP_N = 20
+
+# 副檔名種類上限，超過後歸入「其他」，避免大量奇怪檔名撐大統計表
+MAX_EXTENSIONS = 256
+OTHER_EXTENSION = "(其他)"
+
+# 類別: 副檔名
+CATEGORY_SUFFIXES = {
+    "vhdx": (".vhdx", ".vhd", ".avhdx", ".avhd"),
+    "vdi": (".vdi", ".vmdk", ".qcow2", ".img"),
+    "ova": (".ova", ".ovf"),
+    "snapshots": (".sav", ".vsv", ".vmrs", ".vmsn"),
+    "logs": (".log",),
+}
+
+# 位於這些目錄下的檔案歸入對應類別（VirtualBox 的 Snapshots / Logs）
+CATEGORY_DIRS = {
+    "snapshots": "snapshots",
+    "logs": "logs",
+}
+
+def format_size(size: int) -> str:
+    """格式化檔案大小"""
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if abs(size) < 1024.0:
+            return f"{size:.2f} {unit}"
+        size /= 1024.0
+    return f"{size:.2f} PB"
+
+def categorize(path):
+    """
+    判斷檔案類別
+
+    Returns:
+        str: vhdx / vdi / ova / snapshots / logs / other
+    """
+    name = os.path.basename(str(path)).lower()
+    # 輪替的日誌（VBox.log.1）也算日誌
+    if ".log." in name and name.rsplit(".", 1)[-1].isdigit():
+        return "logs"
+    return categorize_extension(extension(path), _parent_name(path))
+
+def categorize_extension(ext, parent):
+    """
+    依副檔名與所在目錄名稱（小寫）判斷類別
+
+    Returns:
+        str: vhdx / vdi / ova / snapshots / logs / other
+    """
+    for category, suffixes in CATEGORY_SUFFIXES.items():
+        if ext in suffixes:
+            # 快照目錄裡的差異磁碟歸入 snapshots
+            if category in ("vhdx", "vdi") and parent == "snapshots":
+                return "snapshots"
+            return category
+    return CATEGORY_DIRS.get(parent, "other")
+
+def _parent_name(path):
+    return os.path.basename(os.path.dirname(str(path))).lower()
+
+def extension(path):
+    """副檔名（小寫，輪替日誌的數字後綴略過）"""
+    name = os.path.basename(str(path)).lower()
+    stem, ext = os.path.splitext(name)
+    if ext[1:].isdigit() and stem.endswith(".log"):
+        return ".log"
+    return ext or "(無)"
+
+class TopN:
+    """以最小堆積保留前 N 大的項目"""
+
+    def __init__(self, n=DEFAULT_TOP_N):
+        self.n = n
+        self.heap = []
+        self._counter = itertools.count()
+
+    def push(self, size, item):
+        """加入項目（比目前第 N 名小時直接捨棄）"""
+        entry = (size, next(self._counter), item)
+        if len(self.heap) < self.n:
+            heapq.heappush(self.heap, entry)
+        elif size > self.heap[0][0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def items(self):
+        """由大到小回傳 [(大小, 項目)]"""
+        return [(size, item) for size, _, item in sorted(self.heap, reverse=True)]
+
+class SpaceReport:
+    """串流累計的空間使用報表"""
+
+    def __init__(self, n=DEFAULT_TOP_N):
+        """
+        Args:
+            n: 排行保留的數量
+        """
+        self.top_files = TopN(n)
+        self.top_dirs = TopN(n)
+        self.categories = {}
+        self.extensions = {}
+        self.files = 0
+        self.total = 0
+        self._roots = []
+        self._dir_sizes = {}
+
+    def add_file(self, path, size):
+        """加入一個檔案"""
+        self.top_files.push(size, str(path))
+        self._add_group(categorize(path), extension(path), 1, size)
+
+    def _add_group(self, category, ext, files, size):
+        """累計一組同類別、同副檔名的檔案"""
+        self.files += files
+        self.total += size
+
+        count, total = self.categories.get(category, (0, 0))
+        self.categories[category] = (count + files, total + size)
+
+        if ext not in self.extensions and len(self.extensions) >= MAX_EXTENSIONS:
+            ext = OTHER_EXTENSION
+        count, total = self.extensions.get(ext, (0, 0))
+        self.extensions[ext] = (count + files, total + size)
+
+    def add_dir(self, path, size):
+        """加入一個已統計完成的目錄"""
+        self.top_dirs.push(size, str(path))
+
+    def add_index(self, index, root):
+        """
+        從已掃描的 DirSizeIndex 加入目錄樹（只讀索引，不存取檔案系統）
+
+        追蹤檔案與各目錄最大的檔案逐一加入排行，其餘依副檔名彙總計入分類統計。
+
+        Returns:
+            int: 目錄樹總大小（root 不在索引中時為 0）
+        """
+        root = os.path.abspath(str(root))
+        stack = [root]
+        while stack:
+            current = stack.pop()
+            node = index.entries.get(current)
+            if node is None:
+                continue
+            self.add_dir(current, node["size"])
+            for files in (node["tracked"], node["largest"]):
+                for name, size in files.items():
+                    self.add_file(os.path.join(current, name), size)
+            parent = os.path.basename(current).lower()
+            for ext, (count, size) in node["exts"].items():
+                self._add_group(categorize_extension(ext, parent), ext, count, size)
+            stack.extend(os.path.join(current, name) for name in node["subdirs"])
+        node = index.entries.get(root)
+        return node["size"] if node else 0
+
+    def tree_handler(self, roots):
+        """
+        建立 ScanPlan 的 handler：檔案即時加入排行，目錄大小在 finish_trees() 時彙總
+
+        搭配樣式 "*" 且 collect=False 的規則使用，與其他規則共用同一次走訪。
+
+        Args:
+            roots: 規則的根目錄列表（目錄大小彙總到此為止）
+        """
+        self._roots.extend(os.path.normcase(os.path.abspath(str(root))) for root in roots)
+
+        def handler(path, stat):
+            size = stat.st_size
+            self.add_file(path, size)
+            directory = os.path.dirname(str(path))
+            self._dir_sizes[directory] = self._dir_sizes.get(directory, 0) + size
+
+        return handler
+
+    def finish_trees(self):
+        """把 tree_handler 累計的目錄大小由深到淺往上彙總並加入排行"""
+        sizes = self._dir_sizes
+        heap = [(-directory.count(os.sep), directory) for directory in sizes]
+        heapq.heapify(heap)
+        while heap:
+            _, directory = heapq.heappop(heap)
+            size = sizes[directory]
+            self.add_dir(directory, size)
+            parent = os.path.dirname(directory)
+            if directory in self._roots or parent == directory:
+                continue
+            if parent not in sizes:
+                heapq.heappush(heap, (-parent.count(os.sep), parent))
+                sizes[parent] = 0
+            sizes[parent] += size
+        self._roots = []
+        self._dir_sizes = {}
+
+    def walk(self, root):
+        """
+        後序走訪目錄樹，檔案與目錄大小即時加入排行
+
+        Returns:
+            int: 目錄樹總大小
+        """
+        root = os.path.abspath(str(root))
+        # 堆疊元素: [目錄, 待走訪的子目錄, 目前累計大小]
+        stack = [[root, None, 0]]
+        total = 0
+        while stack:
+            frame = stack[-1]
+            if frame[1] is None:
+                subdirs = []
+                try:
+                    with os.scandir(frame[0]) as it:
+                        for entry in it:
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    subdirs.append(entry.path)
+                                elif entry.is_file(follow_symlinks=False):
+                                    size = entry.stat(follow_symlinks=False).st_size
+                                    frame[2] += size
+                                    self.add_file(entry.path, size)
+                            except OSError:
+                                pass
+                except OSError:
+                    pass
+                frame[1] = subdirs
+            if frame[1]:
+                stack.append([frame[1].pop(), None, 0])
+                continue
+            stack.pop()
+            self.add_dir(frame[0], frame[2])
+            if stack:
+                stack[-1][2] += frame[2]
+            else:
+                total = frame[2]
+        return total
+
+def print_top_report(report, limit=10, indent="  "):
+    """輸出排行與分類統計"""
+    if not report.files:
+        print(f"{indent}沒有檔案")
+        return
+
+    print(f"{indent}最大的檔案（共掃描 {report.files:,} 個，{format_size(report.total)}）：")
+    for size, path in report.top_files.items()[:limit]:
+        print(f"{indent}  {format_size(size):>12}  {path}")
+    print()
+
+    dirs = report.top_dirs.items()[:limit]
+    if dirs:
+        print(f"{indent}最大的目錄：")
+        for size, path in dirs:
+            print(f"{indent}  {format_size(size):>12}  {path}")
+        print()
+
+    print(f"{indent}依類別：")
+    for category, (count, total) in sorted(report.categories.items(), key=lambda item: -item[1][1]):
+        share = total / report.total * 100 if report.total else 0
+        print(f"{indent}  {category:<10}{format_size(total):>12}  {share:5.1f}%  {count:,} 個")
+    print()
+
+    print(f"{indent}依副檔名（前 {limit} 名）：")
+    extensions = sorted(report.extensions.items(), key=lambda item: -item[1][1])[:limit]
+    for ext, (count, total) in extensions:
+        print(f"{indent}  {ext:<10}{format_size(total):>12}  {count:,} 個")
+
+def parse_top_option(argv, default=DEFAULT_TOP_N):
+    """解析 --top 或 --top=N 參數，未指定時回傳 None"""
+    for option in argv:
+        if option == "--top":
+            return default
+        if option.startswith("--top="):
+            return max(1, int(option.split("=", 1)[1]))
+    return None
+
+def main():
+    """主函數"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if not args:
+        print("用法: python top_files.py <目錄> [...] [--top=N]")
+        return
+
+    report = SpaceReport(parse_top_option(sys.argv[1:]) or DEFAULT_TOP_N)
+    for target in args:
+        path = Path(target)
+        if path.is_dir():
+            report.walk(path)
+        elif path.is_file():
+            report.add_file(path, path.stat().st_size)
+        else:
+            print(f"無法讀取: {target}")
+    print_top_report(report, limit=report.top_files.n)
+
+if __name__ == "__main__":
+    main()
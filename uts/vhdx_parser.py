@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+VHDX 中繼資料解析（唯讀）
+
+以 mmap 讀取 VHDX 的標頭、區域表、中繼資料表與區塊配置表（BAT），
+統計已配置/未配置的資料區塊與 sector bitmap 狀態，並估算可回收空間。
+只讀取中繼資料，不掃描資料區塊，因此 100 GB 以上的映像檔也能瞬間完成。
+"""
+
+from pathlib import Path
+from array import array
+import mmap
+import struct
+import sys
+import uuid
+
+# 設定 UTF-8 編碼輸出
+if sys.stdout.encoding != "utf-8":
+    try:
+        sys.stdout.reconfigure(encoding="utf-8")
+    except:
+        pass
+
+KB = 1024
+MB = 1024 * 1024
+
+FILE_IDENTIFIER = b"vhdxfile"
+HEADER_OFFSETS = (64 * KB, 128 * KB)
+HEADER_SIZE = 4 * KB
+REGION_TABLE_OFFSETS = (192 * KB, 256 * KB)
+REGION_TABLE_SIZE = 64 * KB
+HEADER_SECTION_SIZE = 1 * MB
+
+BAT_GUID = uuid.UUID("2DC27766-F623-4200-9D64-115E9BFD4A08")
+METADATA_GUID = uuid.UUID("8B7CA206-4790-4B9A-B8FE-575F050F886E")
+
+FILE_PARAMETERS_GUID = uuid.UUID("CAA16737-FA36-4D43-B3B6-33F0AA44E76B")
+VIRTUAL_DISK_SIZE_GUID = uuid.UUID("2FA54224-CD1B-4876-B211-5DBED83BF4B8")
+LOGICAL_SECTOR_SIZE_GUID = uuid.UUID("8141BF1D-A96F-4709-BA47-F233A8FAAB5F")
+PHYSICAL_SECTOR_SIZE_GUID = uuid.UUID("CDA348C7-445D-4471-9CC9-E9885251C556")
+
+# BAT 資料區塊狀態
+PAYLOAD_BLOCK_NOT_PRESENT = 0
+PAYLOAD_BLOCK_UNDEFINED = 1
+PAYLOAD_BLOCK_ZERO = 2
+PAYLOAD_BLOCK_UNMAPPED = 3
+PAYLOAD_BLOCK_FULLY_PRESENT = 6
+PAYLOAD_BLOCK_PARTIALLY_PRESENT = 7
+
+# BAT sector bitmap 狀態
+SB_BLOCK_NOT_PRESENT = 0
+SB_BLOCK_PRESENT = 6
+
+PAYLOAD_STATE_NAMES = {
+    PAYLOAD_BLOCK_NOT_PRESENT: "not_present",
+    PAYLOAD_BLOCK_UNDEFINED: "undefined",
+    PAYLOAD_BLOCK_ZERO: "zero",
+    PAYLOAD_BLOCK_UNMAPPED: "unmapped",
+    PAYLOAD_BLOCK_FULLY_PRESENT: "fully_present",
+    PAYLOAD_BLOCK_PARTIALLY_PRESENT: "partially_present",
+}
+
+def _make_crc32c_table():
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+_CRC32C_TABLE = _make_crc32c_table()
+
+def crc32c(data) -> int:
+    """計算 CRC-32C（Castagnoli），VHDX 標頭與區域表使用此校驗"""
+    crc = 0xFFFFFFFF
+    table = _CRC32C_TABLE
+    for byte in bytes(data):
+        crc = table[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc ^ 0xFFFFFFFF
+
+def _checksum_ok(block) -> bool:
+    """驗證結構的校驗碼（校驗欄位位於偏移 4，計算時視為 0）"""
+    stored = struct.unpack_from("<I", block, 4)[0]
+    data = bytearray(block)
+    data[4:8] = b"\0\0\0\0"
+    return crc32c(data) == stored
+
+def _read_header(mm, offset):
+    """讀取單一標頭，無效時回傳 None"""
+    block = mm[offset:offset + HEADER_SIZE]
+    if len(block) < HEADER_SIZE or block[:4] != b"head" or not _checksum_ok(block):
+        return None
+    sequence, = struct.unpack_from("<Q", block, 8)
+    log_guid = uuid.UUID(bytes_le=bytes(block[48:64]))
+    log_version, version, log_length, log_offset = struct.unpack_from("<HHIQ", block, 64)
+    return {
+        "sequence": sequence,
+        "log_guid": log_guid,
+        "log_version": log_version,
+        "version": version,
+        "log_length": log_length,
+        "log_offset": log_offset,
+    }
+
+def _read_region_table(mm, offset):
+    """讀取區域表，無效時回傳 None"""
+    block = mm[offset:offset + REGION_TABLE_SIZE]
+    if len(block) < REGION_TABLE_SIZE or block[:4] != b"regi" or not _checksum_ok(block):
+        return None
+    entry_count, = struct.unpack_from("<I", block, 8)
+    if entry_count > 2047:
+        return None
+    regions = {}
+    for i in range(entry_count):
+        pos = 16 + i * 32
+        guid = uuid.UUID(bytes_le=bytes(block[pos:pos + 16]))
+        file_offset, length, flags = struct.unpack_from("<QII", block, pos + 16)
+        regions[guid] = {"offset": file_offset, "length": length, "required": bool(flags & 1)}
+    return regions
+
+def _read_metadata(mm, region):
+    """讀取中繼資料表中的磁碟參數"""
+    base = region["offset"]
+    if mm[base:base + 8] != b"metadata":
+        raise ValueError("中繼資料表簽章無效")
+    entry_count, = struct.unpack_from("<H", mm, base + 10)
+
+    items = {}
+    for i in range(entry_count):
+        pos = base + 32 + i * 32
+        item_id = uuid.UUID(bytes_le=bytes(mm[pos:pos + 16]))
+        item_offset, item_length = struct.unpack_from("<II", mm, pos + 16)
+        items[item_id] = (base + item_offset, item_length)
+
+    for required in (FILE_PARAMETERS_GUID, VIRTUAL_DISK_SIZE_GUID, LOGICAL_SECTOR_SIZE_GUID):
+        if required not in items:
+            raise ValueError(f"缺少必要的中繼資料項目: {required}")
+
+    block_size, file_flags = struct.unpack_from("<II", mm, items[FILE_PARAMETERS_GUID][0])
+    virtual_size, = struct.unpack_from("<Q", mm, items[VIRTUAL_DISK_SIZE_GUID][0])
+    logical_sector, = struct.unpack_from("<I", mm, items[LOGICAL_SECTOR_SIZE_GUID][0])
+    physical_sector = None
+    if PHYSICAL_SECTOR_SIZE_GUID in items:
+        physical_sector, = struct.unpack_from("<I", mm, items[PHYSICAL_SECTOR_SIZE_GUID][0])
+
+    if block_size < MB or block_size > 256 * MB or block_size & (block_size - 1):
+        raise ValueError(f"區塊大小無效: {block_size}")
+    if logical_sector not in (512, 4096):
+        raise ValueError(f"邏輯磁區大小無效: {logical_sector}")
+
+    return {
+        "block_size": block_size,
+        "leave_blocks_allocated": bool(file_flags & 1),
+        "has_parent": bool(file_flags & 2),
+        "virtual_size": virtual_size,
+        "logical_sector_size": logical_sector,
+        "physical_sector_size": physical_sector,
+    }
+
+def parse_vhdx(path):
+    """
+    解析 VHDX 中繼資料並統計區塊配置
+
+    Args:
+        path: VHDX 檔案路徑
+
+    Returns:
+        dict: 磁碟參數、區塊統計與可回收空間估算
+
+    Raises:
+        ValueError: 檔案不是有效的 VHDX
+        OSError: 檔案無法讀取
+    """
+    path = Path(path)
+    with open(path, "rb") as f:
+        file_size = path.stat().st_size
+        if file_size < HEADER_SECTION_SIZE:
+            raise ValueError("檔案太小，不是有效的 VHDX")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:8] != FILE_IDENTIFIER:
+                raise ValueError("缺少 vhdxfile 識別碼，不是有效的 VHDX")
+            return _parse(mm, file_size)
+
+def _parse(mm, file_size):
+    headers = [h for h in (_read_header(mm, off) for off in HEADER_OFFSETS) if h]
+    if not headers:
+        raise ValueError("兩個標頭皆無效")
+    header = max(headers, key=lambda h: h["sequence"])
+
+    regions = None
+    for offset in REGION_TABLE_OFFSETS:
+        regions = _read_region_table(mm, offset)
+        if regions is not None:
+            break
+    if regions is None:
+        raise ValueError("兩個區域表皆無效")
+    if BAT_GUID not in regions or METADATA_GUID not in regions:
+        raise ValueError("區域表缺少 BAT 或中繼資料區域")
+
+    params = _read_metadata(mm, regions[METADATA_GUID])
+    block_size = params["block_size"]
+    chunk_ratio = (2 ** 23 * params["logical_sector_size"]) // block_size
+    data_blocks = -(-params["virtual_size"] // block_size)
+    bitmap_blocks = -(-data_blocks // chunk_ratio)
+    if params["has_parent"]:
+        total_entries = bitmap_blocks * (chunk_ratio + 1)
+    else:
+        total_entries = data_blocks + (data_blocks - 1) // chunk_ratio if data_blocks else 0
+
+    bat_region = regions[BAT_GUID]
+    if total_entries * 8 > bat_region["length"]:
+        raise ValueError("BAT 區域長度不足")
+    bat = array("Q")
+    bat.frombytes(mm[bat_region["offset"]:bat_region["offset"] + total_entries * 8])
+    if sys.byteorder != "little":
+        bat.byteswap()
+
+    payload_counts = dict.fromkeys(PAYLOAD_STATE_NAMES.values(), 0)
+    bitmap_present = 0
+    referenced = HEADER_SECTION_SIZE + bat_region["length"] + regions[METADATA_GUID]["length"]
+    if header["log_offset"]:
+        referenced += header["log_length"]
+    held_by_free_blocks = 0
+
+    stride = chunk_ratio + 1
+    payload_seen = 0
+    for i, entry in enumerate(bat):
+        state = entry & 0x7
+        offset_mb = entry >> 20
+        if i % stride == chunk_ratio:
+            if state == SB_BLOCK_PRESENT:
+                bitmap_present += 1
+                referenced += MB
+            continue
+        if payload_seen >= data_blocks:
+            continue
+        payload_seen += 1
+        name = PAYLOAD_STATE_NAMES.get(state, "undefined")
+        payload_counts[name] += 1
+        if state in (PAYLOAD_BLOCK_FULLY_PRESENT, PAYLOAD_BLOCK_PARTIALLY_PRESENT):
+            referenced += block_size
+        elif offset_mb:
+            # 已釋放（zero/unmapped）但仍佔用檔案空間的區塊
+            held_by_free_blocks += block_size
+
+    allocated_blocks = payload_counts["fully_present"] + payload_counts["partially_present"]
+    return {
+        "file_size": file_size,
+        "version": header["version"],
+        "sequence": header["sequence"],
+        "log_pending": header["log_guid"].int != 0,
+        **params,
+        "chunk_ratio": chunk_ratio,
+        "data_blocks": data_blocks,
+        "payload_states": payload_counts,
+        "allocated_blocks": allocated_blocks,
+        "unallocated_blocks": data_blocks - allocated_blocks,
+        "allocated_bytes": allocated_blocks * block_size,
+        "sector_bitmap_blocks": bitmap_blocks,
+        "sector_bitmap_present": bitmap_present,
+        "held_by_free_blocks": held_by_free_blocks,
+        "reclaimable_bytes": max(0, file_size - referenced),
+    }
+
+def format_size(size: int) -> str:
+    """格式化檔案大小"""
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if size < 1024.0:
+            return f"{size:.2f} {unit}"
+        size /= 1024.0
+    return f"{size:.2f} PB"
+
+def print_vhdx_report(info, indent="  "):
+    """輸出 VHDX 分析結果"""
+    print(f"{indent}虛擬容量: {format_size(info['virtual_size'])}，區塊大小: {format_size(info['block_size'])}")
+    print(f"{indent}已配置區塊: {info['allocated_blocks']:,} / {info['data_blocks']:,}"
+          f" ({format_size(info['allocated_bytes'])})")
+    print(f"{indent}未配置區塊: {info['unallocated_blocks']:,}"
+          f"（zero: {info['payload_states']['zero']:,}，unmapped: {info['payload_states']['unmapped']:,}）")
+    if info["has_parent"]:
+        print(f"{indent}差異磁碟 sector bitmap: {info['sector_bitmap_present']:,} / {info['sector_bitmap_blocks']:,} 已配置")
+    if info["log_pending"]:
+        print(f"{indent}注意: 記錄檔尚未重播（磁碟可能未正常卸載），統計可能不準確")
+    print(f"{indent}預估可回收空間: {format_size(info['reclaimable_bytes'])}")
+
+def main():
+    """主函數"""
+    if len(sys.argv) < 2:
+        print("用法: python vhdx_parser.py <檔案.vhdx> [<檔案.vhdx> ...]")
+        return
+
+    for target in sys.argv[1:]:
+        print(f"檔案: {target}")
+        try:
+            info = parse_vhdx(target)
+        except (OSError, ValueError) as e:
+            print(f"  無法解析: {e}")
+            print()
+            continue
+        print(f"  檔案大小: {format_size(info['file_size'])}")
+        print_vhdx_report(info)
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全零區塊掃描器
+
+估算 VDI / raw 映像檔壓縮後可回收的空間：
+- VDI：解析區塊對照表，只掃描已配置的區塊
+- raw：以 SEEK_DATA/SEEK_HOLE 略過既有的空洞（系統支援時）
+以大型對齊區段讀入重複使用的緩衝區，用 bytearray.startswith 與全零樣板比對
+（C 層 memcmp，不複製資料），並以多執行緒平行處理不同區段。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from array import array
+import os
+import struct
+import sys
+import time
+
+# 設定 UTF-8 編碼輸出
+if sys.stdout.encoding != "utf-8":
+    try:
+        sys.stdout.reconfigure(encoding="utf-8")
+    except:
+        pass
+
+MB = 1024 * 1024
+
+VDI_SIGNATURE = 0xBEDA107F
+VDI_BLOCK_FREE = 0xFFFFFFFF
+VDI_BLOCK_ZERO = 0xFFFFFFFE
+VDI_TYPE_NAMES = {1: "normal", 2: "fixed", 3: "undo", 4: "diff"}
+
+DEFAULT_CHUNK_SIZE = 64 * MB
+DEFAULT_RAW_BLOCK_SIZE = 64 * 1024
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+
+def format_size(size: int) -> str:
+    """格式化檔案大小"""
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if size < 1024.0:
+            return f"{size:.2f} {unit}"
+        size /= 1024.0
+    return f"{size:.2f} PB"
+
+def parse_vdi_header(path):
+    """
+    解析 VDI 標頭與區塊對照表
+
+    Args:
+        path: VDI 檔案路徑
+
+    Returns:
+        dict: 標頭資訊與 block_map（array，每個虛擬區塊對應的資料區塊索引）
+
+    Raises:
+        ValueError: 不是支援的 VDI 格式
+    """
+    with open(path, "rb") as f:
+        pre = f.read(72)
+        if len(pre) < 72:
+            raise ValueError("檔案太小，不是有效的 VDI")
+        signature, version = struct.unpack_from("<II", pre, 64)
+        if signature != VDI_SIGNATURE:
+            raise ValueError("VDI 簽章不符")
+        if version >> 16 != 1:
+            raise ValueError(f"不支援的 VDI 版本: {version:#x}")
+
+        header = f.read(400 - 72)
+        (image_type, ) = struct.unpack_from("<I", header, 4)
+        off_blocks, off_data = struct.unpack_from("<II", header, 268)
+        disk_size, block_size, block_extra, blocks, blocks_allocated = struct.unpack_from("<QIIII", header, 296)
+        if block_size == 0 or block_size % 512:
+            raise ValueError(f"區塊大小無效: {block_size}")
+
+        f.seek(off_blocks)
+        block_map = array("I")
+        block_map.frombytes(f.read(blocks * 4))
+        if len(block_map) != blocks:
+            raise ValueError("區塊對照表不完整")
+        if sys.byteorder != "little":
+            block_map.byteswap()
+
+    return {
+        "type": VDI_TYPE_NAMES.get(image_type, str(image_type)),
+        "off_blocks": off_blocks,
+        "off_data": off_data,
+        "disk_size": disk_size,
+        "block_size": block_size,
+        "block_extra": block_extra,
+        "blocks": blocks,
+        "blocks_allocated": blocks_allocated,
+        "block_map": block_map,
+    }
+
+def is_vdi(path) -> bool:
+    """以簽章判斷是否為 VDI"""
+    try:
+        with open(path, "rb") as f:
+            pre = f.read(72)
+    except OSError:
+        return False
+    return len(pre) == 72 and struct.unpack_from("<I", pre, 64)[0] == VDI_SIGNATURE
+
+def vdi_data_ranges(header):
+    """把已配置的 VDI 區塊依檔案位置合併成連續範圍 [(offset, length)]"""
+    stride = header["block_size"] + header["block_extra"]
+    data_offsets = sorted(
+        header["off_data"] + index * stride + header["block_extra"]
+        for index in header["block_map"]
+        if index < VDI_BLOCK_ZERO
+    )
+    ranges = []
+    for offset in data_offsets:
+        if ranges and header["block_extra"] == 0 and ranges[-1][0] + ranges[-1][1] == offset:
+            ranges[-1][1] += header["block_size"]
+        else:
+            ranges.append([offset, header["block_size"]])
+    return [tuple(r) for r in ranges]
+
+def data_ranges(fd, size):
+    """以 SEEK_DATA/SEEK_HOLE 找出 raw 檔案的資料範圍，不支援時回傳整個檔案"""
+    if not hasattr(os, "SEEK_DATA"):
+        return [(0, size)]
+    ranges = []
+    offset = 0
+    try:
+        while offset < size:
+            try:
+                start = os.lseek(fd, offset, os.SEEK_DATA)
+            except OSError:
+                break  # ENXIO：之後全是空洞
+            end = os.lseek(fd, start, os.SEEK_HOLE)
+            ranges.append((start, end - start))
+            offset = end
+    except OSError:
+        return [(0, size)]
+    return ranges
+
+def split_ranges(ranges, chunk_size, block_size, align=True):
+    """把範圍切成不超過 chunk_size 的工作單位（align 時對齊檔案中的 block_size 邊界）"""
+    jobs = []
+    for offset, length in ranges:
+        # 對齊到區塊邊界，避免同一區塊被拆給兩個工作單位
+        start = offset - offset % block_size if align else offset
+        end = offset + length
+        while start < end:
+            step = min(chunk_size, end - start)
+            jobs.append((start, step))
+            start += step
+    return jobs
+
+def _read_at(f, fd, buf, offset):
+    """讀取到緩衝區，回傳實際讀取的位元組數"""
+    if hasattr(os, "preadv"):
+        return os.preadv(fd, [buf], offset)
+    f.seek(offset)
+    return f.readinto(buf)
+
+def _scan_jobs(path, jobs, chunk_size, block_size):
+    """單一執行緒：依序掃描分配到的工作單位"""
+    buf = bytearray(chunk_size)
+    zero_block = bytes(block_size)
+    zero_blocks = 0
+    scanned = 0
+    with open(path, "rb", buffering=0) as f:
+        fd = f.fileno()
+        for offset, length in jobs:
+            view = memoryview(buf)[:length]
+            got = _read_at(f, fd, view, offset)
+            scanned += got
+            for pos in range(0, got - block_size + 1, block_size):
+                if buf.startswith(zero_block, pos):
+                    zero_blocks += 1
+    return zero_blocks, scanned
+
+def scan_image(path, workers=DEFAULT_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE, block_size=None):
+    """
+    掃描映像檔中的全零區塊
+
+    Args:
+        path: 映像檔路徑（VDI 或 raw）
+        workers: 平行掃描的執行緒數
+        chunk_size: 每次讀取的區段大小
+        block_size: 判斷全零的區塊大小（VDI 預設為其區塊大小）
+
+    Returns:
+        dict: 掃描統計與可回收空間估算
+    """
+    path = Path(path)
+    file_size = path.stat().st_size
+    started = time.perf_counter()
+
+    header = None
+    if is_vdi(path):
+        header = parse_vdi_header(path)
+        block_size = header["block_size"]
+        ranges = vdi_data_ranges(header)
+    else:
+        block_size = block_size or DEFAULT_RAW_BLOCK_SIZE
+        with open(path, "rb") as f:
+            ranges = data_ranges(f.fileno(), file_size)
+
+    chunk_size = max(block_size, chunk_size - chunk_size % block_size)
+    jobs = split_ranges(ranges, chunk_size, block_size, align=header is None)
+
+    # 以交錯方式分配工作，讓每個執行緒讀取的位置大致平均
+    workers = max(1, min(workers, len(jobs)))
+    groups = [jobs[i::workers] for i in range(workers)]
+    zero_blocks = 0
+    scanned = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for zeros, got in pool.map(lambda g: _scan_jobs(path, g, chunk_size, block_size), groups):
+            zero_blocks += zeros
+            scanned += got
+
+    elapsed = time.perf_counter() - started
+    result = {
+        "path": str(path),
+        "format": "vdi" if header else "raw",
+        "file_size": file_size,
+        "block_size": block_size,
+        "scanned_bytes": scanned,
+        "zero_blocks": zero_blocks,
+        "zero_bytes": zero_blocks * block_size,
+        "reclaimable_bytes": zero_blocks * block_size,
+        "elapsed": elapsed,
+        "throughput": scanned / elapsed if elapsed > 0 else 0.0,
+    }
+    if header:
+        allocated = sum(1 for index in header["block_map"] if index < VDI_BLOCK_ZERO)
+        result.update({
+            "vdi_type": header["type"],
+            "disk_size": header["disk_size"],
+            "blocks": header["blocks"],
+            "allocated_blocks": allocated,
+            "free_blocks": header["blocks"] - allocated,
+        })
+    return result
+
+def print_scan_report(result, indent="  "):
+    """輸出掃描結果"""
+    if result["format"] == "vdi":
+        print(f"{indent}VDI 類型: {result['vdi_type']}，虛擬容量: {format_size(result['disk_size'])}")
+        print(f"{indent}已配置區塊: {result['allocated_blocks']:,} / {result['blocks']:,}")
+    print(f"{indent}掃描: {format_size(result['scanned_bytes'])}，"
+          f"{result['elapsed']:.2f} 秒（{format_size(result['throughput'])}/s）")
+    print(f"{indent}全零區塊: {result['zero_blocks']:,} 個")
+    print(f"{indent}可回收: {result['reclaimable_bytes'] / (1024**3):.2f} GB")
+
+def main():
+    """主函數"""
+    if len(sys.argv) < 2:
+        print("用法: python zero_scanner.py <映像檔> [<映像檔> ...]")
+        return
+
+    for target in sys.argv[1:]:
+        print(f"檔案: {target}")
+        try:
+            result = scan_image(target)
+        except (OSError, ValueError) as e:
+            print(f"  無法掃描: {e}")
+            print()
+            continue
+        print_scan_report(result)
+        print()
+
+if __name__ == "__main__":
+    main()